@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import signal
+import hashlib
+import asyncio
+import httpx
+from db import POOL, init_db
+from http_clients import CLIENTS
+from dialer import TokenBucket, RETRYABLE_STATUSES, _retry_after
+from events import BUS
+from classifier import fallback_analysis
+from transcripts import decompress
+
+ANALYSIS_MODEL = os.getenv("ANALYSIS_MODEL", "gpt-4o")
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", 8))
+# OpenAI budget for this process: requests and (estimated) tokens per minute
+ANALYSIS_RPM = float(os.getenv("ANALYSIS_RPM", 500))
+ANALYSIS_TPM = float(os.getenv("ANALYSIS_TPM", 200000))
+ANALYSIS_PAGE_SIZE = int(os.getenv("ANALYSIS_PAGE_SIZE", 100))
+ANALYSIS_POLL_INTERVAL = float(os.getenv("ANALYSIS_POLL_INTERVAL", 30))
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", 3))
+
+# Next page of calls with a transcript and no analysis, after a call id
+BACKLOG_SQL = """
+    SELECT calls.id, call_transcripts.body, duration, conversion_flag
+    FROM calls JOIN call_transcripts ON call_transcripts.call_id = calls.id
+    WHERE has_transcript = 1 AND sentiment IS NULL AND calls.id > ?
+    ORDER BY calls.id LIMIT ?
+"""
+# Analyzed calls per user, for the live update events
+OWNERS_SQL = """
+    SELECT user_id, COUNT(*) FROM calls WHERE id IN (SELECT value FROM json_each(?)) GROUP BY user_id
+"""
+
+SYSTEM_PROMPT = """You are analyzing sales call transcripts. Provide analysis in this exact JSON format:
+{
+  "sentiment": "positive|negative|neutral",
+  "objection": "price|timing|competition|authority|interest|information|none",
+  "interest_level": "hot|warm|cold",
+  "summary": "One sentence summary of the call outcome"
+}
+
+Consider:
+- Call duration as an engagement indicator (longer = more interested)
+- Actual conversation context, not just keywords
+- Prospect's tone and responses
+- Whether they asked questions or showed curiosity"""
+
+def _request_body(transcript: str, duration: int, conversion_flag: int) -> dict:
+    return {
+        "model": ANALYSIS_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": f"""Analyze this sales call:
+
+TRANSCRIPT:
+{transcript}
+
+CALL DURATION: {duration} seconds
+CONVERSION: {'Yes' if conversion_flag == 1 else 'No'}
+
+Provide your analysis in the specified JSON format."""
+            }
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.1
+    }
+
+def _headers() -> dict:
+    return {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}", "Content-Type": "application/json"}
+
+def _parse_analysis(response: httpx.Response) -> dict:
+    analysis = json.loads(response.json()["choices"][0]["message"]["content"])
+    # Ensure we have all required fields with defaults
+    return {
+        "sentiment": analysis.get("sentiment", "neutral"),
+        "objection": analysis.get("objection", "none"),
+        "interest_level": analysis.get("interest_level", "cold"),
+        "summary": analysis.get("summary", "Call completed - see transcript for details")
+    }
+
+def input_hash(transcript: str, duration: int, conversion_flag: int) -> str:
+    """Cache key covering everything the model sees"""
+    return hashlib.sha256(f"{ANALYSIS_MODEL}\0{duration}\0{conversion_flag}\0{transcript}".encode()).hexdigest()
+
+def estimate_tokens(transcript: str) -> int:
+    # ~4 characters per token, plus the system prompt and the JSON answer
+    return len(transcript) // 4 + 300
+
+class AnalysisService:
+    """Analyzes call transcripts in the background under an OpenAI request and token budget
+
+    Pages through unanalyzed calls in id order with up to `concurrency` requests
+    in flight. Each page's results are saved together with a checkpoint, so a
+    restart resumes where it stopped. Model answers are cached by input hash;
+    fallback (keyword) answers are stored on the call but never cached. A call
+    still throttled after ANALYSIS_MAX_ATTEMPTS is left pending for the next pass.
+    """
+
+    def __init__(self, concurrency: int = ANALYSIS_CONCURRENCY, rpm: float = ANALYSIS_RPM, tpm: float = ANALYSIS_TPM):
+        self.concurrency = concurrency
+        self.requests = TokenBucket(rpm / 60, max(1, concurrency))
+        self.tokens = TokenBucket(tpm / 60, max(1, int(tpm / 60)))
+        self.stats = {"analyzed": 0, "cached": 0, "fallbacks": 0, "deferred": 0}
+        self.running = False
+        self._pass_started = None
+        self._pass_analyzed = 0
+        self._last_rate = 0
+        self._slots = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._runner = None
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+    def trigger(self):
+        """Start a pass now instead of at the next poll"""
+        self._wakeup.set()
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "concurrency": self.concurrency,
+            "rpm": round(self.requests.rate * 60),
+            "tpm": round(self.tokens.rate * 60),
+            "transcripts_per_minute": self._rate() if self.running and self._pass_analyzed else self._last_rate,
+            **self.stats,
+        }
+
+    def _rate(self) -> float:
+        """Transcripts per minute in the current pass"""
+        return round(self._pass_analyzed / max(time.monotonic() - self._pass_started, 1e-6) * 60, 1)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_pass()
+            except Exception as e:
+                print(f"[ANALYSIS] Error analyzing transcripts: {e}")
+            try:
+                async with asyncio.timeout(ANALYSIS_POLL_INTERVAL):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_pass(self) -> int:
+        """Analyze every call that needs it, one checkpointed page at a time"""
+        self.running = True
+        self._pass_started, self._pass_analyzed = time.monotonic(), 0
+        try:
+            cursor = await self._load_checkpoint()
+            while True:
+                async with POOL.reader() as db:
+                    async with db.execute(BACKLOG_SQL, (cursor, ANALYSIS_PAGE_SIZE)) as cur:
+                        page = [(call_id, decompress(body), duration, flag) for call_id, body, duration, flag in await cur.fetchall()]
+                if not page:
+                    break
+                cursor = page[-1][0]
+                await self._save_page(await self._analyze_page(page), cursor)
+            # Start the next pass from the top: older calls can get transcripts later
+            if cursor:
+                await self._save_page([], 0)
+            if self._pass_analyzed:
+                self._last_rate = self._rate()
+                print(f"[ANALYSIS] Analyzed {self._pass_analyzed} transcripts ({self._last_rate} transcripts/min)")
+        finally:
+            self.running = False
+
+        return self._pass_analyzed
+
+    async def _load_checkpoint(self) -> int:
+        async with POOL.reader() as db:
+            async with db.execute("SELECT last_call_id FROM analysis_checkpoint WHERE id = 1") as cur:
+                row = await cur.fetchone()
+        return row[0] if row else 0
+
+    async def _analyze_page(self, page: list) -> list:
+        """(call_id, analysis, source, input_hash) for one page of calls"""
+        keys = {call_id: input_hash(transcript, duration or 0, flag or 0) for call_id, transcript, duration, flag in page}
+        unique = sorted(set(keys.values()))
+        async with POOL.reader() as db:
+            async with db.execute(f"""
+                SELECT input_hash, sentiment, objection, interest_level, summary FROM analysis_cache
+                WHERE input_hash IN ({','.join('?' * len(unique))})
+            """, unique) as cur:
+                cached = {row[0]: (dict(zip(("sentiment", "objection", "interest_level", "summary"), row[1:])), "cache")
+                          for row in await cur.fetchall()}
+
+        # Identical transcripts within a page share one request
+        pending = {}
+        for call_id, transcript, duration, flag in page:
+            key = keys[call_id]
+            if key not in cached and key not in pending:
+                pending[key] = asyncio.create_task(self._analyze(transcript, duration or 0, flag or 0))
+        answers = dict(zip(pending, await asyncio.gather(*pending.values()))) if pending else {}
+        answers.update(cached)
+        return [(call_id, *answers[keys[call_id]], keys[call_id]) for call_id, _, _, _ in page]
+
+    async def _analyze(self, transcript: str, duration: int, conversion_flag: int) -> tuple:
+        """(analysis, source) where source is "openai", "fallback", or "pending" (with no analysis) when throttled"""
+        client = CLIENTS.get("openai")
+        throttled = False
+        async with self._slots:
+            for attempt in range(1, ANALYSIS_MAX_ATTEMPTS + 1):
+                await self.requests.acquire()
+                await self.tokens.acquire(estimate_tokens(transcript))
+                try:
+                    response = await client.post("/v1/chat/completions", headers=_headers(),
+                                                 json=_request_body(transcript, duration, conversion_flag))
+                except httpx.HTTPError as e:
+                    print(f"[ANALYSIS] OpenAI request failed (attempt {attempt}): {e}")
+                    throttled = False
+                    continue
+                throttled = response.status_code in RETRYABLE_STATUSES
+                if throttled:
+                    # Over the provider's limit: hold every request, not just this one
+                    self.requests.pause(_retry_after(response))
+                    continue
+                if response.status_code == 200:
+                    try:
+                        return _parse_analysis(response), "openai"
+                    except (KeyError, IndexError, ValueError) as e:
+                        print(f"[ANALYSIS] Unreadable OpenAI answer: {e}")
+                break
+        if throttled:
+            # Still rate limited: a keyword guess would be stored as final, so try again next pass
+            return None, "pending"
+        return fallback_analysis(transcript, duration, conversion_flag), "fallback"
+
+    async def _save_page(self, results: list, cursor: int):
+        """Store a page of results, new cache entries and the checkpoint in one transaction
+
+        Pending calls keep sentiment NULL, so the next pass picks them up again.
+        """
+        deferred = sum(1 for r in results if r[2] == "pending")
+        results = [r for r in results if r[2] != "pending"]
+        counts = {source: sum(1 for r in results if r[2] == source) for source in ("openai", "cache", "fallback")}
+        if deferred:
+            self.stats["deferred"] += deferred
+            print(f"[ANALYSIS] {deferred} calls still rate limited, left for the next pass")
+        async with POOL.writer() as db:
+            await db.executemany("""
+                UPDATE calls SET sentiment=?, objection=?, interest_level=?, summary=? WHERE id=?
+            """, [(a["sentiment"], a["objection"], a["interest_level"], a["summary"], call_id) for call_id, a, _, _ in results])
+            await db.executemany("""
+                INSERT OR IGNORE INTO analysis_cache (input_hash, sentiment, objection, interest_level, summary)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(key, a["sentiment"], a["objection"], a["interest_level"], a["summary"])
+                  for _, a, source, key in results if source == "openai"])
+            await db.execute("""
+                INSERT INTO analysis_checkpoint (id, last_call_id, analyzed, cached, fallbacks) VALUES (1, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    last_call_id = excluded.last_call_id,
+                    analyzed = analyzed + excluded.analyzed,
+                    cached = cached + excluded.cached,
+                    fallbacks = fallbacks + excluded.fallbacks,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (cursor, len(results), counts["cache"], counts["fallback"]))
+            async with db.execute(OWNERS_SQL, (json.dumps([call_id for call_id, _, _, _ in results]),)) as cur:
+                owners = await cur.fetchall()
+
+        if results:
+            self._pass_analyzed += len(results)
+            self.stats["analyzed"] += len(results)
+            self.stats["cached"] += counts["cache"]
+            self.stats["fallbacks"] += counts["fallback"]
+            for user_id, analyzed in owners:
+                BUS.publish("analysis", {"analyzed": analyzed} if user_id else {"test": True}, user_id)
+
+async def run_analysis():
+    """Standalone analysis process"""
+    await POOL.open()
+    CLIENTS.start()
+    await init_db()
+    service = AnalysisService()
+    service.start()
+    print(f"[ANALYSIS] Standalone analysis service started ({service.concurrency} concurrent, {ANALYSIS_RPM:g} RPM)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    await service.stop()
+    await CLIENTS.close()
+    await POOL.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_analysis())
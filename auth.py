@@ -0,0 +1,106 @@
+import os
+import time
+import asyncio
+import hashlib
+import bcrypt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from db import POOL
+
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+# Picks up logouts made through other API processes
+AUTH_REVOCATION_REFRESH = float(os.getenv("AUTH_REVOCATION_REFRESH", 30))
+# bcrypt cost factor for new hashes; existing hashes are upgraded at login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Threads for hashing. bcrypt releases the GIL, so this bounds how many cores
+# a login storm can take from the event loop.
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+
+_HASHER = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+async def hash_password(password: str) -> str:
+    """Hash a password using bcrypt, off the event loop"""
+    hashed = await asyncio.get_running_loop().run_in_executor(
+        _HASHER, bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(BCRYPT_ROUNDS))
+    return hashed.decode('utf-8')
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Verify a password against its hash, off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(
+        _HASHER, bcrypt.checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+def needs_rehash(hashed: str) -> bool:
+    """True if a hash ("$2b$12$...") was made with a different cost than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def revocation_key(token: str, payload: dict) -> str:
+    """The token's jti; tokens issued before jti existed are keyed by their hash"""
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+class AuthCache:
+    """Verified users by bearer token, plus the set of revoked token ids
+
+    A cached token skips both JWT verification and the users lookup until its
+    entry expires (after `ttl` seconds, or when the token itself expires).
+    Revocations live in revoked_tokens and are mirrored in memory, so checking
+    them never touches the database.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, maxsize: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # token -> (expires_at, user, revocation key)
+        self._users = OrderedDict()
+        # revocation key -> token expiry (epoch seconds)
+        self._revoked = {}
+
+    def get(self, token: str):
+        entry = self._users.get(token)
+        if entry is None:
+            return None
+        expires_at, user, key = entry
+        if expires_at <= time.time() or key in self._revoked:
+            del self._users[token]
+            return None
+        self._users.move_to_end(token)
+        return user
+
+    def put(self, token: str, payload: dict, user: dict):
+        expires_at = min(time.time() + self.ttl, payload.get("exp", float("inf")))
+        self._users[token] = (expires_at, user, revocation_key(token, payload))
+        self._users.move_to_end(token)
+        while len(self._users) > self.maxsize:
+            self._users.popitem(last=False)
+
+    def is_revoked(self, key: str) -> bool:
+        return key in self._revoked
+
+    async def revoke(self, key: str, expires_at: float):
+        self._revoked[key] = expires_at
+        async with POOL.writer() as db:
+            await db.execute("INSERT OR REPLACE INTO revoked_tokens (jti, expires_at) VALUES (?, ?)", (key, expires_at))
+
+    async def load_revocations(self):
+        """Prune expired revocations and reload the rest"""
+        now = time.time()
+        async with POOL.writer() as db:
+            await db.execute("DELETE FROM revoked_tokens WHERE expires_at < ?", (now,))
+        async with POOL.reader() as db:
+            async with db.execute("SELECT jti, expires_at FROM revoked_tokens") as cur:
+                stored = dict(await cur.fetchall())
+        # Keep revocations made while the rows were being read
+        self._revoked = {**{k: v for k, v in self._revoked.items() if v >= now}, **stored}
+
+    async def run_refresher(self, interval: float = AUTH_REVOCATION_REFRESH):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load_revocations()
+            except Exception as e:
+                print(f"[AUTH] Error loading revoked tokens: {e}")
+
+AUTH = AuthCache()
@@ -1,15 +1,22 @@
 from string import Template
-import pathlib, asyncio
+from functools import lru_cache
+import pathlib
 
 PROMPT_DIR = pathlib.Path("backend/prompts")
 
-async def render_prompt(name: str, context: dict):
+@lru_cache(maxsize=128)
+def _compile(path: str, mtime_ns: int) -> Template:
+    # Keyed by mtime, so an edited file compiles again and the old entry ages out
+    return Template(pathlib.Path(path).read_text())
+
+def load_template(name: str) -> Template:
     path = PROMPT_DIR / f"{name}.txt"
     try:
-        tmpl = Template(path.read_text())
-        return tmpl.safe_substitute(context)
+        return _compile(str(path), path.stat().st_mtime_ns)
     except FileNotFoundError:
         # Fallback to default if prompt file doesn't exist
         default_path = PROMPT_DIR / "default.txt"
-        tmpl = Template(default_path.read_text())
-        return tmpl.safe_substitute(context)
\ No newline at end of file
+        return _compile(str(default_path), default_path.stat().st_mtime_ns)
+
+async def render_prompt(name: str, context: dict):
+    return load_template(name).safe_substitute(context)
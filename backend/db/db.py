@@ -1,9 +1,24 @@
-import aiosqlite, os, pathlib, asyncio
+import aiosqlite, pathlib
 
 DB_PATH = pathlib.Path("data.db")
 
+# Columns added to tables after their first release: (table, column, definition)
+ADDED_COLUMNS = [
+    ("email_logs", "batch_id", "TEXT"),
+    ("email_outbox", "batch_id", "TEXT"),
+]
+
+async def _add_columns(db):
+    """Bring tables created by an older schema.sql up to date before it runs"""
+    for table, column, definition in ADDED_COLUMNS:
+        async with db.execute(f"PRAGMA table_info({table})") as cur:
+            columns = {row[1] for row in await cur.fetchall()}
+        if columns and column not in columns:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
 async def init_db():
     async with aiosqlite.connect(DB_PATH) as db:
+        await _add_columns(db)
         with open("backend/db/schema.sql") as f:
             await db.executescript(f.read())
         await db.commit()
@@ -32,5 +32,111 @@ CREATE TABLE IF NOT EXISTS email_logs (
   email_type TEXT,                -- follow_up | demo_invite | pitch_deck
   status TEXT,                    -- sent | failed | opened | clicked
   sent_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  batch_id TEXT,                  -- set for emails queued by a bulk send
   FOREIGN KEY (lead_id) REFERENCES leads(id)
-);
\ No newline at end of file
+);
+
+-- Emails waiting for EmailDispatcher; the webhook only inserts here
+CREATE TABLE IF NOT EXISTS email_outbox (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  lead_id INTEGER,
+  email_type TEXT,
+  to_email TEXT NOT NULL,
+  subject TEXT NOT NULL,
+  body TEXT NOT NULL,
+  status TEXT DEFAULT 'pending',  -- pending | sending | sent | failed
+  attempts INTEGER DEFAULT 0,
+  available_at REAL DEFAULT 0,    -- unix time; retries and rate-limited sends wait until then
+  last_error TEXT,
+  created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+  sent_at TEXT,
+  batch_id TEXT,
+  FOREIGN KEY (lead_id) REFERENCES leads(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_outbox_pending ON email_outbox (status, available_at);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_lead ON email_outbox (lead_id, email_type);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_batch ON email_outbox (batch_id) WHERE batch_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_email_logs_batch ON email_logs (batch_id) WHERE batch_id IS NOT NULL;
+-- Latest call per lead, for the bulk email filters
+CREATE INDEX IF NOT EXISTS idx_calls_lead ON calls (lead_id);
+
+-- One row per lead with its latest call and email count, kept current by the
+-- triggers below so /api/leads reads one row per lead however much history
+-- builds up. last_contacted_at is '' until the lead is contacted.
+CREATE TABLE IF NOT EXISTS lead_summary (
+  lead_id INTEGER PRIMARY KEY,
+  last_contacted_at TEXT NOT NULL DEFAULT '',
+  last_call_id INTEGER,
+  outcome TEXT,
+  interest_level TEXT,
+  objection TEXT,
+  sentiment TEXT,
+  duration INTEGER,
+  email_count INTEGER NOT NULL DEFAULT 0,
+  FOREIGN KEY (lead_id) REFERENCES leads(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_lead_summary_recent ON lead_summary (last_contacted_at DESC, lead_id DESC);
+
+CREATE TRIGGER IF NOT EXISTS leads_summary_insert AFTER INSERT ON leads
+BEGIN
+  INSERT OR IGNORE INTO lead_summary (lead_id, last_contacted_at) VALUES (NEW.id, COALESCE(NEW.last_contacted_at, ''));
+END;
+
+CREATE TRIGGER IF NOT EXISTS leads_summary_contacted AFTER UPDATE OF last_contacted_at ON leads
+BEGIN
+  UPDATE lead_summary SET last_contacted_at = COALESCE(NEW.last_contacted_at, '') WHERE lead_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS leads_summary_delete AFTER DELETE ON leads
+BEGIN
+  DELETE FROM lead_summary WHERE lead_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS calls_summary_insert AFTER INSERT ON calls
+BEGIN
+  UPDATE lead_summary
+  SET last_call_id = NEW.id, outcome = NEW.outcome, interest_level = NEW.interest_level,
+      objection = NEW.objection, sentiment = NEW.sentiment, duration = NEW.duration
+  WHERE lead_id = NEW.lead_id AND (last_call_id IS NULL OR last_call_id < NEW.id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS calls_summary_update
+AFTER UPDATE OF outcome, interest_level, objection, sentiment, duration ON calls
+BEGIN
+  UPDATE lead_summary
+  SET outcome = NEW.outcome, interest_level = NEW.interest_level,
+      objection = NEW.objection, sentiment = NEW.sentiment, duration = NEW.duration
+  WHERE lead_id = NEW.lead_id AND last_call_id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS calls_summary_delete AFTER DELETE ON calls
+BEGIN
+  UPDATE lead_summary
+  SET last_call_id = c.id, outcome = c.outcome, interest_level = c.interest_level,
+      objection = c.objection, sentiment = c.sentiment, duration = c.duration
+  FROM (SELECT NULL AS id, NULL AS outcome, NULL AS interest_level, NULL AS objection, NULL AS sentiment, NULL AS duration
+        UNION ALL
+        SELECT id, outcome, interest_level, objection, sentiment, duration FROM calls WHERE lead_id = OLD.lead_id
+        ORDER BY id DESC LIMIT 1) AS c
+  WHERE lead_id = OLD.lead_id AND last_call_id = OLD.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS email_logs_summary_insert AFTER INSERT ON email_logs
+BEGIN
+  UPDATE lead_summary SET email_count = email_count + 1 WHERE lead_id = NEW.lead_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS email_logs_summary_delete AFTER DELETE ON email_logs
+BEGIN
+  UPDATE lead_summary SET email_count = email_count - 1 WHERE lead_id = OLD.lead_id;
+END;
+
+-- Summaries for leads that predate the table (a no-op once every lead has one)
+INSERT INTO lead_summary (lead_id, last_contacted_at, last_call_id, outcome, interest_level, objection, sentiment, duration, email_count)
+SELECT l.id, COALESCE(l.last_contacted_at, ''), c.id, c.outcome, c.interest_level, c.objection, c.sentiment, c.duration,
+       (SELECT COUNT(*) FROM email_logs e WHERE e.lead_id = l.id)
+FROM leads l
+LEFT JOIN calls c ON c.id = (SELECT MAX(id) FROM calls WHERE calls.lead_id = l.id)
+WHERE NOT EXISTS (SELECT 1 FROM lead_summary s WHERE s.lead_id = l.id);
@@ -1,12 +1,11 @@
-import os, asyncio, csv, io, re
+import os, asyncio, csv, io, re, json, base64
 import uvicorn
-from fastapi import FastAPI, UploadFile, Form, BackgroundTasks, Request
+from fastapi import FastAPI, UploadFile, Form, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from calls.call_engine import create_call
 from calls.webhook import webhook_router
-from db.db import init_db, get_db
-from services.email_service import EmailService
+from db.db import init_db, get_db, DB_PATH
+from services.email_service import EmailService, EmailDispatcher
 import sqlite3
 
 app = FastAPI()
@@ -16,12 +15,19 @@ app.mount("/", StaticFiles(directory="../static", html=True), name="static")
 QUEUE = asyncio.Queue()
 CONCURRENCY = int(os.getenv("CONCURRENCY", 3))
 CALLERS = []
+EMAIL = EmailService(DB_PATH)
+EMAILS = EmailDispatcher(EMAIL)
 
 @app.on_event("startup")
 async def startup():
     await init_db()
     for _ in range(CONCURRENCY):
         CALLERS.append(asyncio.create_task(worker()))
+    EMAILS.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await EMAILS.stop()
 
 async def worker():
     while True:
@@ -170,24 +176,41 @@ async def webhook(request: Request):
                 lead_id
             ))
             
-            # If lead is hot and has email, trigger follow-up
-            if interest_level == "hot" and email_match:
-                email_service = EmailService(DB_PATH)
-                email_service.send_follow_up(lead_id, "follow_up")
+            # If lead is hot and has email, queue a follow-up; EMAILS sends it
+            queued = interest_level == "hot" and email_match and EMAIL.queue_email(cursor, lead_id, "follow_up")
         
+        if queued:
+            EMAILS.wake()
         return {"status": "success"}
         
     except Exception as e:
         print(f"Error processing webhook: {str(e)}")
         return {"error": str(e)}
 
+LEADS_PAGE_SIZE = int(os.getenv("LEADS_PAGE_SIZE", 100))
+
+def _encode_cursor(last_contacted_at: str, lead_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([last_contacted_at, lead_id]).encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    last_contacted_at, lead_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return str(last_contacted_at), int(lead_id)
+
 @app.get("/api/leads")
-async def get_leads():
-    """Get all leads with their latest call information."""
+async def get_leads(cursor: str = None, limit: int = LEADS_PAGE_SIZE):
+    """Get a page of leads with their latest call information, most recently contacted first.
+
+    Pass the returned next_cursor to get the following page; it is null on the last one.
+    """
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
+        where, params = "", []
+        if cursor:
+            where = "WHERE (s.last_contacted_at, s.lead_id) < (?, ?)"
+            params.extend(_decode_cursor(cursor))
+        limit = max(1, min(limit, 1000))
+        db = await get_db()
+        try:
+            async with db.execute(f"""
                 SELECT 
                     l.id,
                     l.contact,
@@ -196,46 +219,96 @@ async def get_leads():
                     l.email,
                     l.lead_status,
                     l.last_contacted_at,
-                    c.interest_level,
-                    c.objection,
-                    c.sentiment,
-                    c.transcript,
-                    c.duration,
-                    (
-                        SELECT COUNT(*) 
-                        FROM email_logs e 
-                        WHERE e.lead_id = l.id
-                    ) as email_count
-                FROM leads l
-                LEFT JOIN calls c ON l.id = c.lead_id
-                ORDER BY l.last_contacted_at DESC
-            """)
-            
-            columns = [description[0] for description in cursor.description]
-            leads = [dict(zip(columns, row)) for row in cursor.fetchall()]
+                    s.outcome,
+                    s.interest_level,
+                    s.objection,
+                    s.sentiment,
+                    s.duration,
+                    s.email_count,
+                    s.last_contacted_at
+                FROM lead_summary s
+                JOIN leads l ON l.id = s.lead_id
+                {where}
+                ORDER BY s.last_contacted_at DESC, s.lead_id DESC
+                LIMIT ?
+            """, (*params, limit + 1)) as cur:
+                rows = await cur.fetchall()
+        finally:
+            await db.close()
             
-            return {"leads": leads}
+        columns = ("id", "contact", "company", "phone", "email", "lead_status", "last_contacted_at",
+                   "outcome", "interest_level", "objection", "sentiment", "duration", "email_count")
+        # The extra row only tells us whether there is another page
+        leads = [dict(zip(columns, row)) for row in rows[:limit]]
+        next_cursor = _encode_cursor(rows[limit - 1][-1], rows[limit - 1][0]) if len(rows) > limit else None
+        
+        return {"leads": leads, "next_cursor": next_cursor}
             
     except Exception as e:
         print(f"Error fetching leads: {str(e)}")
         return {"error": str(e)}
 
+@app.get("/api/leads/{lead_id}/transcript")
+async def get_lead_transcript(lead_id: int):
+    """Transcript of a lead's latest call; /api/leads leaves transcripts out."""
+    db = await get_db()
+    try:
+        async with db.execute("""
+            SELECT calls.transcript FROM lead_summary s JOIN calls ON calls.id = s.last_call_id
+            WHERE s.lead_id = ?
+        """, (lead_id,)) as cur:
+            row = await cur.fetchone()
+    finally:
+        await db.close()
+    return {"lead_id": lead_id, "transcript": row[0] if row else None}
+
 @app.post("/api/leads/{lead_id}/send-email")
 async def send_lead_email(lead_id: int, email_type: str = "follow_up"):
-    """Send an email to a specific lead."""
+    """Queue an email to a specific lead."""
     try:
-        email_service = EmailService(DB_PATH)
-        success = email_service.send_follow_up(lead_id, email_type)
+        success = EMAIL.send_follow_up(lead_id, email_type)
         
         if success:
-            return {"status": "success", "message": "Email sent successfully"}
+            EMAILS.wake()
+            return {"status": "success", "message": "Email queued"}
         else:
-            return {"status": "error", "message": "Failed to send email"}
+            return {"status": "error", "message": "Failed to queue email"}
             
     except Exception as e:
         print(f"Error sending email: {str(e)}")
         return {"error": str(e)}
 
+@app.post("/api/emails/bulk")
+async def send_bulk_email(
+    email_type: str = "follow_up",
+    lead_status: str = None,
+    interest_level: str = None,
+    campaign: str = None,
+    limit: int = None
+):
+    """Queue an email to every lead matching the filters; campaign is the lead's prompt_name."""
+    try:
+        batch_id, queued = await asyncio.to_thread(
+            EMAIL.queue_bulk, email_type, lead_status, interest_level, campaign, limit
+        )
+        if batch_id is None:
+            return {"status": "error", "message": "Email service not configured"}
+        EMAILS.wake()
+        return {"status": "success", "batch_id": batch_id, "queued": queued}
+            
+    except Exception as e:
+        print(f"Error queueing bulk email: {str(e)}")
+        return {"error": str(e)}
+
+@app.get("/api/emails/bulk/{batch_id}")
+async def get_bulk_email_progress(batch_id: str):
+    """Sent, failed and still-queued counts for a bulk send."""
+    try:
+        return await asyncio.to_thread(EMAIL.batch_progress, batch_id)
+    except Exception as e:
+        print(f"Error fetching bulk email progress: {str(e)}")
+        return {"error": str(e)}
+
 @app.put("/api/leads/{lead_id}/status")
 async def update_lead_status(lead_id: int, status: str):
     """Update a lead's status."""
@@ -1,10 +1,75 @@
 import os
+import time
+import asyncio
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
 from typing import Optional
+import uuid
 import sqlite3
 from datetime import datetime
+from db.db import get_db
+
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))
+EMAIL_POLL_INTERVAL = float(os.getenv("EMAIL_POLL_INTERVAL", 1.0))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+# Sends per minute to any one recipient domain
+EMAIL_DOMAIN_RATE = float(os.getenv("EMAIL_DOMAIN_RATE", 30))
+# Reconnect instead of reusing a session idle for longer than this
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", 60))
+
+# (subject, body) per email_type, parsed once; other types get the pitch deck
+EMAIL_TEMPLATES = {
+    "follow_up": (Template("Following up on our conversation about Sales Ninja"), Template("""
+            Hi $contact,
+            
+            Thanks for your interest in Sales Ninja during our call. I wanted to follow up with some additional information that might be helpful.
+            
+            Here's what we discussed:
+            - Interest Level: $interest_level
+            - Main Concern: $objection
+            
+            Would you be interested in scheduling a quick demo to see how Sales Ninja can help $company?
+            
+            Best regards,
+            Sarah
+            Sales Ninja
+            """)),
+    "demo_invite": (Template("Your Sales Ninja Demo Invitation"), Template("""
+            Hi $contact,
+            
+            As discussed, I'm excited to show you how Sales Ninja can help $company improve your sales outreach.
+            
+            You can schedule a demo at your convenience here: [DEMO_LINK]
+            
+            Best regards,
+            Sarah
+            Sales Ninja
+            """)),
+    "pitch_deck": (Template("Sales Ninja - How We Can Help $company"), Template("""
+            Hi $contact,
+            
+            As promised, here's our pitch deck showing how Sales Ninja has helped companies like $company improve their sales process.
+            
+            [PITCH_DECK_LINK]
+            
+            Let me know if you have any questions!
+            
+            Best regards,
+            Sarah
+            Sales Ninja
+            """)),
+}
+
+# Leads with an email address and their latest call, filtered by {where}
+LEAD_EMAIL_SQL = """
+    SELECT l.id, l.email, l.contact, l.company, c.interest_level, c.objection
+    FROM leads l
+    LEFT JOIN calls c ON c.id = (SELECT MAX(id) FROM calls WHERE calls.lead_id = l.id)
+    WHERE l.email IS NOT NULL AND l.email != '' AND {where}
+"""
 
 class EmailService:
     def __init__(self, db_path: str):
@@ -14,9 +79,12 @@ class EmailService:
         self.smtp_username = os.getenv("SMTP_USERNAME")
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         self.from_email = os.getenv("FROM_EMAIL", "sarah@salesninja.ai")
+        # Local relays and test servers take mail without STARTTLS or a login
+        self.use_tls = os.getenv("SMTP_STARTTLS", "1") != "0"
+        self.use_auth = os.getenv("SMTP_AUTH", "1") != "0"
         
         # Validate required configuration
-        if not self.smtp_username or not self.smtp_password:
+        if self.use_auth and (not self.smtp_username or not self.smtp_password):
             print("Warning: SMTP credentials not configured. Email functionality will be disabled.")
             print("Please set SMTP_USERNAME and SMTP_PASSWORD environment variables.")
             self.is_configured = False
@@ -24,48 +92,40 @@ class EmailService:
             self.is_configured = True
 
     def send_follow_up(self, lead_id: int, email_type: str = "follow_up") -> bool:
-        """Send a follow-up email to a lead based on their interest level."""
+        """Queue a follow-up email to a lead; EmailDispatcher sends it."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return self.queue_email(conn.cursor(), lead_id, email_type)
+        except Exception as e:
+            print(f"Error queueing follow-up email: {str(e)}")
+            return False
+
+    def queue_email(self, cursor: sqlite3.Cursor, lead_id: int, email_type: str = "follow_up") -> bool:
+        """Add an email for a lead to the outbox inside the caller's transaction."""
         if not self.is_configured:
             print("Email service not configured. Skipping email send.")
             return False
             
-        try:
-            # Get lead details from database
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT l.email, l.contact, l.company, c.interest_level, c.objection
-                    FROM leads l
-                    LEFT JOIN calls c ON l.id = c.lead_id
-                    WHERE l.id = ?
-                """, (lead_id,))
-                result = cursor.fetchone()
-                
-                if not result or not result[0]:  # No email or lead not found
-                    print(f"No email found for lead {lead_id}")
-                    return False
-                
-                email, contact, company, interest_level, objection = result
-                
-                # Prepare email content based on type and interest level
-                subject, body = self._prepare_email_content(
-                    email_type, contact, company, interest_level, objection
-                )
-                
-                # Send email
-                success = self._send_email(email, subject, body)
-                
-                # Log the email attempt
-                cursor.execute("""
-                    INSERT INTO email_logs (lead_id, email_type, status, sent_at)
-                    VALUES (?, ?, ?, ?)
-                """, (lead_id, email_type, "sent" if success else "failed", datetime.now().isoformat()))
-                
-                return success
-                
-        except Exception as e:
-            print(f"Error sending follow-up email: {str(e)}")
+        # Get lead details from database
+        cursor.execute(LEAD_EMAIL_SQL.format(where="l.id = ?"), (lead_id,))
+        result = cursor.fetchone()
+        
+        if not result:  # No email or lead not found
+            print(f"No email found for lead {lead_id}")
             return False
+        
+        _, email, contact, company, interest_level, objection = result
+        
+        # Prepare email content based on type and interest level
+        subject, body = self._prepare_email_content(
+            email_type, contact, company, interest_level, objection
+        )
+        
+        cursor.execute("""
+            INSERT INTO email_outbox (lead_id, email_type, to_email, subject, body)
+            VALUES (?, ?, ?, ?, ?)
+        """, (lead_id, email_type, email, subject, body))
+        return True
 
     def _prepare_email_content(
         self, 
@@ -76,75 +136,267 @@ class EmailService:
         objection: Optional[str]
     ) -> tuple[str, str]:
         """Prepare email subject and body based on type and lead status."""
-        if email_type == "follow_up":
-            subject = f"Following up on our conversation about Sales Ninja"
-            body = f"""
-            Hi {contact},
-            
-            Thanks for your interest in Sales Ninja during our call. I wanted to follow up with some additional information that might be helpful.
-            
-            Here's what we discussed:
-            - Interest Level: {interest_level or 'Not specified'}
-            - Main Concern: {objection or 'None mentioned'}
-            
-            Would you be interested in scheduling a quick demo to see how Sales Ninja can help {company}?
-            
-            Best regards,
-            Sarah
-            Sales Ninja
-            """
-        elif email_type == "demo_invite":
-            subject = f"Your Sales Ninja Demo Invitation"
-            body = f"""
-            Hi {contact},
-            
-            As discussed, I'm excited to show you how Sales Ninja can help {company} improve your sales outreach.
-            
-            You can schedule a demo at your convenience here: [DEMO_LINK]
-            
-            Best regards,
-            Sarah
-            Sales Ninja
-            """
-        else:  # pitch_deck
-            subject = f"Sales Ninja - How We Can Help {company}"
-            body = f"""
-            Hi {contact},
-            
-            As promised, here's our pitch deck showing how Sales Ninja has helped companies like {company} improve their sales process.
-            
-            [PITCH_DECK_LINK]
-            
-            Let me know if you have any questions!
-            
-            Best regards,
-            Sarah
-            Sales Ninja
-            """
-            
-        return subject, body
+        subject, body = EMAIL_TEMPLATES.get(email_type, EMAIL_TEMPLATES["pitch_deck"])
+        values = {
+            "contact": contact,
+            "company": company,
+            "interest_level": interest_level or 'Not specified',
+            "objection": objection or 'None mentioned',
+        }
+        return subject.safe_substitute(values), body.safe_substitute(values)
+
+    def queue_bulk(
+        self,
+        email_type: str = "follow_up",
+        lead_status: Optional[str] = None,
+        interest_level: Optional[str] = None,
+        campaign: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> tuple[str, int]:
+        """Queue one email to every matching lead; returns (batch_id, emails queued).
 
-    def _send_email(self, to_email: str, subject: str, body: str) -> bool:
-        """Send an email using SMTP."""
+        Leads already waiting for an email of this type are skipped, so
+        repeating a request doesn't double-send. Blocking; run it in a thread.
+        """
         if not self.is_configured:
-            return False
-            
+            print("Email service not configured. Skipping email send.")
+            return None, 0
+
+        where = ["""NOT EXISTS (
+            SELECT 1 FROM email_outbox o
+            WHERE o.lead_id = l.id AND o.email_type = ? AND o.status IN ('pending', 'sending')
+        )"""]
+        params = [email_type]
+        for column, value in (("l.lead_status", lead_status), ("c.interest_level", interest_level), ("l.prompt_name", campaign)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        sql = LEAD_EMAIL_SQL.format(where=" AND ".join(where)) + " ORDER BY l.id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        batch_id = uuid.uuid4().hex
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(sql, params).fetchall()
+            emails = []
+            for lead_id, email, contact, company, lead_interest, objection in rows:
+                subject, body = self._prepare_email_content(email_type, contact, company, lead_interest, objection)
+                emails.append((lead_id, email_type, email, subject, body, batch_id))
+            conn.executemany("""
+                INSERT INTO email_outbox (lead_id, email_type, to_email, subject, body, batch_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, emails)
+        return batch_id, len(emails)
+
+    def batch_progress(self, batch_id: str) -> dict:
+        """Sent/failed counts for a bulk batch from email_logs, plus what is still queued."""
+        with sqlite3.connect(self.db_path) as conn:
+            progress = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM email_logs WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall())
+            progress["queued"] = conn.execute(
+                "SELECT COUNT(*) FROM email_outbox WHERE batch_id = ? AND status IN ('pending', 'sending')", (batch_id,)
+            ).fetchone()[0]
+        return {"batch_id": batch_id, "sent": progress.get("sent", 0), "failed": progress.get("failed", 0),
+                "queued": progress["queued"]}
+
+    def _build_message(self, to_email: str, subject: str, body: str) -> MIMEMultipart:
+        msg = MIMEMultipart()
+        msg['From'] = self.from_email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+
+class SMTPSession:
+    """One authenticated SMTP connection, reused across sends and reopened after failures.
+
+    smtplib is blocking, so every call runs on a single dedicated thread; that
+    also keeps the session from being used by two sends at once.
+    """
+
+    def __init__(self, service: EmailService):
+        self.service = service
+        self._smtp = None
+        self._last_used = 0.0
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+
+    def _connect(self):
+        service = self.service
+        smtp = smtplib.SMTP(service.smtp_server, service.smtp_port, timeout=30)
+        if service.use_tls:
+            smtp.starttls()
+        if service.use_auth:
+            smtp.login(service.smtp_username, service.smtp_password)
+        self._smtp = smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _send(self, msg: MIMEMultipart):
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_TIMEOUT:
+            # Servers drop idle sessions; check before trusting this one
+            try:
+                self._smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()
+        for attempt in (1, 2):
+            if self._smtp is None:
+                self._connect()
+            try:
+                self._smtp.send_message(msg)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                # Stale session: reconnect once, then let the caller retry later
+                self._disconnect()
+                if attempt == 2:
+                    raise
+
+    async def send(self, msg: MIMEMultipart):
+        await asyncio.get_running_loop().run_in_executor(self._thread, self._send, msg)
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._thread, self._disconnect)
+        self._thread.shutdown(wait=False)
+
+class EmailDispatcher:
+    """Sends queued emails from email_outbox in batches over one SMTP session.
+
+    Failed sends are retried with backoff up to EMAIL_MAX_ATTEMPTS; each
+    recipient domain gets at most EMAIL_DOMAIN_RATE sends per minute, and
+    emails over that limit wait in the outbox rather than holding up others.
+    """
+
+    def __init__(self, service: EmailService):
+        self.service = service
+        self.session = SMTPSession(service)
+        self.stats = {"sent": 0, "failed": 0, "deferred": 0}
+        self._next_send = {}
+        self._next_due = EMAIL_POLL_INTERVAL
+        self._wakeup = asyncio.Event()
+        self._runner = None
+
+    def start(self):
+        if self._runner is None and self.service.is_configured:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        await self.session.close()
+
+    def wake(self):
+        """Check the outbox now instead of at the next poll"""
+        self._wakeup.set()
+
+    async def _run(self):
+        # Emails claimed by a dispatcher that died mid-batch go out again
+        db = await get_db()
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-                
-            print(f"Successfully sent email to {to_email}")
-            return True
-            
-        except Exception as e:
-            print(f"Error sending email to {to_email}: {str(e)}")
-            return False 
\ No newline at end of file
+            await db.execute("UPDATE email_outbox SET status = 'pending' WHERE status = 'sending'")
+        finally:
+            await db.close()
+        while True:
+            try:
+                handled = await self.process_batch()
+            except Exception as e:
+                print(f"[EMAIL] Error processing outbox: {e}")
+                handled = 0
+            if handled < EMAIL_BATCH_SIZE:
+                try:
+                    async with asyncio.timeout(self._next_due):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def _rate_limited(self, to_email: str) -> float:
+        """Seconds until the recipient's domain may get another email; reserves a slot if 0"""
+        domain = to_email.rpartition("@")[2].lower()
+        now = time.monotonic()
+        next_send = self._next_send.get(domain, now)
+        if next_send > now:
+            return next_send - now
+        self._next_send[domain] = now + 60 / EMAIL_DOMAIN_RATE
+        return 0
+
+    async def process_batch(self, limit: int = EMAIL_BATCH_SIZE) -> int:
+        """Claim and send up to `limit` due emails; returns how many were claimed"""
+        self._next_due = EMAIL_POLL_INTERVAL
+        db = await get_db()
+        try:
+            async with db.execute("""
+                UPDATE email_outbox SET status = 'sending', attempts = attempts + 1
+                WHERE id IN (SELECT id FROM email_outbox WHERE status = 'pending' AND available_at <= ? ORDER BY id LIMIT ?)
+                RETURNING id, lead_id, email_type, to_email, subject, body, attempts, batch_id
+            """, (time.time(), limit)) as cur:
+                rows = await cur.fetchall()
+
+            # Outcomes are written in one transaction per batch, not per email
+            updates, logs = [], []
+            try:
+                for outbox_id, lead_id, email_type, to_email, subject, body, attempts, batch_id in sorted(rows):
+                    wait = self._rate_limited(to_email)
+                    if wait:
+                        # Not a failed attempt: give the attempt back and try after the wait
+                        updates.append(("pending", -1, None, time.time() + wait, None, outbox_id))
+                        self.stats["deferred"] += 1
+                        self._next_due = min(self._next_due, wait)
+                        continue
+
+                    try:
+                        await self.session.send(self.service._build_message(to_email, subject, body))
+                        error = None
+                    except Exception as e:
+                        error = str(e)
+                        print(f"Error sending email to {to_email}: {error}")
+                        # A 5xx reply (unknown mailbox, rejected content) won't change on retry
+                        if isinstance(e, smtplib.SMTPRecipientsRefused):
+                            codes = [code for code, _ in e.recipients.values()]
+                        else:
+                            codes = [getattr(e, "smtp_code", 0)]
+                        if min(codes) >= 500:
+                            attempts = EMAIL_MAX_ATTEMPTS
+
+                    now = datetime.now().isoformat()
+                    if error is None:
+                        updates.append(("sent", 0, None, None, now, outbox_id))
+                    elif attempts < EMAIL_MAX_ATTEMPTS:
+                        updates.append(("pending", 0, error, time.time() + min(2 ** attempts * 30, 3600), None, outbox_id))
+                        continue
+                    else:
+                        updates.append(("failed", 0, error, None, None, outbox_id))
+
+                    # Log the email attempt
+                    logs.append((lead_id, email_type, "sent" if error is None else "failed", now, batch_id))
+                    self.stats["sent" if error is None else "failed"] += 1
+                    if error is None:
+                        print(f"Successfully sent email to {to_email}")
+            finally:
+                # Record what was sent even if stop() cancels us mid-batch
+                if updates:
+                    await db.execute("BEGIN IMMEDIATE")
+                    await db.executemany("""
+                        UPDATE email_outbox SET status = ?, attempts = attempts + ?, last_error = COALESCE(?, last_error),
+                            available_at = COALESCE(?, available_at), sent_at = ?
+                        WHERE id = ?
+                    """, updates)
+                    await db.executemany("""
+                        INSERT INTO email_logs (lead_id, email_type, status, sent_at, batch_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, logs)
+                    await db.execute("COMMIT")
+        finally:
+            await db.close()
+        return len(rows)
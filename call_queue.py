@@ -0,0 +1,136 @@
+import os
+import time
+import socket
+import asyncio
+from db import POOL
+
+LEASE_SECONDS = float(os.getenv("CALL_LEASE_SECONDS", 120))
+MAX_ATTEMPTS = int(os.getenv("CALL_MAX_ATTEMPTS", 5))
+RETRY_BACKOFF = float(os.getenv("CALL_RETRY_BACKOFF", 10))
+POLL_INTERVAL = float(os.getenv("CALL_QUEUE_POLL_INTERVAL", 1.0))
+
+# Hot queries, shared with `python -m query_plans` and its test
+SUPPRESS_PENDING_SQL = """
+    UPDATE leads SET status = 'suppressed'
+    WHERE status = 'pending' AND is_sample = FALSE AND user_id = ?
+      AND EXISTS (SELECT 1 FROM dnc_numbers WHERE dnc_numbers.phone = leads.normalized_phone)
+"""
+ENQUEUE_SQL = """
+    INSERT INTO call_jobs (lead_id, user_id, available_at)
+    SELECT id, user_id, ? FROM leads
+    WHERE status = 'pending' AND is_sample = FALSE AND user_id = ?
+    ON CONFLICT (lead_id) DO NOTHING
+"""
+MARK_QUEUED_SQL = """
+    UPDATE leads SET status = 'queued'
+    WHERE status = 'pending' AND is_sample = FALSE AND user_id = ?
+"""
+CLAIM_SQL = """
+    UPDATE call_jobs
+    SET status = 'leased', leased_by = ?, lease_expires_at = ?, attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM call_jobs
+        WHERE (status = 'queued' AND available_at <= ?)
+           OR (status = 'leased' AND lease_expires_at <= ?)
+        ORDER BY available_at, id
+        LIMIT ?
+    )
+    RETURNING id, lead_id, attempts
+"""
+# Leases that expired on their last allowed attempt
+EXPIRED_WHERE = "status = 'leased' AND lease_expires_at <= ? AND attempts >= ?"
+# A job still leased to this worker; once its lease lapses another worker may hold it
+HELD_WHERE = "id = ? AND leased_by = ? AND status = 'leased'"
+DEPTH_SQL = "SELECT COUNT(*) FROM call_jobs WHERE status IN ('queued', 'leased')"
+
+def dead_letter_sql(where: str) -> tuple:
+    """(fail the leads, bury the jobs) statements for the call_jobs matching `where`"""
+    return f"""
+        UPDATE leads SET status = 'failed'
+        WHERE id IN (SELECT lead_id FROM call_jobs WHERE {where})
+    """, f"""
+        UPDATE call_jobs
+        SET status = 'dead', leased_by = NULL, last_error = COALESCE(?, last_error, 'lease expired')
+        WHERE {where}
+    """
+
+class CallQueue:
+    """Durable dial queue stored in the call_jobs table
+
+    Jobs move queued -> leased -> deleted on completion. A lease that is not
+    completed before it expires makes the job claimable again, and a job that
+    runs out of attempts is kept with status 'dead' for inspection.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = asyncio.Event()
+
+    async def enqueue_pending(self, user_id: int) -> int:
+        """Queue every pending campaign lead for a user in one statement
+
+        Leads whose number is on the do-not-call list are marked 'suppressed'
+        instead; the dialer checks again before each call.
+        """
+        now = time.time()
+        async with POOL.writer() as db:
+            await db.execute(SUPPRESS_PENDING_SQL, (user_id,))
+            async with db.execute(ENQUEUE_SQL, (now, user_id)) as cur:
+                queued = cur.rowcount
+            await db.execute(MARK_QUEUED_SQL, (user_id,))
+        self._wakeup.set()
+        return queued
+
+    async def claim(self, limit: int) -> list:
+        """Lease up to `limit` ready jobs to this worker; returns (job_id, lead_id, attempts) rows"""
+        if limit <= 0:
+            return []
+        now = time.time()
+        async with POOL.writer() as db:
+            # Leases that expired on their last allowed attempt never get another one
+            await self._dead_letter(db, EXPIRED_WHERE, (now, MAX_ATTEMPTS))
+            async with db.execute(CLAIM_SQL, (self.worker_id, now + LEASE_SECONDS, now, now, limit)) as cur:
+                return await cur.fetchall()
+
+    async def complete(self, job_id: int):
+        async with POOL.writer() as db:
+            await db.execute(f"DELETE FROM call_jobs WHERE {HELD_WHERE}", (job_id, self.worker_id))
+
+    async def retry(self, job_id: int, attempts: int, delay: float = None, error: str = None, count_attempt: bool = True):
+        """Release a job for another try, or dead-letter it once attempts run out
+
+        Like complete(), a no-op if the lease has passed to another worker.
+        """
+        async with POOL.writer() as db:
+            if count_attempt and attempts >= MAX_ATTEMPTS:
+                await self._dead_letter(db, HELD_WHERE, (job_id, self.worker_id), error)
+                return
+            if delay is None:
+                delay = RETRY_BACKOFF * 2 ** (attempts - 1)
+            await db.execute(f"""
+                UPDATE call_jobs
+                SET status = 'queued', leased_by = NULL, lease_expires_at = NULL, available_at = ?,
+                    attempts = attempts - ?, last_error = ?
+                WHERE {HELD_WHERE}
+            """, (time.time() + delay, 0 if count_attempt else 1, error, job_id, self.worker_id))
+
+    async def _dead_letter(self, db, where: str, params: tuple, error: str = None):
+        fail_leads, bury_jobs = dead_letter_sql(where)
+        await db.execute(fail_leads, params)
+        await db.execute(bury_jobs, (error,) + params)
+
+    async def depth(self) -> int:
+        async with POOL.reader() as db:
+            async with db.execute(DEPTH_SQL) as cur:
+                return (await cur.fetchone())[0]
+
+    async def wait(self, timeout: float = POLL_INTERVAL):
+        """Sleep until something is enqueued in this process or the poll interval passes"""
+        # asyncio.timeout rather than wait_for, which on 3.11 can swallow a
+        # cancellation that arrives as the event is set and hang shutdown
+        try:
+            async with asyncio.timeout(timeout):
+                await self._wakeup.wait()
+        except TimeoutError:
+            pass
+        self._wakeup.clear()
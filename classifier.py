@@ -0,0 +1,191 @@
+import os
+import re
+import sys
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from db import POOL, init_db
+from transcripts import decompress
+
+RESCORE_BATCH_SIZE = int(os.getenv("RESCORE_BATCH_SIZE", 5000))
+RESCORE_WORKERS = int(os.getenv("RESCORE_WORKERS", os.cpu_count() or 1))
+
+# Vocabularies, matched as lowercase substrings. Plain `in` checks on one
+# lowercased copy beat a combined alternation regex in CPython, so each
+# transcript is lowered once and every vocabulary is scanned from that copy.
+POSITIVE_TERMS = ('interested', 'yes', 'sounds good', 'tell me more', 'pricing')
+NEGATIVE_TERMS = ('not interested', 'no thanks', 'busy', 'remove', 'stop calling')
+# Checked in order; the first objection found wins
+OBJECTION_TERMS = (
+    ("price", ('expensive', 'cost', 'budget', 'price')),
+    ("timing", ('not right now', 'busy', 'bad time')),
+    ("competition", ('already have', 'using')),
+)
+# Each group counts once towards the meeting indicators
+MEETING_TERMS = (
+    ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'),
+    ('tomorrow', 'next week'),
+    ('morning', 'afternoon', 'evening'),
+    ('meeting', 'call', 'appointment'),
+)
+TIME_PATTERN = re.compile(r'\d{1,2}:\d{2}')
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+# Requests to stop calling; a match puts the number on the do-not-call list.
+# Narrower than NEGATIVE_TERMS, where "remove" alone only lowers the score.
+OPT_OUT_TERMS = (
+    'stop calling', 'do not call list', 'do-not-call', "don't call me again", 'dont call me again',
+    'never call', 'remove me from', 'remove my number', 'take me off', 'unsubscribe',
+)
+# Speaker labels in Bland transcripts ("assistant: ...", "user: ...")
+AGENT_SPEAKERS = ('assistant', 'agent', 'ai', 'bot')
+CALLEE_SPEAKERS = ('user', 'human', 'callee', 'customer')
+
+MEETING_BOOKED = "Meeting scheduled - see transcript for details"
+
+def _count(text: str, terms: tuple) -> int:
+    return sum(1 for term in terms if term in text)
+
+def callee_text(transcript: str) -> str:
+    """Lowercased lines spoken by the person called; unlabelled lines belong to the previous speaker"""
+    lines, agent = [], False
+    for line in (transcript or "").lower().splitlines():
+        speaker, sep, rest = line.partition(":")
+        speaker = speaker.strip()
+        if sep and speaker in AGENT_SPEAKERS + CALLEE_SPEAKERS:
+            agent = speaker in AGENT_SPEAKERS
+            line = rest
+        if not agent:
+            lines.append(line)
+    return "\n".join(lines)
+
+def detect_opt_out(transcript: str) -> bool:
+    """True if the person called asked not to be called again
+
+    Only the callee's lines count: the agent's script may itself mention the
+    do-not-call list.
+    """
+    text = callee_text(transcript)
+    return any(term in text for term in OPT_OUT_TERMS)
+
+def detect_booking(transcript: str) -> dict:
+    """Email, meeting time and conversion flag for a transcript"""
+    result = {"email": None, "meeting_time": None, "conversion_flag": 0}
+    if not transcript or "@" not in transcript:
+        # No email means no booking, whatever the time indicators say
+        return result
+
+    email_match = EMAIL_PATTERN.search(transcript)
+    if not email_match:
+        return result
+    result["email"] = email_match.group(0)
+
+    text = transcript.lower()
+    indicators = sum(1 for terms in MEETING_TERMS if any(term in text for term in terms))
+    indicators += bool(TIME_PATTERN.search(text))
+    # An email plus time indicators means a meeting was booked
+    if indicators >= 2:
+        result["conversion_flag"] = 1
+        result["meeting_time"] = MEETING_BOOKED
+    return result
+
+def fallback_analysis(transcript: str, duration: int, conversion_flag: int) -> dict:
+    """Fallback analysis using keyword matching"""
+    text = transcript.lower()
+
+    positive_count = _count(text, POSITIVE_TERMS) + (duration > 120)
+    negative_count = _count(text, NEGATIVE_TERMS) + (duration < 30)
+    sentiment = "positive" if positive_count > negative_count else "negative" if negative_count > positive_count else "neutral"
+
+    objection = next((name for name, terms in OBJECTION_TERMS if any(term in text for term in terms)), "none")
+
+    if conversion_flag == 1:
+        interest_level = "hot"
+    elif duration > 120 and sentiment == "positive":
+        interest_level = "warm"
+    else:
+        interest_level = "cold"
+
+    return {
+        "sentiment": sentiment,
+        "objection": objection,
+        "interest_level": interest_level,
+        "summary": f"Call lasted {duration}s - {sentiment} response"
+    }
+
+def score_batch(rows: list, overwrite_analysis: bool = False) -> list:
+    """Rescore calls rows; runs in a worker process
+
+    Rows are (id, compressed transcript, duration, email, meeting_time,
+    conversion_flag, sentiment, objection, interest_level, summary). Returns update tuples in
+    the same column order with the id last, only for rows whose values change.
+    """
+    changed = []
+    for call_id, body, duration, *current in rows:
+        transcript = decompress(body)
+        booking = detect_booking(transcript)
+        values = [booking["email"], booking["meeting_time"], booking["conversion_flag"]]
+        if overwrite_analysis or current[3] is None:
+            analysis = fallback_analysis(transcript, duration or 0, booking["conversion_flag"])
+            values += [analysis["sentiment"], analysis["objection"], analysis["interest_level"], analysis["summary"]]
+        else:
+            # Keep the existing (usually GPT) analysis
+            values += current[3:]
+        if values != current:
+            changed.append((*values, call_id))
+    return changed
+
+async def rescore_calls(overwrite_analysis: bool = False, batch_size: int = RESCORE_BATCH_SIZE,
+                        workers: int = RESCORE_WORKERS) -> tuple:
+    """Recompute booking detection for every call with a transcript; returns (scanned, updated)
+
+    Keyword sentiment/objection/interest only fill calls that have no analysis
+    yet, unless `overwrite_analysis` is set (that would replace GPT results).
+    Batches are read by id and scored in a process pool while earlier batches
+    are written; rows whose scores did not change are not written at all.
+    """
+    loop = asyncio.get_running_loop()
+    scanned, updated, cursor = 0, 0, 0
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        pending, exhausted = [], False
+        while pending or not exhausted:
+            if not exhausted:
+                async with POOL.reader() as db:
+                    async with db.execute("""
+                        SELECT calls.id, call_transcripts.body, duration, email, meeting_time, conversion_flag,
+                               sentiment, objection, interest_level, summary
+                        FROM calls JOIN call_transcripts ON call_transcripts.call_id = calls.id
+                        WHERE calls.id > ?
+                        ORDER BY calls.id LIMIT ?
+                    """, (cursor, batch_size)) as cur:
+                        rows = await cur.fetchall()
+                if rows:
+                    cursor = rows[-1][0]
+                    scanned += len(rows)
+                    pending.append(loop.run_in_executor(executor, score_batch, rows, overwrite_analysis))
+                else:
+                    exhausted = True
+            # Keep every worker busy, and write finished batches in order
+            if pending and (len(pending) > workers or exhausted):
+                changed = await pending.pop(0)
+                if changed:
+                    async with POOL.writer() as db:
+                        await db.executemany("""
+                            UPDATE calls SET email=?, meeting_time=?, conversion_flag=?,
+                                sentiment=?, objection=?, interest_level=?, summary=?
+                            WHERE id=?
+                        """, changed)
+                    updated += len(changed)
+    return scanned, updated
+
+async def main():
+    await POOL.open()
+    await init_db()
+    started = time.monotonic()
+    scanned, updated = await rescore_calls(overwrite_analysis="--overwrite-analysis" in sys.argv)
+    elapsed = time.monotonic() - started
+    print(f"[CLASSIFIER] Rescored {scanned} calls in {elapsed:.1f}s ({scanned / max(elapsed, 1e-6):.0f} calls/sec), {updated} changed")
+    await POOL.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
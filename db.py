@@ -0,0 +1,217 @@
+import os
+import sys
+import asyncio
+import sqlite3
+import importlib.util
+from contextlib import asynccontextmanager
+import aiosqlite
+from transcripts import decompress
+from phones import normalize_phone
+
+DB_PATH = os.getenv("DATABASE_PATH", "data.db")
+DB_READERS = int(os.getenv("DB_READERS", 4))
+
+# Applied once per connection when the pool opens
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+class ConnectionPool:
+    """Long-lived SQLite connections: several readers and a single serialized writer"""
+
+    def __init__(self, path: str, readers: int = DB_READERS):
+        self.path = path
+        self.size = max(1, readers)
+        self._readers = asyncio.Queue()
+        self._all_readers = []
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self, read_only: bool = False):
+        conn = await aiosqlite.connect(self.path)
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        if read_only:
+            await conn.execute("PRAGMA query_only=ON")
+        await conn.create_function("decompress", 1, decompress, deterministic=True)
+        await conn.create_function("normalize_phone", 1, normalize_phone, deterministic=True)
+        return conn
+
+    async def open(self):
+        """Open the writer first so WAL mode is set before readers attach"""
+        if self.is_open:
+            return
+        self._writer = await self._connect()
+        for _ in range(self.size):
+            conn = await self._connect(read_only=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+        print(f"[DB] Opened pool on {self.path}: {self.size} readers, 1 writer")
+
+    async def close(self):
+        if self._writer is not None:
+            # Refresh planner statistics for the indexes the app actually used
+            await self._writer.execute("PRAGMA optimize")
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        self._readers = asyncio.Queue()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a read-only connection"""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Hold the writer for one transaction; commits on success, rolls back on error"""
+        async with self._write_lock:
+            try:
+                yield self._writer
+                await self._writer.commit()
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+POOL = ConnectionPool(DB_PATH)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", 5000))
+
+def discover_migrations() -> list:
+    """(version, name, path) for each migrations/NNNN_name.sql|.py, in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        stem, ext = os.path.splitext(filename)
+        version, _, name = stem.partition("_")
+        if ext in (".sql", ".py") and version.isdigit():
+            migrations.append((int(version), name, os.path.join(MIGRATIONS_DIR, filename)))
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration version in {MIGRATIONS_DIR}")
+    return migrations
+
+def split_statements(script: str) -> list:
+    """Split a SQL script into statements (executescript would commit mid-migration)"""
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    if any(line.strip() and not line.strip().startswith("--") for line in current.splitlines()):
+        raise ValueError("Migration ends with an incomplete SQL statement")
+    return statements
+
+async def schema_version() -> int:
+    async with POOL.reader() as db:
+        try:
+            async with db.execute("SELECT MAX(version) FROM schema_version") as cur:
+                return (await cur.fetchone())[0] or 0
+        except sqlite3.OperationalError:
+            return 0
+
+async def _is_applied(db, version: int) -> bool:
+    async with db.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)) as cur:
+        return await cur.fetchone() is not None
+
+async def _apply_migration(version: int, name: str, path: str):
+    if path.endswith(".sql"):
+        with open(path) as f:
+            statements = split_statements(f.read())
+        async with POOL.writer() as db:
+            # Take the write lock first so concurrent processes apply it only once
+            await db.execute("BEGIN IMMEDIATE")
+            if await _is_applied(db, version):
+                return
+            for statement in statements:
+                await db.execute(statement)
+            await db.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+    else:
+        # Python migrations manage their own transactions and must be idempotent
+        spec = importlib.util.spec_from_file_location(f"migration_{version:04d}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        await module.migrate(POOL)
+        async with POOL.writer() as db:
+            await db.execute("INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)", (version, name))
+    print(f"[DB] Applied migration {version:04d}_{name}")
+
+async def init_db():
+    """Apply pending migrations; a single version check when the schema is current"""
+    migrations = discover_migrations()
+    current = await schema_version()
+    if current >= migrations[-1][0]:
+        return
+
+    if current == 0:
+        async with POOL.writer() as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+    for version, name, path in migrations:
+        if version > current:
+            await _apply_migration(version, name, path)
+
+async def backfill(pool: ConnectionPool, table: str, assignments: str, where: str, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """UPDATE a large table in short rowid batches so other writers can interleave
+
+    `where` must stop matching a row once `assignments` has been applied to it.
+    """
+    total = 0
+    while True:
+        async with pool.writer() as db:
+            async with db.execute(f"""
+                UPDATE {table} SET {assignments}
+                WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)
+            """, (batch_size,)) as cur:
+                updated = cur.rowcount
+        total += updated
+        if updated < batch_size:
+            return total
+        await asyncio.sleep(0)
+
+async def get_db() -> ConnectionPool:
+    """FastAPI dependency returning the application connection pool"""
+    return POOL
+
+def vacuum(path: str = DB_PATH) -> tuple:
+    """Rewrite the database file without its free pages; returns (bytes before, bytes after)
+
+    VACUUM copies the whole database and blocks every writer until it is done,
+    so it is an offline maintenance command, never part of startup.
+    """
+    before = os.path.getsize(path)
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+    return before, os.path.getsize(path)
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["vacuum"]:
+        sys.exit("usage: python -m db vacuum")
+    before, after = vacuum()
+    print(f"[DB] Vacuumed {DB_PATH}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
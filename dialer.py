@@ -0,0 +1,346 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import httpx
+from db import POOL, init_db
+from http_clients import CLIENTS
+from call_queue import CallQueue
+from events import BUS
+from prompt_registry import PROMPTS
+from dnc import DNC
+
+# Defaults for the adaptive dialer; all of them can be changed at runtime
+CONCURRENCY = int(os.getenv("CONCURRENCY", 3))
+DIAL_RATE = float(os.getenv("DIAL_RATE", 5))
+DIAL_BURST = int(os.getenv("DIAL_BURST", 10))
+MIN_CONCURRENCY = int(os.getenv("MIN_CONCURRENCY", 1))
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", 50))
+DIAL_TARGET_LATENCY = float(os.getenv("DIAL_TARGET_LATENCY", 5.0))
+THROTTLE_PAUSE = float(os.getenv("DIAL_THROTTLE_PAUSE", 2.0))
+SETTINGS_REFRESH = float(os.getenv("DIAL_SETTINGS_REFRESH", 5.0))
+
+# Provider responses that mean "slow down"; the lead is left pending and retried
+RETRYABLE_STATUSES = (429, 503)
+
+class TokenBucket:
+    """Classic token bucket: `rate` dials per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.resume_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for a while, e.g. after a 429 with Retry-After"""
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    async def acquire(self, amount: float = 1):
+        """Wait for `amount` tokens; requests larger than the burst are capped to it"""
+        amount = min(amount, self.burst)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.resume_at:
+                    await asyncio.sleep(self.resume_at - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class AimdLimit:
+    """Additive-increase / multiplicative-decrease concurrency limit"""
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target_latency: float, backoff: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.limit = float(min(max(initial, minimum), maximum))
+        self._last_decrease = 0.0
+
+    @property
+    def current(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    def on_success(self, latency: float):
+        if latency > self.target_latency:
+            self.on_congestion()
+        else:
+            # Roughly +1 for every `limit` successful dials
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_congestion(self):
+        # A burst of 429s from one window should only halve the limit once
+        now = time.monotonic()
+        if now - self._last_decrease < self.target_latency:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * self.backoff)
+
+    def set_bounds(self, minimum: int = None, maximum: int = None):
+        self.minimum = minimum if minimum is not None else self.minimum
+        self.maximum = max(self.minimum, maximum if maximum is not None else self.maximum)
+        self.limit = min(max(self.limit, self.minimum), self.maximum)
+
+def _retry_after(response) -> float:
+    try:
+        return float(response.headers.get("retry-after", THROTTLE_PAUSE))
+    except ValueError:
+        return THROTTLE_PAUSE
+
+async def create_call(lead_id: int, client: httpx.AsyncClient = None):
+    """Create a call via Bland.ai API and return the provider response
+
+    Returns None without dialing for a missing lead or a number on the
+    do-not-call list. Network errors propagate so the scheduler can retry the job.
+    """
+    client = client or CLIENTS.get("bland")
+    async with POOL.reader() as db:
+        async with db.execute("SELECT user_id, contact, COALESCE(normalized_phone, phone), company, prompt_name FROM leads WHERE id=?", (lead_id,)) as cur:
+            row = await cur.fetchone()
+    if not row:
+        return None
+    user_id, contact, phone, company, prompt_name = row
+    if await DNC.is_blocked(phone):
+        async with POOL.writer() as db:
+            await db.execute("UPDATE leads SET status='suppressed' WHERE id=?", (lead_id,))
+        print(f"[DIALER] Skipped lead {lead_id}: number is on the do-not-call list")
+        return None
+    prompt = PROMPTS.render(prompt_name or "default", contact=contact, company=company, phone=phone)
+    
+    # Make Bland.ai API call
+    payload = {
+        "phone_number": phone,
+        "task": prompt,
+        "voice_id": os.getenv("VOICE_ID", "default"),
+        "model": "base",
+        "callback_url": "https://callninja.replit.app/webhook"
+    }
+    headers = {"Authorization": os.getenv("BLAND_API_KEY", "")}
+    
+    r = await client.post("/v1/calls", json=payload, headers=headers)
+    call_id = r.json().get("call_id") if r.status_code == 200 else None
+    if r.status_code in RETRYABLE_STATUSES or r.status_code >= 500:
+        # Throttled or upstream trouble: leave the lead queued so the job can be retried
+        return r
+    
+    # Only hold the writer for the status update, never across the HTTP round trip
+    async with POOL.writer() as db:
+        if call_id:
+            await db.execute("UPDATE leads SET bland_call_id=?, status='calling' WHERE id=?", (call_id, lead_id))
+            await db.execute("INSERT INTO calls (user_id, lead_id, phone, company, prompt_name, call_id) VALUES (?, ?, ?, ?, ?, ?)",
+                             (user_id, lead_id, phone, company, prompt_name, call_id))
+        else:
+            await db.execute("UPDATE leads SET status='failed' WHERE id=?", (lead_id,))
+    if call_id:
+        BUS.publish("dial_started", {"lead_id": lead_id, "call_id": call_id}, user_id)
+    
+    return r
+
+class DialerScheduler:
+    """Claims jobs from the durable call queue and dials them as fast as the provider allows
+
+    `dial(lead_id)` must return the provider's httpx.Response, or None when the
+    lead was not dialed (gone, or on the do-not-call list). Exceptions are
+    treated as retryable failures.
+    """
+
+    def __init__(self, queue, dial, initial_concurrency: int = MAX_CONCURRENCY):
+        self.queue = queue
+        self.dial = dial
+        self.rate = DIAL_RATE
+        self.burst = DIAL_BURST
+        self.limit = AimdLimit(initial_concurrency, MIN_CONCURRENCY, MAX_CONCURRENCY, DIAL_TARGET_LATENCY)
+        self.buckets = {}
+        self.in_flight = 0
+        self.stats = {"dialed": 0, "throttled": 0, "errors": 0, "skipped": 0}
+        self._slots = asyncio.Condition()
+        self._tasks = set()
+        self._runner = None
+        self._settings_sync = None
+
+    def bucket(self, api_key: str) -> TokenBucket:
+        if api_key not in self.buckets:
+            self.buckets[api_key] = TokenBucket(self.rate, self.burst)
+        return self.buckets[api_key]
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+            self._settings_sync = asyncio.create_task(self._sync_settings())
+
+    async def stop(self):
+        tasks = list(self._tasks) + [task for task in (self._runner, self._settings_sync) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._runner = None
+        self._settings_sync = None
+
+    async def configure(self, rate: float = None, burst: int = None, min_concurrency: int = None,
+                        max_concurrency: int = None, concurrency: int = None, target_latency: float = None):
+        """Apply new limits to the running scheduler"""
+        if rate is not None:
+            self.rate = rate
+        if burst is not None:
+            self.burst = burst
+        for bucket in self.buckets.values():
+            bucket.rate, bucket.burst = self.rate, self.burst
+        self.limit.set_bounds(min_concurrency, max_concurrency)
+        if concurrency is not None:
+            self.limit.limit = float(min(max(concurrency, self.limit.minimum), self.limit.maximum))
+        if target_latency is not None:
+            self.limit.target_latency = target_latency
+        async with self._slots:
+            self._slots.notify_all()
+
+    async def load_settings(self) -> dict:
+        async with POOL.reader() as db:
+            async with db.execute("SELECT settings FROM dialer_settings WHERE id = 1") as cur:
+                row = await cur.fetchone()
+        return json.loads(row[0]) if row else {}
+
+    async def save_settings(self, settings: dict):
+        """Persist new limits for every dialer process and apply them here"""
+        merged = {**await self.load_settings(), **settings}
+        async with POOL.writer() as db:
+            await db.execute("""
+                INSERT INTO dialer_settings (id, settings) VALUES (1, ?)
+                ON CONFLICT (id) DO UPDATE SET settings = excluded.settings, updated_at = CURRENT_TIMESTAMP
+            """, (json.dumps(merged),))
+        await self.configure(**settings)
+
+    async def _sync_settings(self):
+        """Pick up limits saved by other processes (e.g. the admin endpoint)"""
+        applied = None
+        while True:
+            try:
+                settings = await self.load_settings()
+                if settings and settings != applied:
+                    await self.configure(**settings)
+                    applied = settings
+            except Exception as e:
+                print(f"[DIALER] Error loading settings: {e}")
+            await asyncio.sleep(SETTINGS_REFRESH)
+
+    def status(self) -> dict:
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "concurrency": self.limit.current,
+            "min_concurrency": self.limit.minimum,
+            "max_concurrency": self.limit.maximum,
+            "target_latency": self.limit.target_latency,
+            "in_flight": self.in_flight,
+            **self.stats,
+        }
+
+    async def _run(self):
+        api_key = os.getenv("BLAND_API_KEY", "")
+        while True:
+            # Wait for a slot and a token before leasing, so a job's lease only
+            # starts once it can be dialed; throttling pauses never outlast it
+            async with self._slots:
+                await self._slots.wait_for(lambda: self.in_flight < self.limit.current)
+                self.in_flight += 1
+            try:
+                await self.bucket(api_key).acquire()
+                jobs = await self.queue.claim(1)
+            except Exception as e:
+                print(f"[DIALER] Error claiming jobs: {e}")
+                jobs = []
+            except BaseException:
+                await self._release_slot()
+                raise
+            if not jobs:
+                await self._release_slot()
+                await self.queue.wait()
+                continue
+
+            task = asyncio.create_task(self._dial(jobs[0], api_key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _release_slot(self):
+        async with self._slots:
+            self.in_flight -= 1
+            self._slots.notify_all()
+
+    async def _dial(self, job, api_key: str):
+        job_id, lead_id, attempts = job
+        started = time.monotonic()
+        try:
+            try:
+                response = await self.dial(lead_id)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"[DIALER] Error dialing lead {lead_id} (attempt {attempts}): {e}")
+                await self.queue.retry(job_id, attempts, error=str(e))
+                return
+
+            latency = time.monotonic() - started
+            if response is not None and response.status_code in RETRYABLE_STATUSES:
+                # Throttling is not the lead's fault, so it does not use up an attempt
+                self.stats["throttled"] += 1
+                self.limit.on_congestion()
+                delay = _retry_after(response)
+                self.bucket(api_key).pause(delay)
+                await self.queue.retry(job_id, attempts, delay=delay, error=f"HTTP {response.status_code}", count_attempt=False)
+                return
+
+            if response is not None and response.status_code >= 500:
+                self.stats["errors"] += 1
+                self.limit.on_congestion()
+                await self.queue.retry(job_id, attempts, error=f"HTTP {response.status_code}")
+                return
+
+            if response is None:
+                self.stats["skipped"] += 1
+            elif response.status_code >= 400:
+                self.stats["errors"] += 1
+            else:
+                self.stats["dialed"] += 1
+                self.limit.on_success(latency)
+            await self.queue.complete(job_id)
+        except Exception as e:
+            print(f"[DIALER] Error updating job {job_id}: {e}")
+        finally:
+            await self._release_slot()
+
+async def run_dialer():
+    """Standalone dialer process consuming the shared call queue"""
+    await POOL.open()
+    CLIENTS.start()
+    await init_db()
+    queue = CallQueue()
+    scheduler = DialerScheduler(queue, create_call, initial_concurrency=CONCURRENCY)
+    refresher = asyncio.create_task(DNC.run_refresher())
+    scheduler.start()
+    print(f"[DIALER] Standalone dialer {queue.worker_id} started")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    print(f"[DIALER] Standalone dialer {queue.worker_id} stopping")
+    await scheduler.stop()
+    refresher.cancel()
+    await asyncio.gather(refresher, return_exceptions=True)
+    await CLIENTS.close()
+    await POOL.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_dialer())
@@ -0,0 +1,248 @@
+import os
+import csv
+import math
+import itertools
+import time
+import asyncio
+from db import POOL
+from phones import normalize_phone
+
+# How often each process picks up numbers added by other processes
+DNC_REFRESH = float(os.getenv("DNC_REFRESH", 5))
+# Bloom filter false positive rate; a positive is confirmed against dnc_numbers
+DNC_FALSE_POSITIVE_RATE = float(os.getenv("DNC_FALSE_POSITIVE_RATE", 0.01))
+DNC_MIN_CAPACITY = int(os.getenv("DNC_MIN_CAPACITY", 100000))
+# Rows per read while loading; each batch is ~20ms of event loop time
+DNC_LOAD_BATCH_SIZE = int(os.getenv("DNC_LOAD_BATCH_SIZE", 5000))
+DNC_IMPORT_BATCH_SIZE = int(os.getenv("DNC_IMPORT_BATCH_SIZE", 10000))
+
+ADD_NUMBER_SQL = "INSERT INTO dnc_numbers (phone, source) VALUES (?, ?) ON CONFLICT (phone) DO NOTHING"
+LOOKUP_SQL = "SELECT 1 FROM dnc_numbers WHERE phone = ?"
+
+_MASK = (1 << 64) - 1
+
+def _mix(key: int) -> int:
+    """splitmix64 finalizer: spreads nearby phone numbers across the whole bit array"""
+    key = (key + 0x9E3779B97F4A7C15) & _MASK
+    key = ((key ^ (key >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    key = ((key ^ (key >> 27)) * 0x94D049BB133111EB) & _MASK
+    return key ^ (key >> 31)
+
+class BloomFilter:
+    """Fixed-size Bloom filter over integer keys, in one bytearray
+
+    About 1.2 bytes per number at a 1% false positive rate, against roughly
+    100 bytes per entry for a set of strings.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = DNC_FALSE_POSITIVE_RATE):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add_many(self, keys):
+        # Double hashing: k positions from the two halves of one 64-bit hash.
+        # Inlined because loading tens of millions of numbers is bound by this loop.
+        bits, size, hashes = self.bits, self.size, self.hashes
+        for key in keys:
+            mixed = _mix(key)
+            position, step = (mixed & 0xFFFFFFFF) % size, ((mixed >> 32) | 1) % size
+            for _ in range(hashes):
+                bits[position >> 3] |= 1 << (position & 7)
+                position += step
+                if position >= size:
+                    position -= size
+            self.count += 1
+
+    def add(self, key: int):
+        self.add_many((key,))
+
+    def __contains__(self, key: int) -> bool:
+        bits, size = self.bits, self.size
+        mixed = _mix(key)
+        position, step = (mixed & 0xFFFFFFFF) % size, ((mixed >> 32) | 1) % size
+        for _ in range(self.hashes):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position += step
+            if position >= size:
+                position -= size
+        return True
+
+def _key(phone: str) -> int:
+    """Integer key for an E.164 number: its digits"""
+    return int(phone[1:])
+
+class DoNotCallList:
+    """Per-process view of dnc_numbers for the dialer
+
+    A Bloom filter answers "definitely not listed" without touching the
+    database; the rare "maybe" is confirmed with a primary key lookup, so
+    false positives never suppress a real lead and numbers deleted from the
+    table stop blocking at once. Until the first load finishes every check
+    goes to the database.
+    """
+
+    def __init__(self):
+        self.filter = None
+        self.stats = {"checks": 0, "lookups": 0, "blocked": 0}
+        self._last_id = 0
+        self._lock = asyncio.Lock()
+
+    async def _read_since(self, last_id: int):
+        """Batches of (id, phone) added after `last_id`, each on a briefly borrowed reader"""
+        while True:
+            async with POOL.reader() as db:
+                async with db.execute("SELECT id, phone FROM dnc_numbers WHERE id > ? ORDER BY id LIMIT ?",
+                                      (last_id, DNC_LOAD_BATCH_SIZE)) as cur:
+                    rows = await cur.fetchall()
+            if not rows:
+                return
+            yield rows
+            last_id = rows[-1][0]
+            # Building the filter is CPU work; let the event loop run between batches
+            await asyncio.sleep(0)
+
+    async def load(self):
+        """Build a filter sized for twice the current list and swap it in"""
+        async with self._lock:
+            started = time.monotonic()
+            async with POOL.reader() as db:
+                async with db.execute("SELECT COUNT(*) FROM dnc_numbers") as cur:
+                    (count,) = await cur.fetchone()
+            bloom = BloomFilter(max(DNC_MIN_CAPACITY, count * 2))
+            last_id = 0
+            async for rows in self._read_since(0):
+                bloom.add_many(_key(phone) for _, phone in rows)
+                last_id = rows[-1][0]
+            self.filter, self._last_id = bloom, last_id
+            print(f"[DNC] Loaded {bloom.count} numbers into a {len(bloom.bits) // 1024} KiB filter "
+                  f"in {time.monotonic() - started:.1f}s")
+
+    async def refresh(self):
+        """Add numbers listed since the last load or refresh"""
+        if self.filter is None:
+            return
+        async with self._lock:
+            async for rows in self._read_since(self._last_id):
+                self.filter.add_many(_key(phone) for _, phone in rows)
+                self._last_id = rows[-1][0]
+        if self.filter.count > self.filter.capacity:
+            # Past capacity the false positive rate climbs; rebuild bigger
+            await self.load()
+
+    async def run_refresher(self, interval: float = DNC_REFRESH):
+        while True:
+            try:
+                if self.filter is None:
+                    await self.load()
+                else:
+                    await self.refresh()
+            except Exception as e:
+                print(f"[DNC] Error loading do-not-call list: {e}")
+            await asyncio.sleep(interval)
+
+    async def is_blocked(self, phone: str) -> bool:
+        """True if the number is on the do-not-call list"""
+        self.stats["checks"] += 1
+        normalized = normalize_phone(phone)
+        if not normalized:
+            return False
+        if self.filter is not None and _key(normalized) not in self.filter:
+            return False
+        self.stats["lookups"] += 1
+        async with POOL.reader() as db:
+            async with db.execute(LOOKUP_SQL, (normalized,)) as cur:
+                blocked = await cur.fetchone() is not None
+        if blocked:
+            self.stats["blocked"] += 1
+        return blocked
+
+    async def add(self, phones: list, source: str = "manual") -> int:
+        """List numbers (any format); returns how many were new"""
+        numbers = [(normalized, source) for normalized in map(normalize_phone, phones) if normalized]
+        async with POOL.writer() as db:
+            async with db.execute("SELECT total_changes()") as cur:
+                (before,) = await cur.fetchone()
+            await db.executemany(ADD_NUMBER_SQL, numbers)
+            async with db.execute("SELECT total_changes()") as cur:
+                (after,) = await cur.fetchone()
+        await self.refresh()
+        return after - before
+
+    async def remove(self, phone: str) -> bool:
+        normalized = normalize_phone(phone)
+        async with POOL.writer() as db:
+            async with db.execute("DELETE FROM dnc_numbers WHERE phone = ?", (normalized,)) as cur:
+                return cur.rowcount > 0
+
+    def status(self) -> dict:
+        bloom = self.filter
+        return {
+            "loaded": bloom is not None,
+            "numbers": bloom.count if bloom else None,
+            "capacity": bloom.capacity if bloom else None,
+            "filter_bytes": len(bloom.bits) if bloom else None,
+            **self.stats,
+        }
+
+    async def import_file(self, job, path: str):
+        """Stream a suppression file into dnc_numbers in short batched transactions
+
+        Takes a CSV with a 'phone' column or a plain list of one number per
+        line. Each batch commits on its own, so a file of millions of numbers
+        never holds the writer for long; a failed import keeps what it added.
+        `job` is a lead_import.ImportJob for progress reporting.
+        """
+        job.status = "running"
+        job.started_at = time.monotonic()
+        try:
+            with open(path, "r", encoding="utf-8-sig", newline="") as f:
+                rows = csv.reader(f)
+                first = next(rows, [])
+                header = [name.strip().lower() for name in first]
+                if "phone" in header:
+                    column, start = header.index("phone"), 2
+                else:
+                    # No header: the first row is already a number
+                    column, start, rows = 0, 1, itertools.chain([first] if first else [], rows)
+
+                batch = []
+                for line, row in enumerate(rows, start=start):
+                    job.rows_processed += 1
+                    normalized = normalize_phone(row[column]) if len(row) > column else None
+                    if not normalized:
+                        job.reject(line, "invalid phone")
+                        continue
+                    batch.append((normalized, "import"))
+                    if len(batch) >= DNC_IMPORT_BATCH_SIZE:
+                        await self._import_batch(job, batch)
+                        batch = []
+                if batch:
+                    await self._import_batch(job, batch)
+
+            job.status = "completed"
+            await self.refresh()
+            print(f"[DNC] Job {job.id}: listed {job.rows_imported} numbers, {job.rows_duplicate} already listed, "
+                  f"rejected {job.rows_rejected} ({job.rows_per_second} rows/sec)")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"[DNC] Job {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.monotonic()
+            os.remove(path)
+
+    async def _import_batch(self, job, batch: list):
+        async with POOL.writer() as db:
+            async with db.execute("SELECT total_changes()") as cur:
+                (before,) = await cur.fetchone()
+            await db.executemany(ADD_NUMBER_SQL, batch)
+            async with db.execute("SELECT total_changes()") as cur:
+                (after,) = await cur.fetchone()
+        job.rows_imported += after - before
+        job.rows_duplicate += len(batch) - (after - before)
+
+DNC = DoNotCallList()
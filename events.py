@@ -0,0 +1,106 @@
+import os
+import json
+import asyncio
+from collections import defaultdict
+from stats import snapshot
+
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 100))
+EVENT_HEARTBEAT = float(os.getenv("EVENT_HEARTBEAT", 15))
+# At most one stats push per interval, however many events arrive
+STATS_PUSH_INTERVAL = float(os.getenv("STATS_PUSH_INTERVAL", 1.0))
+# Catches writes made by other processes (standalone dialers, other API workers)
+STATS_POLL_INTERVAL = float(os.getenv("STATS_POLL_INTERVAL", 5.0))
+
+class EventBus:
+    """In-process pub/sub fanning live updates out to server-sent event streams
+
+    Every stream belongs to one user and only receives that user's events.
+    Stats are pushed as per-user dashboard snapshots, read once per interval
+    for each connected user and only sent when they changed.
+    """
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._stats_due = asyncio.Event()
+        self._last_stats = {}
+        self._watcher = None
+
+    def start(self):
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch_stats())
+
+    async def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        # End every open stream so the server can shut down
+        for queues in list(self._subscribers.values()):
+            for queue in list(queues):
+                self._offer(queue, None)
+
+    def publish(self, event: str, data: dict = None, user_id: int = None):
+        """Send an event to the streams of `user_id`; never blocks the caller
+
+        Events without an owner (test calls) go to everyone, so they must not
+        carry ids or other tenant data.
+        """
+        if user_id is None:
+            targets = [q for queues in self._subscribers.values() for q in queues]
+        else:
+            targets = list(self._subscribers.get(user_id, ()))
+        for queue in targets:
+            self._offer(queue, (event, data))
+        if event != "stats":
+            self._stats_due.set()
+
+    def _offer(self, queue: asyncio.Queue, message):
+        # A slow client loses its oldest events rather than holding up publishers
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    async def _watch_stats(self):
+        while True:
+            try:
+                async with asyncio.timeout(STATS_POLL_INTERVAL):
+                    await self._stats_due.wait()
+            except TimeoutError:
+                pass
+            self._stats_due.clear()
+            for user_id in list(self._subscribers):
+                try:
+                    stats = await snapshot(user_id)
+                    if stats != self._last_stats.get(user_id):
+                        self._last_stats[user_id] = stats
+                        self.publish("stats", stats, user_id)
+                except Exception as e:
+                    print(f"[EVENTS] Error reading stats for user {user_id}: {e}")
+            await asyncio.sleep(STATS_PUSH_INTERVAL)
+
+    async def stream(self, user_id: int):
+        """Server-sent event lines for one client of `user_id`, with keep-alive comments"""
+        queue = asyncio.Queue(maxsize=EVENT_QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    async with asyncio.timeout(EVENT_HEARTBEAT):
+                        message = await queue.get()
+                except TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                event, data = message
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[user_id]
+                    self._last_stats.pop(user_id, None)
+
+BUS = EventBus()
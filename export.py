@@ -0,0 +1,121 @@
+import io
+import os
+import csv
+import json
+from db import POOL
+from pagination import parse_timestamp
+from transcripts import TRANSCRIPT_SQL
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+CALL_COLUMNS = {
+    "id": "calls.id",
+    "call_id": "calls.call_id",
+    "lead_id": "calls.lead_id",
+    "contact": "leads.contact",
+    "phone": "calls.phone",
+    "company": "calls.company",
+    "campaign": "COALESCE(calls.prompt_name, leads.prompt_name)",
+    "status": "calls.status",
+    "outcome": "calls.outcome",
+    "duration": "calls.duration",
+    "conversion_flag": "calls.conversion_flag",
+    "meeting_time": "calls.meeting_time",
+    "email": "calls.email",
+    "sentiment": "calls.sentiment",
+    "objection": "calls.objection",
+    "interest_level": "calls.interest_level",
+    "summary": "calls.summary",
+    "transcript": TRANSCRIPT_SQL,
+    "created_at": "calls.created_at",
+}
+
+LEAD_COLUMNS = {
+    "id": "leads.id",
+    "contact": "leads.contact",
+    "phone": "leads.phone",
+    "company": "leads.company",
+    "email": "leads.email",
+    "status": "leads.status",
+    "lead_status": "leads.lead_status",
+    "campaign": "leads.prompt_name",
+    "is_sample": "leads.is_sample",
+    "last_contacted_at": "leads.last_contacted_at",
+    "created_at": "leads.created_at",
+}
+
+# name -> (FROM clause, table whose id and user_id key the export, columns)
+# A campaign is the prompt a lead was uploaded with.
+EXPORTS = {
+    "calls": ("calls LEFT JOIN leads ON leads.id = calls.lead_id", "calls", CALL_COLUMNS),
+    "leads": ("leads", "leads", LEAD_COLUMNS),
+}
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def export_query(name: str, user_id: int, since: str = None, until: str = None, campaign: str = None) -> tuple:
+    """(sql, params) for one batch of an export; the caller appends the last id and the batch size"""
+    source, table, columns = EXPORTS[name]
+    where, params = [f"{table}.user_id = ?"], [user_id]
+    if since:
+        where.append(f"{table}.created_at >= ?")
+        params.append(parse_timestamp(since))
+    if until:
+        where.append(f"{table}.created_at < ?")
+        params.append(parse_timestamp(until))
+    if campaign:
+        where.append(f"{columns['campaign']} = ?")
+        params.append(campaign)
+    sql = f"""
+        SELECT {', '.join(columns.values())} FROM {source}
+        WHERE {' AND '.join(where)} AND {table}.id > ?
+        ORDER BY {table}.id LIMIT ?
+    """
+    return sql, params
+
+async def export_rows(name: str, user_id: int, since: str = None, until: str = None, campaign: str = None,
+                      batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield batches of one user's rows in id order
+
+    Each batch borrows a reader only for its own query and resumes after the
+    last id, so an export holds no long read transaction (which would stop WAL
+    checkpoints) and never ties up a connection while the client is slow.
+    """
+    sql, params = export_query(name, user_id, since, until, campaign)
+    last_id = 0
+    while True:
+        async with POOL.reader() as db:
+            async with db.execute(sql, (*params, last_id, batch_size)) as cur:
+                rows = await cur.fetchall()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1][0]
+
+async def stream_csv(names: list, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    async for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def stream_ndjson(names: list, batches):
+    async for rows in batches:
+        yield "".join(json.dumps(dict(zip(names, row))) + "\n" for row in rows)
+
+def export_stream(name: str, fmt: str, user_id: int, since: str = None, until: str = None, campaign: str = None):
+    """Encoded chunks for StreamingResponse; ValueError for bad dates"""
+    # Check the dates before the response starts, so bad input is a 400
+    for value in (since, until):
+        if value:
+            parse_timestamp(value)
+    names = list(EXPORTS[name][2])
+    batches = export_rows(name, user_id, since, until, campaign)
+    return stream_csv(names, batches) if fmt == "csv" else stream_ndjson(names, batches)
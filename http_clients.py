@@ -0,0 +1,60 @@
+import os
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Per-upstream settings, overridable with <NAME>_BASE_URL, <NAME>_MAX_CONNECTIONS,
+# <NAME>_MAX_KEEPALIVE, <NAME>_TIMEOUT and <NAME>_CONNECT_TIMEOUT
+UPSTREAMS = {
+    "bland": {"base_url": "https://api.bland.ai", "max_connections": 100, "max_keepalive": 50, "timeout": 60.0, "connect_timeout": 10.0},
+    "openai": {"base_url": "https://api.openai.com", "max_connections": 20, "max_keepalive": 10, "timeout": 60.0, "connect_timeout": 10.0},
+}
+
+def _setting(name: str, key: str, cast):
+    return cast(os.getenv(f"{name.upper()}_{key.upper()}", UPSTREAMS[name][key]))
+
+class ClientRegistry:
+    """One keep-alive httpx.AsyncClient per upstream API, shared for the life of the process"""
+
+    def __init__(self):
+        self._clients = {}
+
+    def _build(self, name: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=_setting(name, "max_connections", int),
+            max_keepalive_connections=_setting(name, "max_keepalive", int),
+            keepalive_expiry=30.0,
+        )
+        timeout = httpx.Timeout(_setting(name, "timeout", float), connect=_setting(name, "connect_timeout", float))
+        return httpx.AsyncClient(
+            base_url=_setting(name, "base_url", str),
+            limits=limits,
+            timeout=timeout,
+            http2=HTTP2_AVAILABLE,
+        )
+
+    def start(self):
+        for name in UPSTREAMS:
+            self.get(name)
+        print(f"[HTTP] Client pool ready for {', '.join(UPSTREAMS)} (http2={HTTP2_AVAILABLE})")
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._clients[name] = self._build(name)
+        return client
+
+    async def close(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+CLIENTS = ClientRegistry()
+
+def get_bland_client() -> httpx.AsyncClient:
+    """FastAPI dependency for the shared Bland.ai client"""
+    return CLIENTS.get("bland")
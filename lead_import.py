@@ -0,0 +1,284 @@
+import os
+import csv
+import time
+import uuid
+import asyncio
+import tempfile
+from db import POOL
+from events import BUS
+from phones import normalize_phone
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_REPORTED_REJECTS = 100
+MAX_FINISHED_JOBS = 50
+# A running job whose row has not moved for this long was interrupted and may be resumed
+IMPORT_STALE_AFTER = float(os.getenv("IMPORT_STALE_AFTER", 300))
+
+# In-memory progress for running and recently finished imports, keyed by job ID;
+# lead imports are also kept in import_jobs
+IMPORT_JOBS = {}
+
+SAVE_JOB_SQL = """
+    INSERT INTO import_jobs (id, user_id, filename, path, mode, prompt_name, status,
+                             rows_processed, rows_imported, rows_duplicate, rows_rejected, error)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        path = excluded.path, status = excluded.status, rows_processed = excluded.rows_processed,
+        rows_imported = excluded.rows_imported, rows_duplicate = excluded.rows_duplicate,
+        rows_rejected = excluded.rows_rejected, error = excluded.error, updated_at = CURRENT_TIMESTAMP
+"""
+LOAD_JOB_SQL = """
+    SELECT id, user_id, filename, path, mode, prompt_name, status, rows_processed, rows_imported, rows_duplicate,
+           rows_rejected, error, updated_at < datetime('now', ?)
+    FROM import_jobs WHERE id = ?
+"""
+
+# Each batch is staged here, then applied to leads with one INSERT ... SELECT
+STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS import_batch (
+        user_id INTEGER, phone TEXT, normalized_phone TEXT, company TEXT, contact TEXT, prompt_name TEXT, import_job_id TEXT
+    )
+"""
+STAGE_SQL = "INSERT INTO import_batch VALUES (?, ?, ?, ?, ?, ?, ?)"
+# Distinct numbers in the batch that the user has no lead for yet
+NEW_NUMBERS_SQL = """
+    SELECT COUNT(DISTINCT normalized_phone) FROM import_batch b
+    WHERE NOT EXISTS (SELECT 1 FROM leads WHERE leads.user_id = b.user_id AND leads.normalized_phone = b.normalized_phone)
+"""
+# WHERE true keeps SQLite from reading ON CONFLICT as a join constraint
+INSERT_LEADS_SQL = """
+    INSERT INTO leads (user_id, phone, normalized_phone, company, contact, prompt_name, import_job_id)
+    SELECT user_id, phone, normalized_phone, company, contact, prompt_name, import_job_id FROM import_batch WHERE true ORDER BY rowid
+    ON CONFLICT (user_id, normalized_phone) DO {}
+"""
+
+# What an imported row does to an existing lead with the same number:
+# skip leaves it alone, upsert overwrites it with the row, merge only fills in its blank fields
+IMPORT_MODES = {
+    "skip": INSERT_LEADS_SQL.format("NOTHING"),
+    "upsert": INSERT_LEADS_SQL.format("""UPDATE SET
+        phone = excluded.phone, company = excluded.company, contact = excluded.contact, prompt_name = excluded.prompt_name"""),
+    "merge": INSERT_LEADS_SQL.format("""UPDATE SET
+        company = COALESCE(NULLIF(company, ''), excluded.company), contact = COALESCE(NULLIF(contact, ''), excluded.contact)"""),
+}
+# Rollback only removes leads nobody has queued or dialed yet
+ROLLBACK_SQL = """
+    DELETE FROM leads WHERE rowid IN (
+        SELECT rowid FROM leads WHERE import_job_id = ? AND status = 'pending' LIMIT ?
+    )
+"""
+
+class ImportJob:
+    """Progress of a single CSV lead import"""
+
+    def __init__(self, user_id: int, prompt_name: str, filename: str, mode: str = "skip"):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.prompt_name = prompt_name
+        self.filename = filename
+        self.mode = mode
+        self.path = None
+        self.status = "queued"
+        self.rows_processed = 0
+        self.rows_imported = 0
+        # Rows whose number matched an existing lead (or an earlier row), handled per mode
+        self.rows_duplicate = 0
+        self.rows_rejected = 0
+        self.rejects = []
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.stale = False
+
+    def reject(self, line: int, reason: str):
+        self.rows_rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({"line": line, "reason": reason})
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.started_at:
+            return 0.0
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0.0
+
+    @property
+    def resumable(self) -> bool:
+        return self.status == "failed" or (self.stale and self.status in ("queued", "running"))
+
+    def counters(self) -> tuple:
+        return self.rows_processed, self.rows_imported, self.rows_duplicate, self.rows_rejected, len(self.rejects)
+
+    def restore(self, counters: tuple):
+        """Go back to the progress of the last committed batch"""
+        self.rows_processed, self.rows_imported, self.rows_duplicate, self.rows_rejected, rejects = counters
+        del self.rejects[rejects:]
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "mode": self.mode,
+            "rows_processed": self.rows_processed,
+            "rows_imported": self.rows_imported,
+            "rows_duplicate": self.rows_duplicate,
+            "rows_rejected": self.rows_rejected,
+            "rows_per_second": self.rows_per_second,
+            "rejects": self.rejects,
+            "error": self.error,
+            "resumable": self.resumable,
+        }
+
+def create_import_job(user_id: int, prompt_name: str, filename: str, mode: str = "skip") -> ImportJob:
+    """Register a new import job, dropping the oldest finished jobs"""
+    finished = [job_id for job_id, job in IMPORT_JOBS.items() if job.status in ("completed", "failed")]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del IMPORT_JOBS[job_id]
+
+    job = ImportJob(user_id, prompt_name, filename, mode)
+    IMPORT_JOBS[job.id] = job
+    return job
+
+async def spool_upload(upload) -> str:
+    """Copy an UploadFile to a private temp file in fixed-size chunks"""
+    fd, path = tempfile.mkstemp(prefix="leads-", suffix=".csv")
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+    return path
+
+async def _save_job(db, job: ImportJob):
+    await db.execute(SAVE_JOB_SQL, (job.id, job.user_id, job.filename, job.path, job.mode, job.prompt_name, job.status,
+                                    job.rows_processed, job.rows_imported, job.rows_duplicate, job.rows_rejected, job.error))
+
+async def load_import_job(job_id: str):
+    """A lead import job from this process, or from import_jobs after a restart"""
+    job = IMPORT_JOBS.get(job_id)
+    if job:
+        return job
+    async with POOL.reader() as db:
+        async with db.execute(LOAD_JOB_SQL, (f"-{IMPORT_STALE_AFTER} seconds", job_id)) as cur:
+            row = await cur.fetchone()
+    if not row:
+        return None
+    job = ImportJob(row[1], row[5], row[2], row[4])
+    job.id, job.path, job.status = row[0], row[3], row[6]
+    job.rows_processed, job.rows_imported, job.rows_duplicate, job.rows_rejected = row[7:11]
+    job.error, job.stale = row[11], bool(row[12])
+    return job
+
+async def _write_batch(job: ImportJob, batch: list):
+    """Apply one batch to leads as a set, deduplicated on (user_id, normalized_phone), and record progress"""
+    async with POOL.writer() as db:
+        # Take the write lock before reading leads: a deferred transaction that
+        # reads first fails outright if another process commits before the insert
+        await db.execute("BEGIN IMMEDIATE")
+        await db.execute(STAGING_SQL)
+        await db.executemany(STAGE_SQL, batch)
+        async with db.execute(NEW_NUMBERS_SQL) as cur:
+            (new,) = await cur.fetchone()
+        await db.execute(IMPORT_MODES[job.mode])
+        await db.execute("DELETE FROM import_batch")
+        job.rows_imported += new
+        job.rows_duplicate += len(batch) - new
+        await _save_job(db, job)
+
+async def run_import(job: ImportJob, path: str):
+    """Stream a spooled CSV into leads, one short transaction per batch
+
+    Each batch commits together with the job's progress in import_jobs and
+    then yields the writer, so webhooks, the dialer and logins are not held up
+    by a large file. A failed job keeps its file and committed batches; it can
+    be run again to resume after the last batch, or rolled back.
+    """
+    job.path = path
+    job.status = "running"
+    job.error = None
+    job.stale = False
+    job.started_at = time.monotonic()
+    IMPORT_JOBS[job.id] = job
+    # Rows already committed by an earlier run of this job
+    skip = job.rows_processed
+    committed = job.counters()
+    try:
+        async with POOL.writer() as db:
+            await _save_job(db, job)
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or "phone" not in reader.fieldnames:
+                raise ValueError("CSV must have a 'phone' column")
+
+            batch = []
+            for row in reader:
+                if skip:
+                    skip -= 1
+                    continue
+                job.rows_processed += 1
+                phone = (row.get("phone") or "").strip()
+                if not phone:
+                    job.reject(reader.line_num, "missing phone")
+                    continue
+                normalized = normalize_phone(phone)
+                if not normalized:
+                    job.reject(reader.line_num, f"invalid phone {phone!r}")
+                    continue
+
+                batch.append((job.user_id, phone, normalized, row.get("company"), row.get("contact"), job.prompt_name, job.id))
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await _write_batch(job, batch)
+                    committed = job.counters()
+                    batch = []
+                    await asyncio.sleep(0)
+
+            if batch:
+                await _write_batch(job, batch)
+                committed = job.counters()
+
+        job.status = "completed"
+        job.path = None
+        async with POOL.writer() as db:
+            await _save_job(db, job)
+        os.remove(path)
+        BUS.publish("leads_imported", {"imported": job.rows_imported}, job.user_id)
+        print(f"[IMPORT] Job {job.id}: imported {job.rows_imported} leads, {job.rows_duplicate} duplicates ({job.mode}), "
+              f"rejected {job.rows_rejected} ({job.rows_per_second} rows/sec)")
+    except Exception as e:
+        # Batches committed so far stay; the job resumes after the last one
+        job.restore(committed)
+        job.status = "failed"
+        job.error = str(e)
+        try:
+            async with POOL.writer() as db:
+                await _save_job(db, job)
+        except Exception as save_error:
+            print(f"[IMPORT] Could not record failure of job {job.id}: {save_error}")
+        print(f"[IMPORT] Job {job.id} failed after {job.rows_processed} rows: {e}")
+    finally:
+        job.finished_at = time.monotonic()
+
+async def rollback_import(job: ImportJob):
+    """Delete the leads a job created that have not been queued or dialed yet, in short batches"""
+    removed = 0
+    while True:
+        async with POOL.writer() as db:
+            async with db.execute(ROLLBACK_SQL, (job.id, IMPORT_BATCH_SIZE)) as cur:
+                deleted = cur.rowcount
+        removed += deleted
+        if deleted < IMPORT_BATCH_SIZE:
+            break
+        await asyncio.sleep(0)
+
+    if job.path and os.path.exists(job.path):
+        os.remove(job.path)
+    job.path = None
+    job.status = "rolled_back"
+    job.rows_imported = max(0, job.rows_imported - removed)
+    async with POOL.writer() as db:
+        await _save_job(db, job)
+    print(f"[IMPORT] Job {job.id} rolled back: removed {removed} leads, kept {job.rows_imported} already in a campaign")
+    return removed
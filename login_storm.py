@@ -0,0 +1,79 @@
+"""Webhook latency while a burst of logins hashes passwords
+
+    python -m login_storm [logins]
+
+Posts a steady stream of webhooks to the app in-process and reports their
+p50/p99 latency with no logins, during a storm of concurrent logins, and
+during the same storm with bcrypt run inline on the event loop (the old
+behaviour) for comparison. Uses a scratch database unless DATABASE_PATH is set.
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="login-storm-"), "bench.db"))
+os.environ.setdefault("DIALER_MODE", "off")
+os.environ.setdefault("ANALYSIS_MODE", "off")
+
+import bcrypt
+import httpx
+import main
+
+WEBHOOK_INTERVAL = 0.01
+SETTLE = 0.5
+
+def percentile(samples: list, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+async def inline_verify_password(password: str, hashed: str) -> bool:
+    """verify_password as it was before the thread pool: blocks the loop"""
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+async def measure(client: httpx.AsyncClient, logins: int, label: str) -> dict:
+    """Webhook latencies (seconds) while `logins` concurrent logins run"""
+    latencies, done = [], asyncio.Event()
+
+    async def webhooks():
+        i = 0
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.post("/webhook", json={"call_id": f"{label}-{i}", "outcome": "completed", "transcript": "hi"})
+            latencies.append(time.perf_counter() - started)
+            i += 1
+            await asyncio.sleep(WEBHOOK_INTERVAL)
+
+    sender = asyncio.create_task(webhooks())
+    await asyncio.sleep(SETTLE)
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(client.post("/api/login", json={"email": "demo@outboundfox.com", "password": "demo123"})
+                                       for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(SETTLE)
+    done.set()
+    await sender
+    if any(r.status_code != 200 for r in responses):
+        raise RuntimeError(f"{label}: logins failed with {sorted({r.status_code for r in responses})}")
+    return {"label": label, "logins": logins, "seconds": elapsed, "webhooks": len(latencies),
+            "p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99), "max": max(latencies)}
+
+async def run(logins: int) -> list:
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            results.append(await measure(client, 0, "idle"))
+            results.append(await measure(client, logins, "storm"))
+            threaded, main.verify_password = main.verify_password, inline_verify_password
+            try:
+                results.append(await measure(client, logins, "inline"))
+            finally:
+                main.verify_password = threaded
+    return results
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    for r in asyncio.run(run(logins)):
+        print(f"{r['label']:<7} {r['logins']:>3} logins in {r['seconds']:5.2f}s | {r['webhooks']:>4} webhooks "
+              f"p50 {r['p50'] * 1000:6.1f} ms  p99 {r['p99'] * 1000:6.1f} ms  max {r['max'] * 1000:6.1f} ms")
@@ -1,18 +1,30 @@
 import os
 import asyncio
 import uvicorn
-import json
-import bcrypt
 import jwt
+import uuid
 from datetime import datetime, timedelta
-from fastapi import FastAPI, UploadFile, Form, BackgroundTasks, HTTPException, Depends, Request
+from fastapi import FastAPI, UploadFile, Form, BackgroundTasks, HTTPException, Depends, Request, Response, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import aiosqlite
-import csv
-import io
 import httpx
+from db import POOL, ConnectionPool, get_db, init_db
+from http_clients import CLIENTS, get_bland_client
+from call_queue import CallQueue
+from dialer import DialerScheduler, create_call, CONCURRENCY
+from stats import read_counters, stats_summary, campaign_summary, run_reconciler
+from rollups import analytics
+from events import BUS
+from webhooks import WebhookConsumer
+from analysis import AnalysisService
+from prompt_registry import PROMPTS, DEFAULT_PROMPT
+from pagination import MAX_PAGE_SIZE, fetch_page, parse_fields
+from export import MEDIA_TYPES, export_stream
+from transcripts import TRANSCRIPT_SQL
+from auth import AUTH, revocation_key, hash_password, verify_password, needs_rehash
+from lead_import import IMPORT_JOBS, IMPORT_MODES, create_import_job, spool_upload, run_import, load_import_job, rollback_import
+from dnc import DNC
 
 app = FastAPI()
 
@@ -28,101 +40,31 @@ JWT_EXPIRATION_HOURS = 24
 security = HTTPBearer(auto_error=False)
 
 # Global queue and database
-QUEUE = asyncio.Queue()
-CONCURRENCY = int(os.getenv("CONCURRENCY", 3))
-CALLERS = []
-
-async def init_db():
-    db = await aiosqlite.connect("data.db")
-    
-    # Users table
-    await db.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    await db.execute("""
-        CREATE TABLE IF NOT EXISTS leads (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            phone TEXT NOT NULL,
-            company TEXT,
-            contact TEXT,
-            status TEXT DEFAULT 'pending',
-            prompt_name TEXT DEFAULT 'default',
-            bland_call_id TEXT,
-            is_sample BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    """)
-    await db.execute("""
-        CREATE TABLE IF NOT EXISTS calls (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            lead_id INTEGER,
-            phone TEXT,
-            company TEXT,
-            status TEXT DEFAULT 'queued',
-            call_id TEXT,
-            prompt_name TEXT,
-            outcome TEXT,
-            transcript TEXT,
-            duration INTEGER,
-            conversion_flag INTEGER DEFAULT 0,
-            sentiment TEXT,
-            objection TEXT,
-            interest_level TEXT,
-            summary TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (lead_id) REFERENCES leads (id)
-        )
-    """)
-    
-    # Add migration columns if they don't exist (migration for existing databases)
-    try:
-        await db.execute("ALTER TABLE leads ADD COLUMN is_sample BOOLEAN DEFAULT FALSE")
-        await db.commit()
-    except Exception:
-        pass
-    
-    try:
-        await db.execute("ALTER TABLE leads ADD COLUMN user_id INTEGER")
-        await db.commit()
-    except Exception:
-        pass
-    
-    try:
-        await db.execute("ALTER TABLE calls ADD COLUMN user_id INTEGER")
-        await db.commit()
-    except Exception:
-        pass
-    
-    await db.commit()
-    await db.close()
-
-async def get_db():
-    return await aiosqlite.connect("data.db")
+QUEUE = CallQueue()
+# "embedded" runs the dialer inside the API process; "off" serves the API only
+# and leaves dialing to `python -m dialer`
+DIALER_MODE = os.getenv("DIALER_MODE", "embedded")
+# Same for transcript analysis; "off" leaves it to `python -m analysis`
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "embedded")
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
+USER_BY_ID_SQL = "SELECT id, email FROM users WHERE id = ?"
+USER_BY_EMAIL_SQL = "SELECT id, email, password_hash FROM users WHERE email = ?"
+# Another user's call is reported as not found
+CALL_TRANSCRIPT_SQL = f"SELECT {TRANSCRIPT_SQL} FROM calls WHERE id = ? AND user_id = ?"
+# Test calls are the ones dialed without a lead
+TEST_CALLS_SQL = f"""
+    SELECT phone, company, outcome, {TRANSCRIPT_SQL}, duration, call_id, created_at FROM calls
+    WHERE lead_id IS NULL AND call_id IS NOT NULL ORDER BY created_at DESC LIMIT 10
+"""
 
 # Authentication utilities
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-
-def verify_password(password: str, hashed: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
-
 def create_jwt_token(user_id: int, email: str) -> str:
     """Create a JWT token for a user"""
     payload = {
         'user_id': user_id,
         'email': email,
+        'jti': uuid.uuid4().hex,
         'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
@@ -137,12 +79,19 @@ def decode_jwt_token(token: str) -> dict:
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: ConnectionPool = Depends(get_db)):
     """Get the current authenticated user"""
     if not credentials:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    payload = decode_jwt_token(credentials.credentials)
+    token = credentials.credentials
+    user = AUTH.get(token)
+    if user:
+        return user
+    
+    payload = decode_jwt_token(token)
+    if AUTH.is_revoked(revocation_key(token, payload)):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
     user_id = payload.get('user_id')
     email = payload.get('email')
     
@@ -150,148 +99,107 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise HTTPException(status_code=401, detail="Invalid token payload")
     
     # Verify user exists in database
-    db = await get_db()
-    async with db.execute("SELECT id, email FROM users WHERE id = ?", (user_id,)) as cursor:
-        user = await cursor.fetchone()
-    await db.close()
+    async with db.reader() as conn:
+        async with conn.execute(USER_BY_ID_SQL, (user_id,)) as cursor:
+            user = await cursor.fetchone()
     
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     
-    return {"id": user[0], "email": user[1]}
+    user = {"id": user[0], "email": user[1]}
+    AUTH.put(token, payload, user)
+    return user
 
-async def get_current_user_optional(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_current_user_optional(credentials: HTTPAuthorizationCredentials = Depends(security), db: ConnectionPool = Depends(get_db)):
     """Get the current user if authenticated, otherwise return None"""
     if not credentials:
         return None
     
     try:
-        return await get_current_user(credentials)
+        return await get_current_user(credentials, db)
     except HTTPException:
         return None
 
 async def create_demo_user():
     """Create demo user and load sample data"""
-    db = await get_db()
-    
-    # Check if demo user exists
-    async with db.execute("SELECT id FROM users WHERE email = ?", ("demo@outboundfox.com",)) as cursor:
-        demo_user = await cursor.fetchone()
-    
-    if not demo_user:
-        # Create demo user
-        password_hash = hash_password("demo123")
-        await db.execute("""
-            INSERT INTO users (email, password_hash)
-            VALUES (?, ?)
-        """, ("demo@outboundfox.com", password_hash))
-        await db.commit()
-        
-        # Get the demo user ID
+    async with POOL.writer() as db:
+        # Check if demo user exists
         async with db.execute("SELECT id FROM users WHERE email = ?", ("demo@outboundfox.com",)) as cursor:
             demo_user = await cursor.fetchone()
         
-        print("[STARTUP] Created demo user: demo@outboundfox.com")
-    
-    if demo_user:
-        demo_user_id = demo_user[0]
-    else:
-        # Get the newly created demo user ID
-        async with db.execute("SELECT id FROM users WHERE email = ?", ("demo@outboundfox.com",)) as cursor:
-            demo_user = await cursor.fetchone()
+        if not demo_user:
+            # Create demo user
+            password_hash = await hash_password("demo123")
+            async with db.execute("""
+                INSERT INTO users (email, password_hash)
+                VALUES (?, ?)
+            """, ("demo@outboundfox.com", password_hash)) as cursor:
+                demo_user = (cursor.lastrowid,)
+            
+            print("[STARTUP] Created demo user: demo@outboundfox.com")
+        
         demo_user_id = demo_user[0]
-    
-    # Check if demo user has sample leads
-    async with db.execute("SELECT COUNT(*) FROM leads WHERE user_id = ? AND is_sample = TRUE", (demo_user_id,)) as cursor:
-        result = await cursor.fetchone()
-        sample_count = result[0] if result else 0
-    
-    if sample_count == 0:
-        print("[STARTUP] Loading sample restaurant data for demo user...")
-        sample_leads = [
-            ("3rd Cousin", "14158143709", "919 Cortland Ave, San Francisco, CA 94110, United States"),
-            ("The Grove - Yerba Buena", "14156559194", "QHPX+J6 Yerba Buena, San Francisco, CA, USA"),
-            ("Fog Harbor Fish House", "14154212442", "39 Pier, San Francisco, CA 94133, United States"),
-            ("Chez Maman East", "14156559542", "QJ63+X7 Potrero Hill, San Francisco, CA, USA"),
-            ("Sotto Mare", "14153983181", "QHXR+WM North Beach, San Francisco, CA, USA"),
-            ("Gary Danko", "14157492060", "RH4H+8Q Fort Mason, San Francisco, CA, USA"),
-            ("Kokkari Estiatorio", "14159810983", "QJW2+R3 Northern Waterfront, San Francisco, CA, USA"),
-            ("Delancey Street Restaurant", "14155125179", "QJM6+PJ South Beach, San Francisco, CA, USA"),
-            ("Serafina", "14158741936", "QHWM+QR Russian Hill, San Francisco, CA, USA"),
-        ]
         
-        for contact, phone, company in sample_leads:
-            await db.execute("""
+        # Check if demo user has sample leads
+        async with db.execute("SELECT COUNT(*) FROM leads WHERE user_id = ? AND is_sample = TRUE", (demo_user_id,)) as cursor:
+            result = await cursor.fetchone()
+            sample_count = result[0] if result else 0
+        
+        if sample_count == 0:
+            print("[STARTUP] Loading sample restaurant data for demo user...")
+            sample_leads = [
+                ("3rd Cousin", "14158143709", "919 Cortland Ave, San Francisco, CA 94110, United States"),
+                ("The Grove - Yerba Buena", "14156559194", "QHPX+J6 Yerba Buena, San Francisco, CA, USA"),
+                ("Fog Harbor Fish House", "14154212442", "39 Pier, San Francisco, CA 94133, United States"),
+                ("Chez Maman East", "14156559542", "QJ63+X7 Potrero Hill, San Francisco, CA, USA"),
+                ("Sotto Mare", "14153983181", "QHXR+WM North Beach, San Francisco, CA, USA"),
+                ("Gary Danko", "14157492060", "RH4H+8Q Fort Mason, San Francisco, CA, USA"),
+                ("Kokkari Estiatorio", "14159810983", "QJW2+R3 Northern Waterfront, San Francisco, CA, USA"),
+                ("Delancey Street Restaurant", "14155125179", "QJM6+PJ South Beach, San Francisco, CA, USA"),
+                ("Serafina", "14158741936", "QHWM+QR Russian Hill, San Francisco, CA, USA"),
+            ]
+            
+            await db.executemany("""
                 INSERT INTO leads (user_id, contact, phone, company, status, is_sample, prompt_name)
                 VALUES (?, ?, ?, ?, 'sample', TRUE, 'default')
-            """, (demo_user_id, contact, phone, company))
-        
-        await db.commit()
-        print(f"[STARTUP] Loaded {len(sample_leads)} sample restaurant leads for demo user")
-    
-    await db.close()
-
-async def create_call(lead_id: int):
-    """Create a call via Bland.ai API"""
-    db = await get_db()
-    async with db.execute("SELECT phone, company, prompt_name FROM leads WHERE id=?", (lead_id,)) as cur:
-        row = await cur.fetchone()
-        if not row:
-            await db.close()
-            return
-        phone, company, prompt_name = row
-    
-    # Get prompt content
-    try:
-        with open(f"prompts/{prompt_name}.txt", "r") as f:
-            prompt = f.read().replace("${rep_name}", "Alex").replace("${company}", company or "your company")
-    except:
-        prompt = "Hi, this is Alex from Luma. Quick question—are you happy with how many qualified leads you're getting each month?"
-    
-    # Make Bland.ai API call
-    payload = {
-        "phone_number": phone,
-        "task": prompt,
-        "voice_id": os.getenv("VOICE_ID", "default"),
-        "model": "base",
-        "callback_url": "https://callninja.replit.app/webhook"
-    }
-    headers = {"Authorization": os.getenv("BLAND_API_KEY", "")}
-    
-    async with httpx.AsyncClient(timeout=60) as client:
-        try:
-            r = await client.post("https://api.bland.ai/v1/calls", json=payload, headers=headers)
-            if r.status_code == 200:
-                call_id = r.json().get("call_id")
-                await db.execute("UPDATE leads SET bland_call_id=?, status='calling' WHERE id=?", (call_id, lead_id))
-                await db.execute("INSERT INTO calls (lead_id, phone, company) VALUES (?, ?, ?)", (lead_id, phone, company))
-                await db.commit()
-            else:
-                await db.execute("UPDATE leads SET status='failed' WHERE id=?", (lead_id,))
-                await db.commit()
-        except Exception as e:
-            await db.execute("UPDATE leads SET status='failed' WHERE id=?", (lead_id,))
-            await db.commit()
-    
-    await db.close()
+            """, [(demo_user_id, contact, phone, company) for contact, phone, company in sample_leads])
+            
+            print(f"[STARTUP] Loaded {len(sample_leads)} sample restaurant leads for demo user")
 
-async def worker():
-    """Background worker to process call queue"""
-    while True:
-        try:
-            lead_id = await QUEUE.get()
-            await create_call(lead_id)
-            QUEUE.task_done()
-        except Exception as e:
-            print(f"Worker error: {e}")
+SCHEDULER = DialerScheduler(QUEUE, create_call, initial_concurrency=CONCURRENCY)
+ANALYZER = AnalysisService()
+BACKGROUND_TASKS = []
 
 @app.on_event("startup")
 async def startup():
+    await POOL.open()
+    CLIENTS.start()
     await init_db()
     await create_demo_user()
-    for _ in range(CONCURRENCY):
-        task = asyncio.create_task(worker())
-        CALLERS.append(task)
+    await AUTH.load_revocations()
+    if DIALER_MODE == "embedded":
+        SCHEDULER.start()
+    BUS.start()
+    WEBHOOKS.start()
+    if ANALYSIS_MODE == "embedded":
+        ANALYZER.start()
+    BACKGROUND_TASKS.append(asyncio.create_task(run_reconciler()))
+    BACKGROUND_TASKS.append(asyncio.create_task(AUTH.run_refresher()))
+    # Loads the do-not-call filter, then keeps it current; dial checks use the database until then
+    BACKGROUND_TASKS.append(asyncio.create_task(DNC.run_refresher()))
+
+@app.on_event("shutdown")
+async def shutdown():
+    await BUS.stop()
+    await WEBHOOKS.stop()
+    await ANALYZER.stop()
+    await SCHEDULER.stop()
+    for task in BACKGROUND_TASKS:
+        task.cancel()
+    await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+    BACKGROUND_TASKS.clear()
+    await CLIENTS.close()
+    await POOL.close()
 
 @app.get("/")
 async def serve_landing():
@@ -307,11 +215,11 @@ async def serve_app():
 
 @app.get("/healthz")
 async def health_check():
-    return {"status": "ok", "queue": QUEUE.qsize()}
+    return {"status": "ok", "queue": await QUEUE.depth(), "webhook_backlog": await WEBHOOKS.backlog()}
 
 # Authentication endpoints
 @app.post("/api/signup")
-async def signup(request: Request):
+async def signup(request: Request, db: ConnectionPool = Depends(get_db)):
     data = await request.json()
     email = data.get("email", "").strip().lower()
     password = data.get("password", "")
@@ -322,29 +230,22 @@ async def signup(request: Request):
     if len(password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
     
-    db = await get_db()
-    
     # Check if user already exists
-    async with db.execute("SELECT id FROM users WHERE email = ?", (email,)) as cursor:
-        existing_user = await cursor.fetchone()
+    async with db.reader() as conn:
+        async with conn.execute("SELECT id FROM users WHERE email = ?", (email,)) as cursor:
+            existing_user = await cursor.fetchone()
     
     if existing_user:
-        await db.close()
         raise HTTPException(status_code=400, detail="User already exists with this email")
     
     # Create new user
-    password_hash = hash_password(password)
-    await db.execute("""
-        INSERT INTO users (email, password_hash)
-        VALUES (?, ?)
-    """, (email, password_hash))
-    await db.commit()
-    
-    # Get the new user ID
-    async with db.execute("SELECT id FROM users WHERE email = ?", (email,)) as cursor:
-        user = await cursor.fetchone()
-    
-    await db.close()
+    password_hash = await hash_password(password)
+    async with db.writer() as conn:
+        async with conn.execute("""
+            INSERT INTO users (email, password_hash)
+            VALUES (?, ?)
+        """, (email, password_hash)) as cursor:
+            user = (cursor.lastrowid,)
     
     # Create JWT token
     token = create_jwt_token(user[0], email)
@@ -352,7 +253,7 @@ async def signup(request: Request):
     return {"token": token, "user": {"id": user[0], "email": email}}
 
 @app.post("/api/login")
-async def login(request: Request):
+async def login(request: Request, db: ConnectionPool = Depends(get_db)):
     data = await request.json()
     email = data.get("email", "").strip().lower()
     password = data.get("password", "")
@@ -360,35 +261,35 @@ async def login(request: Request):
     if not email or not password:
         raise HTTPException(status_code=400, detail="Email and password are required")
     
-    db = await get_db()
-    
     # Get user from database
-    async with db.execute("SELECT id, email, password_hash FROM users WHERE email = ?", (email,)) as cursor:
-        user = await cursor.fetchone()
-    
-    await db.close()
+    async with db.reader() as conn:
+        async with conn.execute(USER_BY_EMAIL_SQL, (email,)) as cursor:
+            user = await cursor.fetchone()
     
-    if not user or not verify_password(password, user[2]):
+    if not user or not await verify_password(password, user[2]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    # Upgrade hashes made with an older cost factor while we have the password
+    if needs_rehash(user[2]):
+        password_hash = await hash_password(password)
+        async with db.writer() as conn:
+            await conn.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user[0]))
+    
     # Create JWT token
     token = create_jwt_token(user[0], user[1])
     
     return {"token": token, "user": {"id": user[0], "email": user[1]}}
 
 @app.post("/api/demo-login")
-async def demo_login():
+async def demo_login(db: ConnectionPool = Depends(get_db)):
     """Login as demo user"""
     email = "demo@outboundfox.com"
     password = "demo123"
     
-    db = await get_db()
-    
     # Get demo user from database
-    async with db.execute("SELECT id, email, password_hash FROM users WHERE email = ?", (email,)) as cursor:
-        user = await cursor.fetchone()
-    
-    await db.close()
+    async with db.reader() as conn:
+        async with conn.execute(USER_BY_EMAIL_SQL, (email,)) as cursor:
+            user = await cursor.fetchone()
     
     if not user:
         raise HTTPException(status_code=404, detail="Demo user not found")
@@ -398,6 +299,12 @@ async def demo_login():
     
     return {"token": token, "user": {"id": user[0], "email": user[1], "is_demo": True}}
 
+async def require_admin(current_user: dict = Depends(get_current_user)):
+    """Allow only users listed in ADMIN_EMAILS"""
+    if current_user["email"] not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
 @app.get("/api/me")
 async def get_current_user_profile(current_user: dict = Depends(get_current_user)):
     """Get current user profile"""
@@ -405,130 +312,247 @@ async def get_current_user_profile(current_user: dict = Depends(get_current_user
     return {"id": current_user["id"], "email": current_user["email"], "is_demo": is_demo}
 
 @app.post("/api/logout")
-async def logout():
-    """Logout endpoint (client-side token removal)"""
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Revoke the caller's token; the client also drops it"""
+    if credentials:
+        try:
+            payload = decode_jwt_token(credentials.credentials)
+            await AUTH.revoke(revocation_key(credentials.credentials, payload), payload["exp"])
+        except HTTPException:
+            # Expired or invalid tokens need no revoking
+            pass
     return {"message": "Logged out successfully"}
 
 @app.post("/api/upload-leads")
-async def upload_leads(file: UploadFile, prompt_name: str = Form("default"), current_user: dict = Depends(get_current_user)):
-    content = await file.read()
-    text = content.decode("utf-8")
-    reader = csv.DictReader(io.StringIO(text))
-    
-    db = await get_db()
-    count = 0
-    for row in reader:
-        if "phone" in row:
-            await db.execute(
-                "INSERT INTO leads (user_id, phone, company, contact, prompt_name) VALUES (?, ?, ?, ?, ?)",
-                (current_user["id"], row["phone"], row.get("company"), row.get("contact"), prompt_name)
-            )
-            count += 1
-    await db.commit()
-    await db.close()
-    
-    return {"message": f"Uploaded {count} leads"}
+async def upload_leads(file: UploadFile, background_tasks: BackgroundTasks, prompt_name: str = Form("default"), mode: str = Form("skip"), current_user: dict = Depends(get_current_user)):
+    """Spool the upload and import it in the background; poll /api/import-jobs/{job_id} for progress
+
+    `mode` picks what happens to rows whose number matches an existing lead: skip, upsert or merge.
+    """
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(IMPORT_MODES)}")
+    job = create_import_job(current_user["id"], prompt_name, file.filename, mode)
+    path = await spool_upload(file)
+    background_tasks.add_task(run_import, job, path)
+    
+    return {"message": f"Importing leads from {file.filename}", "job_id": job.id}
+
+async def _own_import_job(job_id: str, user: dict):
+    job = await load_import_job(job_id)
+    if not job or job.user_id != user["id"]:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@app.get("/api/import-jobs/{job_id}")
+async def get_import_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    return (await _own_import_job(job_id, current_user)).to_dict()
+
+@app.post("/api/import-jobs/{job_id}/resume")
+async def resume_import_job(job_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
+    """Continue a failed or interrupted import after its last committed batch"""
+    job = await _own_import_job(job_id, current_user)
+    if not job.resumable or not job.path:
+        raise HTTPException(status_code=409, detail=f"Import job is {job.status} and cannot be resumed")
+    job.status, job.stale = "queued", False
+    IMPORT_JOBS[job.id] = job
+    background_tasks.add_task(run_import, job, job.path)
+    return job.to_dict()
+
+@app.post("/api/import-jobs/{job_id}/rollback")
+async def rollback_import_job(job_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
+    """Remove the leads an import created that are not in a campaign yet"""
+    job = await _own_import_job(job_id, current_user)
+    if job.status in ("queued", "running") and not job.stale:
+        raise HTTPException(status_code=409, detail=f"Import job is {job.status}")
+    background_tasks.add_task(rollback_import, job)
+    return job.to_dict()
 
 @app.post("/api/start")
 async def start_calls(current_user: dict = Depends(get_current_user)):
-    db = await get_db()
-    # Exclude sample leads from campaigns and filter by user
-    async with db.execute("SELECT id FROM leads WHERE status='pending' AND is_sample = FALSE AND user_id = ?", (current_user["id"],)) as cur:
-        rows = await cur.fetchall()
-    await db.close()
-    
-    queued = 0
-    for row in rows:
-        await QUEUE.put(row[0])
-        queued += 1
+    # Exclude sample leads from campaigns and filter by user; already queued leads are skipped
+    queued = await QUEUE.enqueue_pending(current_user["id"])
+    BUS.publish("campaign_started", {"queued": queued}, current_user["id"])
     
     return {"message": f"Started campaign", "queued": queued}
 
+@app.get("/api/admin/dialer")
+async def get_dialer_settings(admin: dict = Depends(require_admin)):
+    """Current dialer limits and counters"""
+    return {"mode": DIALER_MODE, **SCHEDULER.status()}
+
+@app.put("/api/admin/dialer")
+async def update_dialer_settings(data: dict, admin: dict = Depends(require_admin)):
+    """Change dialer rate and concurrency limits without a restart"""
+    allowed = {"rate": float, "burst": int, "min_concurrency": int, "max_concurrency": int, "concurrency": int, "target_latency": float}
+    try:
+        settings = {key: cast(data[key]) for key, cast in allowed.items() if data.get(key) is not None}
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Dialer settings must be numbers")
+    if any(value <= 0 for value in settings.values()):
+        raise HTTPException(status_code=400, detail="Dialer settings must be positive")
+    
+    await SCHEDULER.save_settings(settings)
+    print(f"[DIALER] Settings updated by {admin['email']}: {settings}")
+    return {"mode": DIALER_MODE, **SCHEDULER.status()}
+
+@app.get("/api/admin/dnc")
+async def get_dnc_status(admin: dict = Depends(require_admin)):
+    """Size of the do-not-call list and how often it has blocked a dial"""
+    return DNC.status()
+
+@app.post("/api/admin/dnc")
+async def add_dnc_numbers(data: dict, admin: dict = Depends(require_admin)):
+    """Put numbers on the do-not-call list; body: {"phones": [...]}"""
+    phones = data.get("phones")
+    if not isinstance(phones, list) or not phones:
+        raise HTTPException(status_code=400, detail="phones must be a non-empty list")
+    added = await DNC.add([str(phone) for phone in phones])
+    return {"added": added, **DNC.status()}
+
+@app.post("/api/admin/dnc/import")
+async def import_dnc_numbers(file: UploadFile, background_tasks: BackgroundTasks, admin: dict = Depends(require_admin)):
+    """Bulk-load a suppression file (CSV with a phone column, or one number per line); poll /api/import-jobs/{job_id}"""
+    job = create_import_job(admin["id"], None, file.filename)
+    path = await spool_upload(file)
+    background_tasks.add_task(DNC.import_file, job, path)
+    return {"message": f"Importing do-not-call numbers from {file.filename}", "job_id": job.id}
+
+@app.delete("/api/admin/dnc/{phone}")
+async def remove_dnc_number(phone: str, admin: dict = Depends(require_admin)):
+    if not await DNC.remove(phone):
+        raise HTTPException(status_code=404, detail="Number is not on the do-not-call list")
+    return {"message": f"Removed {phone} from the do-not-call list"}
+
+# Fields /api/leads and /api/calls can return (?fields=a,b,c), as SQL expressions
+LEAD_FIELDS = {
+    "id": "id",
+    "phone": "phone",
+    "company": "company",
+    "contact": "contact",
+    "email": "email",
+    "status": "status",
+    "lead_status": "lead_status",
+    "prompt_name": "prompt_name",
+    "is_sample": "is_sample",
+    "last_contacted_at": "last_contacted_at",
+    "created_at": "created_at",
+}
+DEFAULT_LEAD_FIELDS = ("phone", "company", "contact", "status", "is_sample", "id")
+
+CALL_FIELDS = {
+    "id": "id",
+    "phone": "phone",
+    "company": "company",
+    "outcome": "CASE WHEN status = 'completed' THEN COALESCE(NULLIF(outcome, ''), 'completed') ELSE 'unknown' END",
+    "transcript": f"COALESCE({TRANSCRIPT_SQL}, 'No transcript available')",
+    "has_transcript": "has_transcript",
+    "status": "COALESCE(NULLIF(status, ''), 'pending')",
+    "duration": "COALESCE(duration, 0)",
+    "conversion_flag": "COALESCE(conversion_flag, 0)",
+    "call_id": "call_id",
+    "sentiment": "sentiment",
+    "objection": "objection",
+    "interest_level": "interest_level",
+    "summary": "summary",
+    "created_at": "created_at",
+}
+# Transcripts are left out unless asked for; see /api/calls/{id}/transcript
+DEFAULT_CALL_FIELDS = ("id", "phone", "company", "outcome", "has_transcript", "status", "duration", "conversion_flag", "call_id", "created_at")
+
 @app.get("/api/leads")
-async def list_leads(current_user: dict = Depends(get_current_user)):
-    db = await get_db()
-    async with db.execute("""
-        SELECT phone, company, contact, status, is_sample, id
-        FROM leads 
-        WHERE user_id = ?
-        ORDER BY created_at DESC 
-        LIMIT 100
-    """, (current_user["id"],)) as cur:
-        rows = await cur.fetchall()
-    await db.close()
-    return [{"phone": r[0], "company": r[1], "contact": r[2], "status": r[3], "is_sample": bool(r[4]), "id": r[5]} for r in rows]
+async def list_leads(response: Response, cursor: str = None, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+                     status: str = None, since: str = None, until: str = None, fields: str = None,
+                     current_user: dict = Depends(get_current_user), db: ConnectionPool = Depends(get_db)):
+    """Newest leads first; pass the X-Next-Cursor response header back as `cursor` for the next page"""
+    try:
+        names = parse_fields(fields, LEAD_FIELDS, DEFAULT_LEAD_FIELDS)
+        async with db.reader() as conn:
+            leads, next_cursor = await fetch_page(conn, "leads", LEAD_FIELDS, names, {"user_id": current_user["id"], "status": status},
+                                                  cursor, limit, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    for lead in leads:
+        if "is_sample" in lead:
+            lead["is_sample"] = bool(lead["is_sample"])
+    return leads
 
 @app.delete("/api/leads")
-async def delete_sample_leads(sample_only: bool = False, current_user: dict = Depends(get_current_user)):
+async def delete_sample_leads(sample_only: bool = False, current_user: dict = Depends(get_current_user), db: ConnectionPool = Depends(get_db)):
     """Remove sample leads from the database"""
     if sample_only:
-        db = await get_db()
-        async with db.execute("SELECT COUNT(*) FROM leads WHERE is_sample = TRUE AND user_id = ?", (current_user["id"],)) as cursor:
-            result = await cursor.fetchone()
-            count = result[0] if result else 0
-        
-        await db.execute("DELETE FROM leads WHERE is_sample = TRUE AND user_id = ?", (current_user["id"],))
-        await db.commit()
-        await db.close()
+        async with db.writer() as conn:
+            async with conn.execute("DELETE FROM leads WHERE is_sample = TRUE AND user_id = ?", (current_user["id"],)) as cursor:
+                count = cursor.rowcount
         
         return {"message": f"Removed {count} sample leads"}
     else:
         return {"error": "sample_only parameter is required"}
 
 @app.get("/api/calls")
-async def list_calls():
-    db = await get_db()
-    async with db.execute("""
-        SELECT phone, company, outcome, transcript, status, duration, conversion_flag, call_id
-        FROM calls 
-        ORDER BY created_at DESC 
-        LIMIT 50
-    """) as cur:
-        rows = await cur.fetchall()
-    await db.close()
-    return [{
-        "phone": r[0], 
-        "company": r[1], 
-        "outcome": r[2] or "completed" if r[4] == "completed" else "unknown", 
-        "transcript": r[3] or "No transcript available",
-        "status": r[4] or "pending",
-        "duration": r[5] or 0,
-        "conversion_flag": r[6] or 0,
-        "call_id": r[7]
-    } for r in rows]
+async def list_calls(response: Response, cursor: str = None, limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+                     status: str = None, outcome: str = None, interest_level: str = None,
+                     since: str = None, until: str = None, fields: str = None,
+                     current_user: dict = Depends(get_current_user), db: ConnectionPool = Depends(get_db)):
+    """The user's newest calls first; pass the X-Next-Cursor response header back as `cursor` for the next page"""
+    try:
+        names = parse_fields(fields, CALL_FIELDS, DEFAULT_CALL_FIELDS)
+        async with db.reader() as conn:
+            calls, next_cursor = await fetch_page(conn, "calls", CALL_FIELDS, names,
+                                                  {"user_id": current_user["id"], "status": status, "outcome": outcome,
+                                                   "interest_level": interest_level},
+                                                  cursor, limit, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return calls
+
+@app.get("/api/calls/{call_id}/transcript")
+async def get_call_transcript(call_id: int, current_user: dict = Depends(get_current_user), db: ConnectionPool = Depends(get_db)):
+    async with db.reader() as conn:
+        async with conn.execute(CALL_TRANSCRIPT_SQL, (call_id, current_user["id"])) as cur:
+            row = await cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Call not found")
+    return {"id": call_id, "transcript": row[0] or ""}
+
+@app.get("/api/export/{table}")
+async def export_table(table: str, format: str = Query("csv", pattern="^(csv|ndjson)$"), since: str = None, until: str = None,
+                       campaign: str = None, current_user: dict = Depends(get_current_user)):
+    """Stream all of the user's calls or leads as CSV or NDJSON, optionally by date range and campaign (prompt)"""
+    if table not in ("calls", "leads"):
+        raise HTTPException(status_code=404, detail="Unknown export")
+    try:
+        chunks = export_stream(table, format, current_user["id"], since, until, campaign)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    filename = f"{table}-{datetime.utcnow():%Y%m%d}.{format}"
+    return StreamingResponse(chunks, media_type=MEDIA_TYPES[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.get("/api/prompts")
 async def list_prompts():
     """List all available prompts"""
     try:
-        import glob
-        prompt_files = glob.glob("prompts/*.txt")
-        prompts = []
-        for file_path in prompt_files:
-            prompt_name = os.path.basename(file_path).replace(".txt", "")
-            prompts.append({
-                "id": prompt_name,
-                "name": prompt_name.title(),
-                "filename": f"{prompt_name}.txt"
-            })
-        return prompts
+        return [{
+            "id": prompt_name,
+            "name": prompt_name.title(),
+            "filename": f"{prompt_name}.txt"
+        } for prompt_name in PROMPTS.names()]
     except Exception as e:
         return []
 
 @app.get("/api/prompts/{prompt_name}")
 async def get_prompt(prompt_name: str):
-    try:
-        with open(f"prompts/{prompt_name}.txt", "r") as f:
-            content = f.read()
-        return {"name": prompt_name.title(), "content": content}
-    except FileNotFoundError:
-        return {"name": prompt_name.title(), "content": "Hi, this is Alex from Luma. Quick question—are you happy with how many qualified leads you're getting each month?"}
+    content = PROMPTS.get(prompt_name)
+    return {"name": prompt_name.title(), "content": DEFAULT_PROMPT if content is None else content}
 
 @app.put("/api/prompts/{prompt_name}")
 async def update_prompt(prompt_name: str, data: dict):
     try:
-        with open(f"prompts/{prompt_name}.txt", "w") as f:
-            f.write(data["content"])
+        PROMPTS.save(prompt_name, data["content"])
         return {"success": True, "message": "Prompt updated successfully"}
     except Exception as e:
         return {"success": False, "message": str(e)}
@@ -537,18 +561,10 @@ async def update_prompt(prompt_name: str, data: dict):
 async def create_prompt(prompt_name: str, data: dict):
     """Create a new prompt"""
     try:
-        content = data.get("content", "")
-        
-        # Create prompts directory if it doesn't exist
-        os.makedirs("prompts", exist_ok=True)
-        
-        # Check if prompt already exists
-        if os.path.exists(f"prompts/{prompt_name}.txt"):
-            return {"success": False, "message": "Prompt already exists"}
-        
-        with open(f"prompts/{prompt_name}.txt", "w") as f:
-            f.write(content)
+        PROMPTS.save(prompt_name, data.get("content", ""), create=True)
         return {"success": True, "message": "Prompt created successfully"}
+    except FileExistsError:
+        return {"success": False, "message": "Prompt already exists"}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
@@ -560,9 +576,7 @@ async def delete_prompt(prompt_name: str):
         if prompt_name == "default":
             return {"success": False, "message": "Cannot delete default prompt"}
         
-        prompt_path = f"prompts/{prompt_name}.txt"
-        if os.path.exists(prompt_path):
-            os.remove(prompt_path)
+        if PROMPTS.delete(prompt_name):
             return {"success": True, "message": "Prompt deleted successfully"}
         else:
             return {"success": False, "message": "Prompt not found"}
@@ -570,7 +584,7 @@ async def delete_prompt(prompt_name: str):
         return {"success": False, "message": str(e)}
 
 @app.post("/api/test-call")
-async def test_call(data: dict):
+async def test_call(data: dict, db: ConnectionPool = Depends(get_db), client: httpx.AsyncClient = Depends(get_bland_client)):
     """Initiate a test call with single phone number"""
     print(f"[TEST CALL] Received request: {data}")
     try:
@@ -586,17 +600,13 @@ async def test_call(data: dict):
             print("[TEST CALL] ERROR: No phone number provided")
             return {"success": False, "message": "Phone number is required"}
         
-        # Load prompt template
-        try:
-            with open(f"prompts/{template}.txt", "r") as f:
-                prompt_template = f.read()
-            print(f"[TEST CALL] Loaded prompt template: {template}")
-        except FileNotFoundError:
-            prompt_template = "Hi {contact}, this is Alex from Luma. Quick question—are you happy with how many qualified leads you're getting each month?"
-            print(f"[TEST CALL] Template {template} not found, using default")
+        if await DNC.is_blocked(phone):
+            print(f"[TEST CALL] {phone} is on the do-not-call list")
+            return {"success": False, "message": "This number is on the do-not-call list"}
         
-        # Substitute variables
-        prompt = prompt_template.replace("{contact}", contact).replace("{company}", company).replace("{phone}", phone)
+        if PROMPTS.get(template) is None:
+            print(f"[TEST CALL] Template {template} not found, using default")
+        prompt = PROMPTS.render(template, contact=contact, company=company, phone=phone)
         print(f"[TEST CALL] Generated prompt: {prompt[:100]}...")
         
         # Call Bland.ai API
@@ -609,49 +619,46 @@ async def test_call(data: dict):
         }
         print(f"[TEST CALL] Bland payload: {bland_payload}")
         
-        async with httpx.AsyncClient() as client:
-            api_key = os.getenv("BLAND_API_KEY")
-            if not api_key:
-                print("[TEST CALL] ERROR: No Bland.ai API key found")
-                return {"success": False, "message": "Bland.ai API key not configured"}
+        api_key = os.getenv("BLAND_API_KEY")
+        if not api_key:
+            print("[TEST CALL] ERROR: No Bland.ai API key found")
+            return {"success": False, "message": "Bland.ai API key not configured"}
+        
+        print(f"[TEST CALL] Making API call to Bland.ai with key: {api_key[:10]}...")
+        
+        response = await client.post(
+            "/v1/calls",
+            json=bland_payload,
+            headers={"Authorization": api_key}
+        )
+        
+        print(f"[TEST CALL] Bland.ai response status: {response.status_code}")
+        print(f"[TEST CALL] Bland.ai response body: {response.text}")
+        
+        if response.status_code == 200:
+            call_data = response.json()
+            call_id = call_data.get("call_id")
+            print(f"[TEST CALL] Call created successfully with ID: {call_id}")
             
-            print(f"[TEST CALL] Making API call to Bland.ai with key: {api_key[:10]}...")
+            # Store test call in database
+            print("[TEST CALL] Storing call in database...")
+            async with db.writer() as conn:
+                await conn.execute(
+                    "INSERT INTO calls (phone, company, status, call_id, prompt_name) VALUES (?, ?, ?, ?, ?)",
+                    (phone, f"{contact} - {company}", "queued", call_id, template)
+                )
+            print("[TEST CALL] Call stored in database successfully")
+            BUS.publish("dial_started", {"test": True})
             
-            response = await client.post(
-                "https://api.bland.ai/v1/calls",
-                json=bland_payload,
-                headers={"Authorization": api_key}
-            )
+            # Also log the webhook URL for verification
+            print(f"[TEST CALL] Webhook configured: https://callninja.replit.app/webhook")
+            print(f"[TEST CALL] Call should appear in dashboard shortly. Check Bland.ai for call progress.")
             
-            print(f"[TEST CALL] Bland.ai response status: {response.status_code}")
-            print(f"[TEST CALL] Bland.ai response body: {response.text}")
+            return {"success": True, "call_id": call_id, "message": "Test call initiated successfully"}
+        else:
+            print(f"[TEST CALL] ERROR: Bland.ai API failed with status {response.status_code}: {response.text}")
+            return {"success": False, "message": f"Bland.ai API error: {response.text}"}
             
-            if response.status_code == 200:
-                call_data = response.json()
-                call_id = call_data.get("call_id")
-                print(f"[TEST CALL] Call created successfully with ID: {call_id}")
-                
-                # Store test call in database
-                db = await get_db()
-                print("[TEST CALL] Storing call in database...")
-                async with db.execute(
-                    "INSERT INTO calls (phone, company, status, call_id, prompt_name) VALUES (?, ?, ?, ?, ?)",
-                    (phone, f"{contact} - {company}", "queued", call_id, template)
-                ) as cur:
-                    pass
-                await db.commit()
-                await db.close()
-                print("[TEST CALL] Call stored in database successfully")
-                
-                # Also log the webhook URL for verification
-                print(f"[TEST CALL] Webhook configured: https://callninja.replit.app/webhook")
-                print(f"[TEST CALL] Call should appear in dashboard shortly. Check Bland.ai for call progress.")
-                
-                return {"success": True, "call_id": call_id, "message": "Test call initiated successfully"}
-            else:
-                print(f"[TEST CALL] ERROR: Bland.ai API failed with status {response.status_code}: {response.text}")
-                return {"success": False, "message": f"Bland.ai API error: {response.text}"}
-                
     except Exception as e:
         print(f"[TEST CALL] EXCEPTION: {str(e)}")
         print(f"[TEST CALL] Exception type: {type(e)}")
@@ -660,19 +667,17 @@ async def test_call(data: dict):
         return {"success": False, "message": str(e)}
 
 @app.get("/api/test-calls")
-async def get_test_calls():
+async def get_test_calls(db: ConnectionPool = Depends(get_db)):
     """Get recent test calls"""
-    db = await get_db()
-    async with db.execute(
-        "SELECT phone, company, outcome, transcript, duration, call_id, created_at FROM calls WHERE call_id IS NOT NULL ORDER BY created_at DESC LIMIT 10"
-    ) as cur:
-        rows = await cur.fetchall()
-    await db.close()
+    async with db.reader() as conn:
+        async with conn.execute(TEST_CALLS_SQL) as cur:
+            rows = await cur.fetchall()
     
+    # company holds "contact - company" as stored by /api/test-call
     return [{
         "phone": r[0],
-        "contact": r[1].split(" - ")[0] if " - " in r[1] else "Test Contact",
-        "company": r[1].split(" - ")[1] if " - " in r[1] else r[1],
+        "contact": r[1].split(" - ")[0] if " - " in (r[1] or "") else "Test Contact",
+        "company": r[1].split(" - ")[1] if " - " in (r[1] or "") else r[1],
         "status": r[2] or "in_progress",
         "transcript": r[3] or "Call in progress...",
         "duration": r[4] or 0,
@@ -681,126 +686,59 @@ async def get_test_calls():
     } for r in rows]
 
 @app.get("/api/voices")
-async def get_voices():
+async def get_voices(client: httpx.AsyncClient = Depends(get_bland_client)):
     """Get available voice options"""
     try:
-        async with httpx.AsyncClient() as client:
-            api_key = os.getenv("BLAND_API_KEY")
-            if not api_key:
-                return [{"voice_id": os.getenv("VOICE_ID", ""), "name": "Professional Male (Default)"}]
-            
-            response = await client.get(
-                "https://api.bland.ai/v1/voices",
-                headers={"Authorization": api_key}
-            )
-            
-            if response.status_code == 200:
-                voices_data = response.json()
-                return voices_data.get("voices", [])
-            else:
-                # Return default voice if API fails
-                return [{"voice_id": os.getenv("VOICE_ID", ""), "name": "Professional Male (Default)"}]
+        api_key = os.getenv("BLAND_API_KEY")
+        if not api_key:
+            return [{"voice_id": os.getenv("VOICE_ID", ""), "name": "Professional Male (Default)"}]
+        
+        response = await client.get(
+            "/v1/voices",
+            headers={"Authorization": api_key}
+        )
+        
+        if response.status_code == 200:
+            voices_data = response.json()
+            return voices_data.get("voices", [])
+        else:
+            # Return default voice if API fails
+            return [{"voice_id": os.getenv("VOICE_ID", ""), "name": "Professional Male (Default)"}]
     except Exception as e:
         # Return default voice if error occurs
         return [{"voice_id": os.getenv("VOICE_ID", ""), "name": "Professional Male (Default)"}]
 
 @app.get("/api/stats")
-async def get_stats():
-    db = await get_db()
-    
-    async with db.execute("SELECT COUNT(*) FROM leads") as cur:
-        row = await cur.fetchone()
-        total_leads = row[0] if row else 0
-    
-    async with db.execute("SELECT COUNT(*) FROM calls") as cur:
-        row = await cur.fetchone()
-        calls_made = row[0] if row else 0
-    
-    async with db.execute("SELECT COUNT(*) FROM calls WHERE outcome='interested'") as cur:
-        row = await cur.fetchone()
-        interested = row[0] if row else 0
-    
-    async with db.execute("SELECT COUNT(*) FROM leads WHERE status='calling'") as cur:
-        row = await cur.fetchone()
-        active_calls = row[0] if row else 0
-    
-    success_rate = round((interested / calls_made * 100) if calls_made > 0 else 0)
-    
-    await db.close()
-    
-    return {
-        "totalLeads": total_leads,
-        "callsMade": calls_made,
-        "successRate": success_rate,
-        "activeCalls": active_calls
-    }
+async def get_stats(current_user: dict = Depends(get_current_user_optional)):
+    """Dashboard totals from the counters tables; scoped to the caller when authenticated"""
+    leads, calls = await read_counters(current_user["id"] if current_user else None)
+    return stats_summary(leads, calls)
+
+@app.get("/api/campaign-status")
+async def get_campaign_status(current_user: dict = Depends(get_current_user_optional)):
+    leads, _ = await read_counters(current_user["id"] if current_user else None)
+    return campaign_summary(leads)
+
+@app.get("/api/events")
+async def event_stream(token: str = None, credentials: HTTPAuthorizationCredentials = Depends(security),
+                       db: ConnectionPool = Depends(get_db)):
+    """Server-sent events for the current user: dial_started, webhook, analysis and stats
+
+    EventSource cannot send headers, so browsers pass the JWT as ?token=.
+    """
+    if token:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    current_user = await get_current_user(credentials, db)
+    return StreamingResponse(BUS.stream(current_user["id"]), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
 
 @app.post("/webhook")
 async def webhook_handler(request_data: dict):
-    """Handle Bland.ai webhook notifications"""
-    print(f"[WEBHOOK] Received webhook data: {request_data}")
-    
-    call_id = request_data.get("call_id")
-    outcome = request_data.get("outcome", "unknown")
-    transcript = request_data.get("transcript", "")
-    duration = request_data.get("call_length", 0)
-    status = "completed" if outcome else "failed"
-    
-    print(f"[WEBHOOK] Parsed - Call ID: {call_id}, Outcome: {outcome}, Duration: {duration}, Status: {status}")
-    print(f"[WEBHOOK] Transcript length: {len(transcript) if transcript else 0} characters")
-    
-    # Check for booking information in transcript
-    meeting_time = None
-    email = None
-    conversion_flag = 0
-    
-    if transcript:
-        # Look for meeting booking patterns in transcript
-        import re
-        
-        # Check for email patterns
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        email_matches = re.findall(email_pattern, transcript)
-        if email_matches:
-            email = email_matches[0]
-        
-        # Check for time/meeting patterns
-        time_patterns = [
-            r'(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)',
-            r'(?:tomorrow|next week)',
-            r'\d{1,2}:\d{2}',
-            r'(?:morning|afternoon|evening)',
-            r'(?:meeting|call|appointment)'
-        ]
-        
-        transcript_lower = transcript.lower()
-        meeting_indicators = sum(1 for pattern in time_patterns if re.search(pattern, transcript_lower))
-        
-        # If we found email and time indicators, mark as conversion
-        if email and meeting_indicators >= 2:
-            conversion_flag = 1
-            # Extract rough meeting time from transcript
-            meeting_time = "Meeting scheduled - see transcript for details"
-    
-    if call_id:
-        db = await get_db()
-        
-        # Update lead status if this was a campaign call
-        await db.execute("UPDATE leads SET status='completed' WHERE bland_call_id=?", (call_id,))
-        
-        # Update call record with booking information
-        await db.execute("""
-            UPDATE calls 
-            SET status=?, outcome=?, transcript=?, duration=?, meeting_time=?, email=?, conversion_flag=? 
-            WHERE call_id=?
-        """, (status, outcome, transcript, duration, meeting_time, email, conversion_flag, call_id))
-        
-        # If conversion detected, trigger booking workflow
-        if conversion_flag == 1:
-            await handle_booking(call_id, email, meeting_time, transcript)
-        
-        await db.commit()
-        await db.close()
+    """Store a Bland.ai webhook and acknowledge it; WEBHOOKS applies it in the background"""
+    stored = await WEBHOOKS.ingest(request_data)
+    print(f"[WEBHOOK] Call ID: {request_data.get('call_id')} {'queued' if stored else 'ignored (duplicate or no call_id)'}")
     
     return {"status": "ok"}
 
@@ -810,6 +748,8 @@ async def handle_booking(call_id: str, email: str, meeting_time: str, transcript
     print(f"BOOKING DETECTED: Call {call_id}, Email: {email}, Time: {meeting_time}")
     # Future: integrate with Calendly/Google Calendar
 
+WEBHOOKS = WebhookConsumer(on_booking=handle_booking)
+
 @app.post("/api/send-invite")
 async def send_booking_invite(data: dict):
     """Send calendar invite to booked prospect"""
@@ -824,209 +764,15 @@ async def send_booking_invite(data: dict):
 
 @app.post("/api/analyze")
 async def analyze_calls():
-    """Background job to analyze untagged call transcripts"""
-    db = await get_db()
-    
-    # Get calls that need analysis (have transcript but no sentiment)
-    async with db.execute("""
-        SELECT id, transcript, duration, conversion_flag 
-        FROM calls 
-        WHERE transcript IS NOT NULL 
-        AND transcript != '' 
-        AND sentiment IS NULL
-        LIMIT 10
-    """) as cur:
-        calls_to_analyze = await cur.fetchall()
-    
-    analyzed_count = 0
-    
-    for call_row in calls_to_analyze:
-        call_id, transcript, duration, conversion_flag = call_row
-        
-        # Analyze transcript using GPT-4o
-        analysis = await analyze_transcript_with_ai(transcript, duration or 0, conversion_flag or 0)
-        
-        # Update database with AI analysis
-        await db.execute("""
-            UPDATE calls 
-            SET sentiment=?, objection=?, interest_level=?, summary=? 
-            WHERE id=?
-        """, (analysis['sentiment'], analysis['objection'], analysis['interest_level'], analysis['summary'], call_id))
-        
-        analyzed_count += 1
-    
-    await db.commit()
-    await db.close()
-    
-    return {"analyzed": analyzed_count}
-
-async def analyze_transcript_with_ai(transcript: str, duration: int, conversion_flag: int) -> dict:
-    """Analyze transcript using GPT-4o for intelligent insights"""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {os.getenv('OPENAI_API_KEY')}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o",
-                    "messages": [
-                        {
-                            "role": "system",
-                            "content": """You are analyzing sales call transcripts. Provide analysis in this exact JSON format:
-{
-  "sentiment": "positive|negative|neutral",
-  "objection": "price|timing|competition|authority|interest|information|none",
-  "interest_level": "hot|warm|cold",
-  "summary": "One sentence summary of the call outcome"
-}
-
-Consider:
-- Call duration as an engagement indicator (longer = more interested)
-- Actual conversation context, not just keywords
-- Prospect's tone and responses
-- Whether they asked questions or showed curiosity"""
-                        },
-                        {
-                            "role": "user",
-                            "content": f"""Analyze this sales call:
-
-TRANSCRIPT:
-{transcript}
-
-CALL DURATION: {duration} seconds
-CONVERSION: {'Yes' if conversion_flag == 1 else 'No'}
-
-Provide your analysis in the specified JSON format."""
-                        }
-                    ],
-                    "response_format": {"type": "json_object"},
-                    "temperature": 0.1
-                }
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                analysis = json.loads(result["choices"][0]["message"]["content"])
-                
-                # Ensure we have all required fields with defaults
-                return {
-                    "sentiment": analysis.get("sentiment", "neutral"),
-                    "objection": analysis.get("objection", "none"),
-                    "interest_level": analysis.get("interest_level", "cold"),
-                    "summary": analysis.get("summary", "Call completed - see transcript for details")
-                }
-            else:
-                # Fallback to basic analysis if OpenAI fails
-                return fallback_analysis(transcript, duration, conversion_flag)
-                
-    except Exception as e:
-        print(f"OpenAI analysis failed: {e}")
-        return fallback_analysis(transcript, duration, conversion_flag)
-
-def fallback_analysis(transcript: str, duration: int, conversion_flag: int) -> dict:
-    """Fallback analysis using keyword matching"""
-    transcript_lower = transcript.lower()
-    
-    # Basic sentiment
-    positive_words = ['interested', 'yes', 'sounds good', 'tell me more', 'pricing']
-    negative_words = ['not interested', 'no thanks', 'busy', 'remove', 'stop calling']
-    
-    positive_count = sum(1 for word in positive_words if word in transcript_lower)
-    negative_count = sum(1 for word in negative_words if word in transcript_lower)
-    
-    if duration > 120:
-        positive_count += 1
-    elif duration < 30:
-        negative_count += 1
-    
-    sentiment = "positive" if positive_count > negative_count else "negative" if negative_count > positive_count else "neutral"
-    
-    # Basic objection detection
-    objection = "none"
-    if any(word in transcript_lower for word in ['expensive', 'cost', 'budget', 'price']):
-        objection = "price"
-    elif any(word in transcript_lower for word in ['not right now', 'busy', 'bad time']):
-        objection = "timing"
-    elif any(word in transcript_lower for word in ['already have', 'using']):
-        objection = "competition"
-    
-    # Interest level
-    if conversion_flag == 1:
-        interest_level = "hot"
-    elif duration > 120 and sentiment == "positive":
-        interest_level = "warm"
-    else:
-        interest_level = "cold"
-    
-    return {
-        "sentiment": sentiment,
-        "objection": objection,
-        "interest_level": interest_level,
-        "summary": f"Call lasted {duration}s - {sentiment} response"
-    }
+    """Start a background analysis pass over untagged call transcripts"""
+    if ANALYSIS_MODE == "embedded":
+        ANALYZER.trigger()
+    return {"mode": ANALYSIS_MODE, **ANALYZER.status()}
 
 @app.get("/api/analytics-stats")
-async def get_analytics_stats():
-    """Get analytics data for dashboard"""
-    db = await get_db()
-    
-    # Conversion rate by day
-    async with db.execute("""
-        SELECT DATE(created_at) as call_date, 
-               COUNT(*) as total_calls,
-               SUM(conversion_flag) as conversions,
-               AVG(duration) as avg_duration
-        FROM calls 
-        WHERE created_at >= datetime('now', '-30 days')
-        GROUP BY DATE(created_at)
-        ORDER BY call_date DESC
-    """) as cur:
-        daily_stats = await cur.fetchall()
-    
-    # Objection distribution
-    async with db.execute("""
-        SELECT objection, COUNT(*) as count
-        FROM calls 
-        WHERE objection IS NOT NULL
-        GROUP BY objection
-        ORDER BY count DESC
-    """) as cur:
-        objections = await cur.fetchall()
-    
-    # Interest level distribution
-    async with db.execute("""
-        SELECT interest_level, COUNT(*) as count,
-               AVG(duration) as avg_duration,
-               SUM(conversion_flag) as conversions
-        FROM calls 
-        WHERE interest_level IS NOT NULL
-        GROUP BY interest_level
-    """) as cur:
-        interest_levels = await cur.fetchall()
-    
-    # Sentiment vs Duration correlation
-    async with db.execute("""
-        SELECT sentiment, 
-               AVG(duration) as avg_duration,
-               COUNT(*) as count,
-               SUM(conversion_flag) as conversions
-        FROM calls 
-        WHERE sentiment IS NOT NULL
-        GROUP BY sentiment
-    """) as cur:
-        sentiment_stats = await cur.fetchall()
-    
-    await db.close()
-    
-    return {
-        "daily_stats": [{"date": r[0], "total_calls": r[1], "conversions": r[2], "avg_duration": r[3]} for r in daily_stats],
-        "objections": [{"type": r[0], "count": r[1]} for r in objections],
-        "interest_levels": [{"level": r[0], "count": r[1], "avg_duration": r[2], "conversions": r[3]} for r in interest_levels],
-        "sentiment_stats": [{"sentiment": r[0], "avg_duration": r[1], "count": r[2], "conversions": r[3]} for r in sentiment_stats]
-    }
+async def get_analytics_stats(prompt_name: str = None, current_user: dict = Depends(get_current_user_optional)):
+    """Get analytics data for dashboard, from the daily call rollups"""
+    return await analytics(current_user["id"] if current_user else None, prompt_name)
 
 # Catch-all route for SPA routing - serve index.html for all non-API routes
 # This MUST be the last route defined
@@ -1043,5 +789,7 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=3000,
-        reload=True
+        reload=True,
+        # Live event streams never finish on their own; close them on shutdown
+        timeout_graceful_shutdown=5
     )
\ No newline at end of file
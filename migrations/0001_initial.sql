@@ -0,0 +1,84 @@
+-- Base schema. Databases created before versioned migrations already have
+-- most of these tables; 0002 reconciles their columns.
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    phone TEXT NOT NULL,
+    company TEXT,
+    contact TEXT,
+    email TEXT,
+    status TEXT DEFAULT 'pending',      -- pending | queued | calling | completed | failed | sample
+    lead_status TEXT DEFAULT 'new',     -- new | hot | warm | cold | closed
+    prompt_name TEXT DEFAULT 'default',
+    bland_call_id TEXT,
+    is_sample BOOLEAN DEFAULT FALSE,
+    last_contacted_at TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+-- user_id is nullable: test calls are not tied to a user
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    lead_id INTEGER,
+    phone TEXT,
+    company TEXT,
+    status TEXT DEFAULT 'queued',
+    call_id TEXT,
+    prompt_name TEXT,
+    outcome TEXT,
+    transcript TEXT,
+    duration INTEGER,
+    conversion_flag INTEGER DEFAULT 0,
+    meeting_time TEXT,
+    email TEXT,
+    sentiment TEXT,
+    objection TEXT,
+    interest_level TEXT,
+    summary TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id),
+    FOREIGN KEY (lead_id) REFERENCES leads (id)
+);
+
+CREATE TABLE IF NOT EXISTS email_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id INTEGER,
+    email_type TEXT,                    -- follow_up | demo_invite | pitch_deck
+    status TEXT,                        -- sent | failed | opened | clicked
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (lead_id) REFERENCES leads (id)
+);
+
+-- Durable dial queue (see call_queue.py); one job per lead
+CREATE TABLE IF NOT EXISTS call_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lead_id INTEGER NOT NULL UNIQUE,
+    user_id INTEGER,
+    status TEXT DEFAULT 'queued',       -- queued | leased | dead
+    attempts INTEGER DEFAULT 0,
+    available_at REAL NOT NULL,
+    leased_by TEXT,
+    lease_expires_at REAL,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (lead_id) REFERENCES leads (id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_call_jobs_ready ON call_jobs (status, available_at);
+
+-- Runtime dialer limits shared by the API and standalone dialer processes
+CREATE TABLE IF NOT EXISTS dialer_settings (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    settings TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,63 @@
+"""Bring databases created by the old init_db() up to the 0001 schema"""
+from db import backfill
+
+# Columns that older databases may be missing, with their 0001 declarations
+EXPECTED_COLUMNS = {
+    "leads": {
+        "user_id": "INTEGER",
+        "email": "TEXT",
+        "lead_status": "TEXT DEFAULT 'new'",
+        "is_sample": "BOOLEAN DEFAULT FALSE",
+        "last_contacted_at": "TIMESTAMP",
+    },
+    "calls": {
+        "user_id": "INTEGER",
+        "status": "TEXT DEFAULT 'queued'",
+        "call_id": "TEXT",
+        "prompt_name": "TEXT",
+        "conversion_flag": "INTEGER DEFAULT 0",
+        "meeting_time": "TEXT",
+        "email": "TEXT",
+        "sentiment": "TEXT",
+        "objection": "TEXT",
+        "interest_level": "TEXT",
+        "summary": "TEXT",
+    },
+}
+
+async def _columns(db, table: str) -> dict:
+    async with db.execute(f"PRAGMA table_info({table})") as cur:
+        return {row[1]: row for row in await cur.fetchall()}
+
+async def _relax_calls_user_id(db, columns: dict):
+    """Rebuild calls without NOT NULL on user_id so test calls can be stored"""
+    names = ", ".join(columns)
+    definitions = ", ".join(
+        f"{name} {row[2]}" + (f" DEFAULT {row[4]}" if row[4] is not None else "") + (" PRIMARY KEY AUTOINCREMENT" if row[5] else "")
+        for name, row in columns.items()
+    )
+    await db.execute(f"CREATE TABLE calls_rebuild ({definitions}, FOREIGN KEY (user_id) REFERENCES users (id), FOREIGN KEY (lead_id) REFERENCES leads (id))")
+    await db.execute(f"INSERT INTO calls_rebuild ({names}) SELECT {names} FROM calls")
+    await db.execute("DROP TABLE calls")
+    await db.execute("ALTER TABLE calls_rebuild RENAME TO calls")
+
+async def migrate(pool):
+    async with pool.writer() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        for table, expected in EXPECTED_COLUMNS.items():
+            existing = await _columns(db, table)
+            for name, declaration in expected.items():
+                if name not in existing:
+                    await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+        calls = await _columns(db, "calls")
+        if calls["user_id"][3]:
+            await _relax_calls_user_id(db, calls)
+
+    # Old campaign calls were stored without an owner; copy it from the lead
+    await backfill(
+        pool,
+        "calls",
+        "user_id = (SELECT leads.user_id FROM leads WHERE leads.id = calls.lead_id)",
+        "user_id IS NULL AND EXISTS (SELECT 1 FROM leads WHERE leads.id = calls.lead_id AND leads.user_id IS NOT NULL)",
+    )
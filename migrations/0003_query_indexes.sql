@@ -0,0 +1,23 @@
+-- Secondary indexes for the hot queries (checked by `python -m query_plans`)
+
+-- start_calls / CallQueue.enqueue_pending
+CREATE INDEX IF NOT EXISTS idx_leads_user_status ON leads (user_id, status, is_sample);
+-- list_leads
+CREATE INDEX IF NOT EXISTS idx_leads_user_created ON leads (user_id, created_at);
+-- get_stats active calls
+CREATE INDEX IF NOT EXISTS idx_leads_status ON leads (status);
+-- every webhook
+CREATE INDEX IF NOT EXISTS idx_leads_bland_call_id ON leads (bland_call_id) WHERE bland_call_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_calls_call_id ON calls (call_id) WHERE call_id IS NOT NULL;
+-- list_calls, get_analytics_stats daily window
+CREATE INDEX IF NOT EXISTS idx_calls_created ON calls (created_at);
+-- get_test_calls
+CREATE INDEX IF NOT EXISTS idx_calls_test_created ON calls (created_at) WHERE call_id IS NOT NULL;
+-- get_stats conversions
+CREATE INDEX IF NOT EXISTS idx_calls_outcome ON calls (outcome);
+-- analyze_calls backlog
+CREATE INDEX IF NOT EXISTS idx_calls_unanalyzed ON calls (id) WHERE sentiment IS NULL AND transcript IS NOT NULL AND transcript != '';
+-- get_analytics_stats distributions
+CREATE INDEX IF NOT EXISTS idx_calls_objection ON calls (objection, duration, conversion_flag) WHERE objection IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_calls_interest ON calls (interest_level, duration, conversion_flag) WHERE interest_level IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_calls_sentiment ON calls (sentiment, duration, conversion_flag) WHERE sentiment IS NOT NULL;
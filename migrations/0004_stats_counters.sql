@@ -0,0 +1,66 @@
+-- Per-user counters behind /api/stats and /api/campaign-status, kept current by
+-- triggers so every upload, dial and webhook write updates them in its own
+-- transaction. user_id 0 holds rows without an owner (test calls).
+
+CREATE TABLE IF NOT EXISTS lead_stats (
+    user_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, status)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS call_stats (
+    user_id INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, outcome)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS leads_stats_insert AFTER INSERT ON leads
+BEGIN
+    INSERT INTO lead_stats (user_id, status, count) VALUES (COALESCE(NEW.user_id, 0), COALESCE(NEW.status, ''), 1)
+    ON CONFLICT (user_id, status) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS leads_stats_delete AFTER DELETE ON leads
+BEGIN
+    UPDATE lead_stats SET count = count - 1
+    WHERE user_id = COALESCE(OLD.user_id, 0) AND status = COALESCE(OLD.status, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS leads_stats_update AFTER UPDATE OF user_id, status ON leads
+WHEN OLD.user_id IS NOT NEW.user_id OR OLD.status IS NOT NEW.status
+BEGIN
+    UPDATE lead_stats SET count = count - 1
+    WHERE user_id = COALESCE(OLD.user_id, 0) AND status = COALESCE(OLD.status, '');
+    INSERT INTO lead_stats (user_id, status, count) VALUES (COALESCE(NEW.user_id, 0), COALESCE(NEW.status, ''), 1)
+    ON CONFLICT (user_id, status) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS calls_stats_insert AFTER INSERT ON calls
+BEGIN
+    INSERT INTO call_stats (user_id, outcome, count) VALUES (COALESCE(NEW.user_id, 0), COALESCE(NEW.outcome, ''), 1)
+    ON CONFLICT (user_id, outcome) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS calls_stats_delete AFTER DELETE ON calls
+BEGIN
+    UPDATE call_stats SET count = count - 1
+    WHERE user_id = COALESCE(OLD.user_id, 0) AND outcome = COALESCE(OLD.outcome, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS calls_stats_update AFTER UPDATE OF user_id, outcome ON calls
+WHEN OLD.user_id IS NOT NEW.user_id OR OLD.outcome IS NOT NEW.outcome
+BEGIN
+    UPDATE call_stats SET count = count - 1
+    WHERE user_id = COALESCE(OLD.user_id, 0) AND outcome = COALESCE(OLD.outcome, '');
+    INSERT INTO call_stats (user_id, outcome, count) VALUES (COALESCE(NEW.user_id, 0), COALESCE(NEW.outcome, ''), 1)
+    ON CONFLICT (user_id, outcome) DO UPDATE SET count = count + 1;
+END;
+
+-- Seed from the rows that already exist
+INSERT OR REPLACE INTO lead_stats (user_id, status, count)
+SELECT COALESCE(user_id, 0), COALESCE(status, ''), COUNT(*) FROM leads GROUP BY 1, 2;
+
+INSERT OR REPLACE INTO call_stats (user_id, outcome, count)
+SELECT COALESCE(user_id, 0), COALESCE(outcome, ''), COUNT(*) FROM calls GROUP BY 1, 2;
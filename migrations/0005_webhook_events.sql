@@ -0,0 +1,14 @@
+-- Durable inbox for Bland.ai webhooks. One row per call: an identical
+-- redelivery is a no-op, a changed payload replaces the row and is applied again.
+
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    call_id TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    processed_at REAL,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_events_unprocessed ON webhook_events (id) WHERE processed_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_webhook_events_processed ON webhook_events (processed_at) WHERE processed_at IS NOT NULL;
@@ -0,0 +1,20 @@
+-- Transcript analysis results keyed by a hash of the model input, so an
+-- identical transcript is never sent to OpenAI twice
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    input_hash TEXT PRIMARY KEY,
+    sentiment TEXT,
+    objection TEXT,
+    interest_level TEXT,
+    summary TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) WITHOUT ROWID;
+
+-- Progress of the background analysis pass, saved with every page of results
+CREATE TABLE IF NOT EXISTS analysis_checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_call_id INTEGER NOT NULL DEFAULT 0,
+    analyzed INTEGER NOT NULL DEFAULT 0,
+    cached INTEGER NOT NULL DEFAULT 0,
+    fallbacks INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
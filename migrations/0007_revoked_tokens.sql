@@ -0,0 +1,8 @@
+-- JWTs revoked by logout, keyed by their jti; rows are pruned once the token
+-- would have expired anyway
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    jti TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at ON revoked_tokens(expires_at);
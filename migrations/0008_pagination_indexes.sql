@@ -0,0 +1,9 @@
+-- Keyset pagination for /api/leads and /api/calls: each filter gets an index
+-- ending in created_at (and the implicit rowid), so a page is one index seek
+
+CREATE INDEX IF NOT EXISTS idx_leads_user_status_created ON leads (user_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_calls_status_created ON calls (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_calls_interest_created ON calls (interest_level, created_at);
+-- Replaces idx_calls_outcome for the outcome lookups as well
+CREATE INDEX IF NOT EXISTS idx_calls_outcome_created ON calls (outcome, created_at);
+DROP INDEX IF EXISTS idx_calls_outcome;
@@ -0,0 +1,4 @@
+-- /api/export walks one user's calls or leads in id order
+CREATE INDEX IF NOT EXISTS idx_calls_user ON calls (user_id);
+-- The (user_id, status/created_at) indexes would need a sort
+CREATE INDEX IF NOT EXISTS idx_leads_user ON leads (user_id);
@@ -0,0 +1,52 @@
+"""Move calls.transcript into zlib-compressed call_transcripts rows
+
+Copies in short batches so other writers can interleave, then drops the
+column. The freed pages are reused by new rows; to shrink the file, run
+`python -m db vacuum` during a maintenance window.
+"""
+import asyncio
+from db import BACKFILL_BATCH_SIZE
+from transcripts import compress
+
+async def _columns(db, table: str) -> set:
+    async with db.execute(f"PRAGMA table_info({table})") as cur:
+        return {row[1] for row in await cur.fetchall()}
+
+async def migrate(pool):
+    async with pool.writer() as db:
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS call_transcripts (
+                call_id INTEGER PRIMARY KEY REFERENCES calls (id),
+                body BLOB NOT NULL
+            )
+        """)
+        if "has_transcript" not in await _columns(db, "calls"):
+            await db.execute("ALTER TABLE calls ADD COLUMN has_transcript INTEGER NOT NULL DEFAULT 0")
+        moving = "transcript" in await _columns(db, "calls")
+    if not moving:
+        return
+
+    cursor = 0
+    while True:
+        async with pool.writer() as db:
+            async with db.execute("""
+                SELECT id, transcript FROM calls
+                WHERE id > ? AND transcript IS NOT NULL AND transcript != ''
+                ORDER BY id LIMIT ?
+            """, (cursor, BACKFILL_BATCH_SIZE)) as cur:
+                rows = await cur.fetchall()
+            await db.executemany("INSERT OR REPLACE INTO call_transcripts (call_id, body) VALUES (?, ?)",
+                                 [(call_id, compress(text)) for call_id, text in rows])
+            await db.executemany("UPDATE calls SET has_transcript = 1 WHERE id = ?", [(call_id,) for call_id, _ in rows])
+        if len(rows) < BACKFILL_BATCH_SIZE:
+            break
+        cursor = rows[-1][0]
+        await asyncio.sleep(0)
+
+    async with pool.writer() as db:
+        await db.execute("BEGIN IMMEDIATE")
+        if "transcript" in await _columns(db, "calls"):
+            # The backlog index filtered on the old column
+            await db.execute("DROP INDEX IF EXISTS idx_calls_unanalyzed")
+            await db.execute("ALTER TABLE calls DROP COLUMN transcript")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_calls_unanalyzed ON calls (id) WHERE sentiment IS NULL AND has_transcript = 1")
@@ -0,0 +1,10 @@
+"""Stamp campaign calls with their lead's prompt, so calls can be grouped by campaign"""
+from db import backfill
+
+async def migrate(pool):
+    await backfill(
+        pool,
+        "calls",
+        "prompt_name = (SELECT leads.prompt_name FROM leads WHERE leads.id = calls.lead_id)",
+        "prompt_name IS NULL AND EXISTS (SELECT 1 FROM leads WHERE leads.id = calls.lead_id AND leads.prompt_name IS NOT NULL)",
+    )
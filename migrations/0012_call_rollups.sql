@@ -0,0 +1,96 @@
+-- Daily call rollups behind /api/analytics-stats, kept current by triggers like
+-- the 0004 counters, so webhook, analysis and rescoring writes all update them.
+-- One row per (user, dimension, day, prompt, value): dimension 'all' (value '')
+-- counts every call, the others count calls by objection, interest level or
+-- sentiment. user_id 0 holds calls without an owner (test calls).
+
+CREATE TABLE IF NOT EXISTS call_rollups (
+    user_id INTEGER NOT NULL,
+    dimension TEXT NOT NULL,
+    day TEXT NOT NULL,
+    prompt_name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    duration_total INTEGER NOT NULL DEFAULT 0,
+    -- calls with a known duration, the divisor for average duration
+    durations INTEGER NOT NULL DEFAULT 0,
+    conversions INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, dimension, day, prompt_name, value)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS calls_rollups_insert AFTER INSERT ON calls
+BEGIN
+    INSERT INTO call_rollups (user_id, dimension, day, prompt_name, value, calls, duration_total, durations, conversions)
+    SELECT COALESCE(NEW.user_id, 0), d.dimension, COALESCE(DATE(NEW.created_at), ''), COALESCE(NEW.prompt_name, ''), d.value,
+           1, COALESCE(NEW.duration, 0), NEW.duration IS NOT NULL, COALESCE(NEW.conversion_flag, 0)
+    FROM (SELECT 'all' AS dimension, '' AS value UNION ALL SELECT 'objection', NEW.objection
+          UNION ALL SELECT 'interest_level', NEW.interest_level UNION ALL SELECT 'sentiment', NEW.sentiment) AS d
+    WHERE d.value IS NOT NULL
+    ON CONFLICT (user_id, dimension, day, prompt_name, value) DO UPDATE SET
+        calls = calls + excluded.calls, duration_total = duration_total + excluded.duration_total,
+        durations = durations + excluded.durations, conversions = conversions + excluded.conversions;
+END;
+
+CREATE TRIGGER IF NOT EXISTS calls_rollups_delete AFTER DELETE ON calls
+BEGIN
+    INSERT INTO call_rollups (user_id, dimension, day, prompt_name, value, calls, duration_total, durations, conversions)
+    SELECT COALESCE(OLD.user_id, 0), d.dimension, COALESCE(DATE(OLD.created_at), ''), COALESCE(OLD.prompt_name, ''), d.value,
+           -1, -COALESCE(OLD.duration, 0), -(OLD.duration IS NOT NULL), -COALESCE(OLD.conversion_flag, 0)
+    FROM (SELECT 'all' AS dimension, '' AS value UNION ALL SELECT 'objection', OLD.objection
+          UNION ALL SELECT 'interest_level', OLD.interest_level UNION ALL SELECT 'sentiment', OLD.sentiment) AS d
+    WHERE d.value IS NOT NULL
+    ON CONFLICT (user_id, dimension, day, prompt_name, value) DO UPDATE SET
+        calls = calls + excluded.calls, duration_total = duration_total + excluded.duration_total,
+        durations = durations + excluded.durations, conversions = conversions + excluded.conversions;
+END;
+
+CREATE TRIGGER IF NOT EXISTS calls_rollups_update
+AFTER UPDATE OF user_id, created_at, prompt_name, duration, conversion_flag, objection, interest_level, sentiment ON calls
+WHEN OLD.user_id IS NOT NEW.user_id OR OLD.created_at IS NOT NEW.created_at OR OLD.prompt_name IS NOT NEW.prompt_name
+  OR OLD.duration IS NOT NEW.duration OR OLD.conversion_flag IS NOT NEW.conversion_flag OR OLD.objection IS NOT NEW.objection
+  OR OLD.interest_level IS NOT NEW.interest_level OR OLD.sentiment IS NOT NEW.sentiment
+BEGIN
+    INSERT INTO call_rollups (user_id, dimension, day, prompt_name, value, calls, duration_total, durations, conversions)
+    SELECT COALESCE(OLD.user_id, 0), d.dimension, COALESCE(DATE(OLD.created_at), ''), COALESCE(OLD.prompt_name, ''), d.value,
+           -1, -COALESCE(OLD.duration, 0), -(OLD.duration IS NOT NULL), -COALESCE(OLD.conversion_flag, 0)
+    FROM (SELECT 'all' AS dimension, '' AS value UNION ALL SELECT 'objection', OLD.objection
+          UNION ALL SELECT 'interest_level', OLD.interest_level UNION ALL SELECT 'sentiment', OLD.sentiment) AS d
+    WHERE d.value IS NOT NULL
+    ON CONFLICT (user_id, dimension, day, prompt_name, value) DO UPDATE SET
+        calls = calls + excluded.calls, duration_total = duration_total + excluded.duration_total,
+        durations = durations + excluded.durations, conversions = conversions + excluded.conversions;
+    INSERT INTO call_rollups (user_id, dimension, day, prompt_name, value, calls, duration_total, durations, conversions)
+    SELECT COALESCE(NEW.user_id, 0), d.dimension, COALESCE(DATE(NEW.created_at), ''), COALESCE(NEW.prompt_name, ''), d.value,
+           1, COALESCE(NEW.duration, 0), NEW.duration IS NOT NULL, COALESCE(NEW.conversion_flag, 0)
+    FROM (SELECT 'all' AS dimension, '' AS value UNION ALL SELECT 'objection', NEW.objection
+          UNION ALL SELECT 'interest_level', NEW.interest_level UNION ALL SELECT 'sentiment', NEW.sentiment) AS d
+    WHERE d.value IS NOT NULL
+    ON CONFLICT (user_id, dimension, day, prompt_name, value) DO UPDATE SET
+        calls = calls + excluded.calls, duration_total = duration_total + excluded.duration_total,
+        durations = durations + excluded.durations, conversions = conversions + excluded.conversions;
+END;
+
+-- Seed from the calls that already exist (`python -m rollups` rebuilds them)
+INSERT OR REPLACE INTO call_rollups (user_id, dimension, day, prompt_name, value, calls, duration_total, durations, conversions)
+SELECT user_id, dimension, day, prompt_name, value,
+       COUNT(*), SUM(COALESCE(duration, 0)), COUNT(duration), SUM(COALESCE(conversion_flag, 0))
+FROM (
+    SELECT COALESCE(user_id, 0) AS user_id, 'all' AS dimension, COALESCE(DATE(created_at), '') AS day,
+           COALESCE(prompt_name, '') AS prompt_name, '' AS value, duration, conversion_flag
+    FROM calls
+    UNION ALL
+    SELECT COALESCE(user_id, 0), 'objection', COALESCE(DATE(created_at), ''), COALESCE(prompt_name, ''), objection, duration, conversion_flag
+    FROM calls WHERE objection IS NOT NULL
+    UNION ALL
+    SELECT COALESCE(user_id, 0), 'interest_level', COALESCE(DATE(created_at), ''), COALESCE(prompt_name, ''), interest_level, duration, conversion_flag
+    FROM calls WHERE interest_level IS NOT NULL
+    UNION ALL
+    SELECT COALESCE(user_id, 0), 'sentiment', COALESCE(DATE(created_at), ''), COALESCE(prompt_name, ''), sentiment, duration, conversion_flag
+    FROM calls WHERE sentiment IS NOT NULL
+)
+GROUP BY user_id, dimension, day, prompt_name, value;
+
+-- /api/analytics-stats reads the rollups now; these only served its GROUP BYs
+DROP INDEX IF EXISTS idx_calls_objection;
+DROP INDEX IF EXISTS idx_calls_interest;
+DROP INDEX IF EXISTS idx_calls_sentiment;
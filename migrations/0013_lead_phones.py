@@ -0,0 +1,30 @@
+"""Add leads.normalized_phone (E.164) and a unique (user_id, normalized_phone) index
+
+The index goes in first, so imports running alongside the backfill are
+already deduplicated. Where a user has several leads with one number, the
+oldest gets normalized_phone and the rest keep NULL: they stay visible with
+their call history, but no new import can add the number again.
+"""
+import asyncio
+from db import BACKFILL_BATCH_SIZE
+
+async def migrate(pool):
+    async with pool.writer() as db:
+        async with db.execute("PRAGMA table_info(leads)") as cur:
+            columns = {row[1] for row in await cur.fetchall()}
+        if "normalized_phone" not in columns:
+            await db.execute("ALTER TABLE leads ADD COLUMN normalized_phone TEXT")
+        await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_leads_user_phone ON leads (user_id, normalized_phone)")
+        async with db.execute("SELECT COALESCE(MAX(id), 0) FROM leads") as cur:
+            (last_id,) = await cur.fetchone()
+
+    # OR IGNORE leaves a duplicate's normalized_phone NULL instead of failing the batch
+    cursor = 0
+    while cursor < last_id:
+        async with pool.writer() as db:
+            await db.execute("""
+                UPDATE OR IGNORE leads SET normalized_phone = normalize_phone(phone)
+                WHERE id > ? AND id <= ? AND normalized_phone IS NULL
+            """, (cursor, cursor + BACKFILL_BATCH_SIZE))
+        cursor += BACKFILL_BATCH_SIZE
+        await asyncio.sleep(0)
@@ -0,0 +1,10 @@
+-- Do-not-call list: E.164 numbers that must never be dialed, for any user.
+-- AUTOINCREMENT keeps ids rising even after deletes, so dialer processes can
+-- pick up new numbers with "id > last seen".
+
+CREATE TABLE IF NOT EXISTS dnc_numbers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    phone TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,               -- import | opt_out | manual
+    added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
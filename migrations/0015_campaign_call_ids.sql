@@ -0,0 +1,9 @@
+-- Campaign calls now store their Bland call_id so webhooks can update them.
+-- Test calls are the ones without a lead, so their index is keyed on that.
+
+DROP INDEX IF EXISTS idx_calls_test_created;
+CREATE INDEX IF NOT EXISTS idx_calls_test_created ON calls (created_at) WHERE lead_id IS NULL AND call_id IS NOT NULL;
+
+-- Calls still in flight get the id their lead was dialed with
+UPDATE calls SET call_id = (SELECT bland_call_id FROM leads WHERE leads.id = calls.lead_id AND leads.status = 'calling')
+WHERE status = 'queued' AND call_id IS NULL AND lead_id IS NOT NULL;
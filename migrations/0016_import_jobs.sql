@@ -0,0 +1,24 @@
+-- Lead imports commit batch by batch and record their progress here, so a
+-- failed import can be resumed from its last batch or rolled back.
+
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    filename TEXT,
+    path TEXT,                          -- spooled upload, kept until the job completes or is rolled back
+    mode TEXT NOT NULL,
+    prompt_name TEXT,
+    status TEXT NOT NULL,               -- queued | running | completed | failed | rolled_back
+    rows_processed INTEGER NOT NULL DEFAULT 0,
+    rows_imported INTEGER NOT NULL DEFAULT 0,
+    rows_duplicate INTEGER NOT NULL DEFAULT 0,
+    rows_rejected INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (id)
+);
+
+-- The import that created a lead, for rollback
+ALTER TABLE leads ADD COLUMN import_job_id TEXT;
+CREATE INDEX IF NOT EXISTS idx_leads_import_job ON leads (import_job_id) WHERE import_job_id IS NOT NULL;
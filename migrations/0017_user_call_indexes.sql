@@ -0,0 +1,10 @@
+-- /api/calls only lists the caller's own calls, so its keyset indexes start
+-- with user_id; they replace the unscoped ones from 0008
+
+CREATE INDEX IF NOT EXISTS idx_calls_user_created ON calls (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_calls_user_status_created ON calls (user_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_calls_user_interest_created ON calls (user_id, interest_level, created_at);
+CREATE INDEX IF NOT EXISTS idx_calls_user_outcome_created ON calls (user_id, outcome, created_at);
+DROP INDEX IF EXISTS idx_calls_status_created;
+DROP INDEX IF EXISTS idx_calls_interest_created;
+DROP INDEX IF EXISTS idx_calls_outcome_created;
@@ -0,0 +1,76 @@
+import json
+import base64
+from datetime import datetime
+
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(created_at, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at, row_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    """(created_at, id) of the last row on the previous page; ValueError if malformed"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(row_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, row_id
+
+def parse_timestamp(value: str) -> str:
+    """ISO date or datetime in the format SQLite's CURRENT_TIMESTAMP stores"""
+    try:
+        return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+def parse_fields(fields: str, allowed: dict, default: tuple) -> list:
+    """Requested comma-separated field names, checked against `allowed`"""
+    if not fields:
+        return list(default)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+def page_query(table: str, columns: dict, fields: list, filters: dict, cursor: str = None,
+               limit: int = 100, since: str = None, until: str = None) -> tuple:
+    """(sql, params) for one page of `table`, fetching one extra row to detect the next page"""
+    where, params = [], []
+    for column, value in filters.items():
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+    if since:
+        where.append("created_at >= ?")
+        params.append(parse_timestamp(since))
+    if until:
+        where.append("created_at < ?")
+        params.append(parse_timestamp(until))
+    if cursor:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    sql = f"""
+        SELECT {', '.join(columns[name] for name in fields)}, created_at, id
+        FROM {table}
+        {'WHERE ' + ' AND '.join(where) if where else ''}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """
+    return sql, (*params, limit + 1)
+
+async def fetch_page(db, table: str, columns: dict, fields: list, filters: dict, cursor: str = None,
+                     limit: int = 100, since: str = None, until: str = None) -> tuple:
+    """One page of `table`, newest first; returns (rows as dicts, next cursor or None)
+
+    Pages are keyed on (created_at, id), so every page is an index seek rather
+    than an OFFSET scan. `columns` maps field names to SQL expressions and
+    `filters` maps column names to required values (None means no filter).
+    """
+    async with db.execute(*page_query(table, columns, fields, filters, cursor, limit, since, until)) as cur:
+        rows = await cur.fetchall()
+
+    next_cursor = encode_cursor(*rows[limit - 1][-2:]) if len(rows) > limit else None
+    return [dict(zip(fields, row)) for row in rows[:limit]], next_cursor
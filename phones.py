@@ -0,0 +1,38 @@
+import os
+import re
+
+# Country calling code assumed for numbers written without one
+PHONE_DEFAULT_COUNTRY_CODE = os.getenv("PHONE_DEFAULT_COUNTRY_CODE", "1")
+
+_SEPARATORS = re.compile(r"[\s().\-/]")
+# Trailing extensions ("x123", "ext. 123") are not part of the dialable number
+_EXTENSION = re.compile(r"\s*(?:x|ext\.?|extension)\s*\d+$", re.IGNORECASE)
+
+def normalize_phone(raw: str, default_country_code: str = PHONE_DEFAULT_COUNTRY_CODE):
+    """E.164 form of a phone number ("+14158143709"), or None if it can't be one
+
+    "+1 (415) 814-3709", "1-415-814-3709", "001 415 814 3709" and, with the
+    default country code 1, "415.814.3709" all normalize the same way.
+    Registered as the SQL function normalize_phone() on pool connections.
+    """
+    if not raw:
+        return None
+    number = _SEPARATORS.sub("", _EXTENSION.sub("", str(raw).strip()))
+    if number.startswith("+"):
+        digits = number[1:]
+    elif number.startswith("00"):
+        digits = number[2:]
+    elif default_country_code == "1":
+        # NANP: ten digits with an area code starting 2-9, optionally after a 1
+        national = number[1:] if len(number) == 11 and number.startswith("1") else number
+        if len(national) != 10 or national[0] in "01":
+            return None
+        digits = "1" + national
+    else:
+        # Drop the national trunk prefix, as in most of Europe
+        digits = default_country_code + (number[1:] if number.startswith("0") else number)
+
+    # E.164 allows at most 15 digits; anything under 8 is not a full number
+    if not digits.isdigit() or digits.startswith("0") or not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
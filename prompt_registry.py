@@ -0,0 +1,103 @@
+import os
+import re
+import glob
+import time
+from collections import OrderedDict
+from string import Template
+
+PROMPT_DIR = os.getenv("PROMPT_DIR", "prompts")
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", 128))
+# How often a cached prompt's file is stat()ed for edits made outside the API
+PROMPT_CHECK_INTERVAL = float(os.getenv("PROMPT_CHECK_INTERVAL", 2.0))
+
+DEFAULT_PROMPT = "Hi, this is ${rep_name} from Luma. Quick question—are you happy with how many qualified leads you're getting each month?"
+# Values used when a lead has no value for a placeholder
+DEFAULT_CONTEXT = {"rep_name": "Alex", "company": "your company", "contact": "there"}
+
+# Prompts use string.Template placeholders ($company / ${company}). Older
+# prompts written as {company} are converted when they are compiled.
+LEGACY_PLACEHOLDER = re.compile(r'(?<!\$)\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+def compile_prompt(text: str) -> Template:
+    return Template(LEGACY_PLACEHOLDER.sub(r'${\1}', text))
+
+class PromptRegistry:
+    """LRU cache of compiled prompt templates stored as <directory>/<name>.txt
+
+    Entries are dropped when the API writes or deletes a prompt, and reloaded
+    when the file's mtime changes (checked at most every PROMPT_CHECK_INTERVAL).
+    """
+
+    def __init__(self, directory: str = PROMPT_DIR, maxsize: int = PROMPT_CACHE_SIZE):
+        self.directory = directory
+        self.maxsize = maxsize
+        # name -> [mtime_ns, checked_at, text, template]
+        self._cache = OrderedDict()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, f"{name}.txt")
+
+    def _entry(self, name: str):
+        entry = self._cache.get(name)
+        now = time.monotonic()
+        if entry and now - entry[1] < PROMPT_CHECK_INTERVAL:
+            self._cache.move_to_end(name)
+            return entry
+
+        try:
+            mtime = os.stat(self.path(name)).st_mtime_ns
+        except FileNotFoundError:
+            self._cache.pop(name, None)
+            return None
+        if entry and entry[0] == mtime:
+            entry[1] = now
+            self._cache.move_to_end(name)
+            return entry
+
+        with open(self.path(name), "r") as f:
+            text = f.read()
+        entry = [mtime, now, text, compile_prompt(text)]
+        self._cache[name] = entry
+        self._cache.move_to_end(name)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return entry
+
+    def invalidate(self, name: str = None):
+        if name is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(name, None)
+
+    def get(self, name: str):
+        """Raw prompt text, or None if there is no such prompt"""
+        entry = self._entry(name)
+        return entry[2] if entry else None
+
+    def render(self, name: str, **context) -> str:
+        """Fill a prompt for one lead, falling back to the default prompt"""
+        entry = self._entry(name) or self._entry("default")
+        template = entry[3] if entry else compile_prompt(DEFAULT_PROMPT)
+        values = {**DEFAULT_CONTEXT, **{key: value for key, value in context.items() if value}}
+        # Unknown placeholders are left as written rather than failing the call
+        return template.safe_substitute(values)
+
+    def names(self) -> list:
+        return sorted(os.path.basename(path)[:-len(".txt")] for path in glob.glob(os.path.join(self.directory, "*.txt")))
+
+    def save(self, name: str, content: str, create: bool = False):
+        """Write a prompt; with `create`, raise FileExistsError if it already exists"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(name), "x" if create else "w") as f:
+            f.write(content)
+        self.invalidate(name)
+
+    def delete(self, name: str) -> bool:
+        self.invalidate(name)
+        try:
+            os.remove(self.path(name))
+            return True
+        except FileNotFoundError:
+            return False
+
+PROMPTS = PromptRegistry()
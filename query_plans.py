@@ -0,0 +1,102 @@
+import sys
+import asyncio
+from db import POOL, init_db
+import main
+import call_queue
+import analysis
+import webhooks
+import lead_import
+from dnc import LOOKUP_SQL
+from pagination import encode_cursor, page_query
+from export import export_query
+from stats import counts_query
+from rollups import grouped_query
+from transcripts import SAVE_SQL
+
+CURSOR = encode_cursor("2030-01-01 00:00:00", 1)
+
+def export_batch(name: str, **filters) -> tuple:
+    """One batch of user 1's export, after id 0"""
+    sql, params = export_query(name, 1, **filters)
+    return sql, (*params, 0, 1000)
+
+def hot_queries() -> dict:
+    """name -> (sql, params): the production statements, with representative parameters"""
+    return {
+        "get_current_user": (main.USER_BY_ID_SQL, (1,)),
+        "login": (main.USER_BY_EMAIL_SQL, ("a@b.c",)),
+        "enqueue_suppress": (call_queue.SUPPRESS_PENDING_SQL, (1,)),
+        "enqueue_pending": (call_queue.ENQUEUE_SQL, (0, 1)),
+        "enqueue_mark_queued": (call_queue.MARK_QUEUED_SQL, (1,)),
+        "claim_jobs": (call_queue.CLAIM_SQL, ("worker", 0, 0, 0, 10)),
+        "dead_letter_leads": (call_queue.dead_letter_sql(call_queue.EXPIRED_WHERE)[0], (0, 5)),
+        "dead_letter_jobs": (call_queue.dead_letter_sql(call_queue.EXPIRED_WHERE)[1], (None, 0, 5)),
+        "queue_depth": (call_queue.DEPTH_SQL, ()),
+        "dnc_lookup": (LOOKUP_SQL, ("+15555550100",)),
+        "list_leads": page_query("leads", main.LEAD_FIELDS, list(main.DEFAULT_LEAD_FIELDS),
+                                 {"user_id": 1, "status": None}, CURSOR),
+        "list_leads_status": page_query("leads", main.LEAD_FIELDS, ["id"], {"user_id": 1, "status": "pending"}, CURSOR),
+        "list_calls": page_query("calls", main.CALL_FIELDS, list(main.DEFAULT_CALL_FIELDS),
+                                 {"user_id": 1, "status": None, "outcome": None, "interest_level": None}, CURSOR, 50),
+        "list_calls_outcome": page_query("calls", main.CALL_FIELDS, ["id"], {"user_id": 1, "outcome": "completed"}, CURSOR, 50),
+        "list_calls_interest": page_query("calls", main.CALL_FIELDS, ["id"], {"user_id": 1, "interest_level": "hot"},
+                                          limit=50, since="2024-01-01"),
+        "list_calls_status": page_query("calls", main.CALL_FIELDS, ["id"], {"user_id": 1, "status": "completed"}, limit=50),
+        "call_transcript": (main.CALL_TRANSCRIPT_SQL, (1, 1)),
+        "webhook_lead": (webhooks.COMPLETE_LEAD_SQL, ("x",)),
+        "webhook_call": (webhooks.UPDATE_CALL_SQL, ("completed", "interested", 1, 10, None, None, 0, "x")),
+        "webhook_transcript": (SAVE_SQL, (b"", "x")),
+        "webhook_owners": (webhooks.OWNERS_SQL, ('["x"]',)),
+        "webhook_opt_out": (webhooks.OPT_OUT_SQL, ("x",)),
+        "export_calls": export_batch("calls", since="2024-01-01"),
+        "export_leads": export_batch("leads", campaign="default"),
+        "get_test_calls": (main.TEST_CALLS_SQL, ()),
+        "stats_leads": counts_query("lead_stats", 1),
+        "stats_calls": counts_query("call_stats", 1),
+        "analyze_calls": (analysis.BACKLOG_SQL, (0, 100)),
+        "analysis_owners": (analysis.OWNERS_SQL, ("[1]",)),
+        "analytics_daily": grouped_query("all", "day", 1, since="2024-01-01"),
+        "analytics_values": grouped_query("objection", "value", 1),
+        "import_new_numbers": (lead_import.NEW_NUMBERS_SQL, ()),
+        "import_insert": (lead_import.IMPORT_MODES["skip"], ()),
+        "import_load_job": (lead_import.LOAD_JOB_SQL, ("-300 seconds", "x")),
+        "import_rollback": (lead_import.ROLLBACK_SQL, ("x", 1000)),
+    }
+
+# Reading every row of these is the point: the staged import batch
+WHOLE_TABLE_SCANS = ("SCAN import_batch", "SCAN b")
+
+def full_scans(plan: list) -> list:
+    """Plan lines that read a whole table without an index (subquery results are not tables)"""
+    return [detail for detail in plan
+            if detail.startswith("SCAN ") and " INDEX " not in f"{detail} "
+            and not detail.startswith("SCAN (") and detail not in WHOLE_TABLE_SCANS]
+
+async def explain(db, sql: str, params: tuple) -> list:
+    async with db.execute(f"EXPLAIN QUERY PLAN {sql}", params) as cur:
+        return [row[3] for row in await cur.fetchall()]
+
+async def plans() -> dict:
+    """name -> (plan lines, full scans) for every hot query against the migrated schema"""
+    results = {}
+    # Plan on the writer: it applied the migrations, while a reader opened
+    # earlier can still EXPLAIN against the schema it cached before them
+    async with POOL.writer() as db:
+        await db.execute(lead_import.STAGING_SQL)
+        for name, (sql, params) in hot_queries().items():
+            plan = await explain(db, sql, params)
+            results[name] = (plan, full_scans(plan))
+    return results
+
+async def audit() -> int:
+    """Print each hot query's plan; return the number of queries with full scans"""
+    await POOL.open()
+    await init_db()
+    results = await plans()
+    await POOL.close()
+    for name, (plan, scans) in results.items():
+        print(f"{'FULL SCAN' if scans else 'ok':<9} {name}: {' | '.join(plan)}")
+    return sum(bool(scans) for _, scans in results.values())
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(audit()) else 0)
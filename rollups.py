@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import asyncio
+from datetime import date, timedelta
+from db import POOL, init_db
+
+ANALYTICS_DAYS = int(os.getenv("ANALYTICS_DAYS", 30))
+# Days rebuilt per writer transaction by `python -m rollups`
+ROLLUP_REBUILD_DAYS = int(os.getenv("ROLLUP_REBUILD_DAYS", 7))
+
+# call_rollups rows for the calls matching {where}; same grouping as the triggers in 0012
+ROLLUP_SQL = """
+    WITH c AS (
+        SELECT COALESCE(user_id, 0) AS user_id, COALESCE(DATE(created_at), '') AS day, COALESCE(prompt_name, '') AS prompt_name,
+               objection, interest_level, sentiment, duration, conversion_flag
+        FROM calls WHERE {where}
+    )
+    INSERT INTO call_rollups (user_id, dimension, day, prompt_name, value, calls, duration_total, durations, conversions)
+    SELECT user_id, dimension, day, prompt_name, value,
+           COUNT(*), SUM(COALESCE(duration, 0)), COUNT(duration), SUM(COALESCE(conversion_flag, 0))
+    FROM (
+        SELECT user_id, 'all' AS dimension, day, prompt_name, '' AS value, duration, conversion_flag FROM c
+        UNION ALL
+        SELECT user_id, 'objection', day, prompt_name, objection, duration, conversion_flag FROM c WHERE objection IS NOT NULL
+        UNION ALL
+        SELECT user_id, 'interest_level', day, prompt_name, interest_level, duration, conversion_flag FROM c WHERE interest_level IS NOT NULL
+        UNION ALL
+        SELECT user_id, 'sentiment', day, prompt_name, sentiment, duration, conversion_flag FROM c WHERE sentiment IS NOT NULL
+    )
+    GROUP BY user_id, dimension, day, prompt_name, value
+"""
+
+async def rebuild(since: str = None) -> int:
+    """Recompute the rollups from calls, a few days per transaction; returns days rebuilt
+
+    Backfills history after bulk loads and repairs any drift from the
+    triggers. Without `since` ("YYYY-MM-DD") every day is rebuilt.
+    """
+    async with POOL.reader() as db:
+        async with db.execute("SELECT MIN(created_at), MAX(created_at) FROM calls") as cur:
+            first, last = await cur.fetchone()
+    if first is None:
+        return 0
+
+    start = max(date.fromisoformat(first[:10]), date.fromisoformat(since)) if since else date.fromisoformat(first[:10])
+    end = date.fromisoformat(last[:10])
+    days = 0
+    while start <= end:
+        stop = min(start + timedelta(days=ROLLUP_REBUILD_DAYS), end + timedelta(days=1))
+        async with POOL.writer() as db:
+            await db.execute("DELETE FROM call_rollups WHERE day >= ? AND day < ?", (start.isoformat(), stop.isoformat()))
+            await db.execute(ROLLUP_SQL.format(where="created_at >= ? AND created_at < ?"), (start.isoformat(), stop.isoformat()))
+        days += (stop - start).days
+        start = stop
+        await asyncio.sleep(0)
+
+    if not since:
+        # Calls with no created_at are rolled up under day ''
+        async with POOL.writer() as db:
+            await db.execute("DELETE FROM call_rollups WHERE day = ''")
+            await db.execute(ROLLUP_SQL.format(where="created_at IS NULL"))
+    return days
+
+def grouped_query(dimension: str, key: str, user_id: int = None, prompt_name: str = None, since: str = None) -> tuple:
+    """(sql, params) summing one rollup dimension by `key`"""
+    where, params = ["dimension = ?"], [dimension]
+    if user_id is not None:
+        where.append("user_id = ?")
+        params.append(user_id)
+    if prompt_name is not None:
+        where.append("prompt_name = ?")
+        params.append(prompt_name)
+    if since is not None:
+        where.append("day >= ?")
+        params.append(since)
+    return f"""
+        SELECT {key}, SUM(calls), SUM(duration_total), SUM(durations), SUM(conversions)
+        FROM call_rollups WHERE {' AND '.join(where)}
+        GROUP BY {key} HAVING SUM(calls) > 0
+    """, params
+
+async def _grouped(db, dimension: str, key: str, user_id: int = None, prompt_name: str = None, since: str = None) -> list:
+    """(key, calls, duration_total, durations, conversions) summed over the other rollup columns"""
+    async with db.execute(*grouped_query(dimension, key, user_id, prompt_name, since)) as cur:
+        return await cur.fetchall()
+
+def _average(total: int, count: int):
+    return total / count if count else None
+
+async def analytics(user_id: int = None, prompt_name: str = None, days: int = ANALYTICS_DAYS) -> dict:
+    """/api/analytics-stats response for one user (or everyone), optionally one prompt"""
+    since = (date.today() - timedelta(days=days)).isoformat()
+    async with POOL.reader() as db:
+        daily = await _grouped(db, "all", "day", user_id, prompt_name, since)
+        objections = await _grouped(db, "objection", "value", user_id, prompt_name)
+        interest_levels = await _grouped(db, "interest_level", "value", user_id, prompt_name)
+        sentiments = await _grouped(db, "sentiment", "value", user_id, prompt_name)
+
+    return {
+        "daily_stats": [{"date": day, "total_calls": calls, "conversions": conversions, "avg_duration": _average(total, count)}
+                        for day, calls, total, count, conversions in sorted(daily, reverse=True)],
+        "objections": [{"type": value, "count": calls}
+                       for value, calls, _, _, _ in sorted(objections, key=lambda r: r[1], reverse=True)],
+        "interest_levels": [{"level": value, "count": calls, "avg_duration": _average(total, count), "conversions": conversions}
+                            for value, calls, total, count, conversions in interest_levels],
+        "sentiment_stats": [{"sentiment": value, "avg_duration": _average(total, count), "count": calls, "conversions": conversions}
+                            for value, calls, total, count, conversions in sentiments],
+    }
+
+async def main():
+    await POOL.open()
+    await init_db()
+    since = sys.argv[sys.argv.index("--since") + 1] if "--since" in sys.argv else None
+    started = time.monotonic()
+    days = await rebuild(since)
+    print(f"[ROLLUPS] Rebuilt {days} days of call rollups in {time.monotonic() - started:.1f}s")
+    await POOL.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
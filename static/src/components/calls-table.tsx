@@ -197,7 +197,7 @@ export function CallsTable({ calls, onViewTranscript, onRefresh }: CallsTablePro
                           variant="ghost"
                           size="sm"
                           onClick={() => onViewTranscript(call)}
-                          disabled={!call.transcript}
+                          disabled={!call.transcript && !call.has_transcript}
                           className="text-primary-600 hover:text-primary-900"
                         >
                           <FileText className="w-4 h-4" />
@@ -1,3 +1,4 @@
+import { useQuery } from "@tanstack/react-query";
 import { Dialog, DialogContent, DialogHeader, DialogTitle } from "@/components/ui/dialog";
 import { Badge } from "@/components/ui/badge";
 import { Bot, User } from "lucide-react";
@@ -8,7 +9,14 @@ interface TranscriptModalProps {
 }
 
 export function TranscriptModal({ call, onClose }: TranscriptModalProps) {
+  // /api/calls leaves transcripts out of the list; load this one on open
+  const { data: fetched } = useQuery<{ transcript: string }>({
+    queryKey: [`/api/calls/${call?.id}/transcript`],
+    enabled: !!call?.id && call.transcript === undefined && !!call.has_transcript,
+  });
+
   if (!call) return null;
+  const transcript: string = call.transcript ?? fetched?.transcript ?? "";
 
   const formatDuration = (seconds: number | null) => {
     if (!seconds) return "0:00";
@@ -47,7 +55,7 @@ export function TranscriptModal({ call, onClose }: TranscriptModalProps) {
     ];
   };
 
-  const transcriptEntries = parseTranscript(call.transcript);
+  const transcriptEntries = parseTranscript(transcript);
 
   return (
     <Dialog open={!!call} onOpenChange={() => onClose()}>
@@ -70,7 +78,7 @@ export function TranscriptModal({ call, onClose }: TranscriptModalProps) {
           </div>
           
           <div className="max-h-96 overflow-y-auto space-y-4">
-            {!call.transcript ? (
+            {!transcript ? (
               <div className="text-center py-8">
                 <p className="text-slate-500">No transcript available for this call.</p>
               </div>
@@ -106,13 +114,13 @@ export function TranscriptModal({ call, onClose }: TranscriptModalProps) {
               ))
             )}
             
-            {call.transcript && transcriptEntries.length === 1 && (
+            {transcript && transcriptEntries.length === 1 && (
               <div className="bg-yellow-50 border border-yellow-200 rounded-lg p-4">
                 <p className="text-sm text-yellow-800">
                   <strong>Raw Transcript:</strong>
                 </p>
                 <p className="text-sm text-yellow-700 mt-2 whitespace-pre-wrap">
-                  {call.transcript}
+                  {transcript}
                 </p>
               </div>
             )}
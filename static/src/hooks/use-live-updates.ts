@@ -0,0 +1,32 @@
+import { useEffect } from "react";
+import { queryClient } from "@/lib/queryClient";
+
+// Server events that change the call lists
+const CALL_EVENTS = ["dial_started", "webhook", "analysis"];
+const CALL_QUERIES = [["/api/calls"], ["/api/test-calls"]];
+
+// Keeps dashboard queries fresh from /api/events instead of polling
+export function useLiveUpdates() {
+  useEffect(() => {
+    // EventSource cannot send an Authorization header, so the JWT goes in the query
+    const token = localStorage.getItem("authToken");
+    if (!token) return;
+    const source = new EventSource(`/api/events?token=${encodeURIComponent(token)}`);
+
+    const refreshCalls = () => {
+      CALL_QUERIES.forEach((queryKey) => queryClient.invalidateQueries({ queryKey }));
+    };
+
+    source.addEventListener("stats", (event) => {
+      const { stats, campaignStatus } = JSON.parse((event as MessageEvent).data);
+      queryClient.setQueryData(["/api/stats"], stats);
+      queryClient.setQueryData(["/api/campaign-status"], campaignStatus);
+    });
+    CALL_EVENTS.forEach((name) => source.addEventListener(name, refreshCalls));
+
+    // Catch up on anything missed while disconnected
+    source.onopen = () => queryClient.invalidateQueries();
+
+    return () => source.close();
+  }, []);
+}
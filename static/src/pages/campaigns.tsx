@@ -1,4 +1,5 @@
 import { useQuery } from "@tanstack/react-query";
+import { useLiveUpdates } from "@/hooks/use-live-updates";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
 import { Button } from "@/components/ui/button";
@@ -6,13 +7,14 @@ import { Play, Square, Users, Phone, TrendingUp } from "lucide-react";
 import { useState } from "react";
 
 export default function Campaigns() {
+  useLiveUpdates();
+
   const { data: campaigns } = useQuery({
     queryKey: ["/api/campaigns"],
   });
 
   const { data: campaignStatus } = useQuery({
     queryKey: ["/api/campaign-status"],
-    refetchInterval: 5000,
   });
 
   const { data: stats } = useQuery({
@@ -1,4 +1,5 @@
 import { useQuery } from "@tanstack/react-query";
+import { useLiveUpdates } from "@/hooks/use-live-updates";
 import { StatsCards } from "@/components/stats-cards";
 import { UploadSection } from "@/components/upload-section";
 import { CampaignSettings } from "@/components/campaign-settings";
@@ -16,20 +17,19 @@ export default function Dashboard() {
   const [selectedTranscript, setSelectedTranscript] = useState<any>(null);
   const { toast } = useToast();
 
-  // Auto-refresh data every 10 seconds
+  // Pushed updates from /api/events keep these queries fresh
+  useLiveUpdates();
+
   const { data: stats, refetch: refetchStats } = useQuery({
     queryKey: ["/api/stats"],
-    refetchInterval: 10000,
   });
 
   const { data: calls, refetch: refetchCalls } = useQuery({
     queryKey: ["/api/calls"],
-    refetchInterval: 10000,
   });
 
   const { data: campaignStatus, refetch: refetchCampaignStatus } = useQuery({
     queryKey: ["/api/campaign-status"],
-    refetchInterval: 5000,
   });
 
   const handleStartCampaign = async () => {
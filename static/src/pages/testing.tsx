@@ -1,5 +1,6 @@
 import { useState } from "react";
 import { useQuery } from "@tanstack/react-query";
+import { useLiveUpdates } from "@/hooks/use-live-updates";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
@@ -26,10 +27,11 @@ export default function Testing() {
     queryKey: ["/api/prompts"],
   });
 
-  // Fetch recent test calls
+  useLiveUpdates();
+
+  // Fetch recent test calls; they belong to no user, so /api/calls never lists them
   const { data: calls = [], refetch: refetchCalls } = useQuery({
-    queryKey: ["/api/calls"],
-    refetchInterval: 3000,
+    queryKey: ["/api/test-calls"],
   });
 
   const handleTestCall = async () => {
@@ -254,26 +256,25 @@ export default function Testing() {
             <CardContent>
               <div className="space-y-3">
                 {calls.slice(0, 5).map((call: any) => (
-                  <div key={call.id} className="flex items-center justify-between p-3 bg-slate-50 rounded-lg">
+                  <div key={call.call_id} className="flex items-center justify-between p-3 bg-slate-50 rounded-lg">
                     <div>
                       <p className="text-sm font-medium text-slate-900">
-                        {call.lead?.contact || "Unknown"} • {call.lead?.phone}
+                        {call.contact || "Unknown"} • {call.phone}
                       </p>
                       <p className="text-xs text-slate-500">
-                        {call.createdAt ? new Date(call.createdAt).toLocaleString() : "Unknown time"}
+                        {call.timestamp ? new Date(call.timestamp).toLocaleString() : "Unknown time"}
                       </p>
                     </div>
                     <div className="flex flex-col items-end space-y-1">
                       <Badge variant={
-                        call.outcome === "interested" ? "default" :
-                        call.outcome === "not_interested" ? "destructive" :
-                        call.outcome === "voicemail" ? "secondary" :
-                        call.lead?.status === "dialing" ? "secondary" : "outline"
+                        call.status === "interested" ? "default" :
+                        call.status === "not_interested" ? "destructive" :
+                        call.status === "voicemail" ? "secondary" :
+                        call.status === "in_progress" ? "secondary" : "outline"
                       }>
-                        {call.lead?.status === "dialing" ? "In Progress" : 
-                         call.outcome || "Pending"}
+                        {call.status === "in_progress" ? "In Progress" : call.status}
                       </Badge>
-                      {call.duration && (
+                      {call.duration > 0 && (
                         <span className="text-xs text-slate-500">
                           {Math.floor(call.duration / 60)}:{(call.duration % 60).toString().padStart(2, '0')}
                         </span>
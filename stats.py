@@ -0,0 +1,115 @@
+import os
+import asyncio
+from db import POOL
+
+STATS_RECONCILE_INTERVAL = float(os.getenv("STATS_RECONCILE_INTERVAL", 600))
+
+# Lead statuses that have not been dialed yet
+UNDIALED_STATUSES = ("pending", "queued")
+
+# Recompute a counters table from its source table; `key` is the counted column
+RECOUNT_SQL = """
+    SELECT COALESCE(user_id, 0), COALESCE({key}, ''), COUNT(*) FROM {source} GROUP BY 1, 2
+"""
+
+COUNTERS = {
+    "lead_stats": ("leads", "status"),
+    "call_stats": ("calls", "outcome"),
+}
+
+def counts_query(table: str, user_id: int = None) -> tuple:
+    """(sql, params) reading one counters table for one user, or summed over all users"""
+    _, key = COUNTERS[table]
+    if user_id is None:
+        return f"SELECT {key}, SUM(count) FROM {table} GROUP BY {key}", ()
+    return f"SELECT {key}, count FROM {table} WHERE user_id = ?", (user_id,)
+
+async def _counts(db, table: str, user_id: int = None) -> dict:
+    """{status or outcome: count} for one user, or summed over all users"""
+    async with db.execute(*counts_query(table, user_id)) as cur:
+        return {name: count for name, count in await cur.fetchall()}
+
+async def read_counters(user_id: int = None) -> tuple:
+    """(lead counts by status, call counts by outcome) from the counters tables"""
+    async with POOL.reader() as db:
+        return await _counts(db, "lead_stats", user_id), await _counts(db, "call_stats", user_id)
+
+def stats_summary(leads: dict, calls: dict) -> dict:
+    """/api/stats response from counter dicts"""
+    calls_made = sum(calls.values())
+    interested = calls.get("interested", 0)
+    return {
+        "totalLeads": sum(leads.values()),
+        "callsMade": calls_made,
+        "successRate": round((interested / calls_made * 100) if calls_made > 0 else 0),
+        "activeCalls": leads.get("calling", 0),
+    }
+
+def campaign_summary(leads: dict) -> dict:
+    """/api/campaign-status response from lead counts"""
+    # Sample leads are never dialed, so they are not part of a campaign
+    total_count = sum(count for status, count in leads.items() if status != "sample")
+    pending_count = sum(leads.get(status, 0) for status in UNDIALED_STATUSES)
+    return {
+        "isActive": leads.get("calling", 0) > 0 or leads.get("queued", 0) > 0,
+        "progress": 0 if total_count == 0 else round(((total_count - pending_count) / total_count) * 100, 1),
+        "pendingCount": pending_count,
+        "totalCount": total_count,
+    }
+
+async def snapshot(user_id: int = None) -> dict:
+    """Both dashboard summaries from a single counters read"""
+    leads, calls = await read_counters(user_id)
+    return {"stats": stats_summary(leads, calls), "campaignStatus": campaign_summary(leads)}
+
+# Add a correction to a counter, creating it if the triggers never did
+ADJUST_SQL = """
+    INSERT INTO {table} (user_id, {key}, count) VALUES (?, ?, ?)
+    ON CONFLICT (user_id, {key}) DO UPDATE SET count = count + excluded.count
+"""
+
+async def _drift(db, table: str) -> list:
+    """[(user_id, status or outcome, actual - counted)] for the counters in `table` that are off"""
+    source, key = COUNTERS[table]
+    async with db.execute(f"SELECT user_id, {key}, count FROM {table}") as cur:
+        current = {(user_id, name): count for user_id, name, count in await cur.fetchall()}
+    async with db.execute(RECOUNT_SQL.format(key=key, source=source)) as cur:
+        actual = {(user_id, name): count for user_id, name, count in await cur.fetchall()}
+    return [(user_id, name, actual.get((user_id, name), 0) - current.get((user_id, name), 0))
+            for user_id, name in current.keys() | actual.keys()
+            if actual.get((user_id, name), 0) != current.get((user_id, name), 0)]
+
+async def reconcile() -> int:
+    """Repair counters that drifted from leads and calls; returns how many had drifted
+
+    The recounts scan both source tables, so they run on a reader and the
+    writer is held only to apply the corrections.
+    """
+    async with POOL.reader() as db:
+        # One read transaction, so each recount and its counters come from the same snapshot
+        await db.execute("BEGIN")
+        try:
+            drift = {table: await _drift(db, table) for table in COUNTERS}
+        finally:
+            await db.rollback()
+    drifted = sum(len(changes) for changes in drift.values())
+    if not drifted:
+        return 0
+
+    # Triggers move the source rows and their counters together, so the
+    # difference measured on the snapshot still holds after later writes
+    async with POOL.writer() as db:
+        for table, changes in drift.items():
+            if changes:
+                await db.executemany(ADJUST_SQL.format(table=table, key=COUNTERS[table][1]), changes)
+    print(f"[STATS] Reconciled {drifted} drifted counters")
+    return drifted
+
+async def run_reconciler(interval: float = STATS_RECONCILE_INTERVAL):
+    """Periodically repair counters that drifted from the source tables"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile()
+        except Exception as e:
+            print(f"[STATS] Error reconciling counters: {e}")
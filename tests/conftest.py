@@ -0,0 +1,68 @@
+import os
+import sys
+import asyncio
+import sqlite3
+import tempfile
+import importlib.util
+import pytest
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# The pool is bound to DATABASE_PATH at import, so point it at a scratch
+# database before any application module is loaded
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="salescaller-tests-"), "test.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import POOL, init_db
+
+@pytest.fixture(scope="session")
+def run():
+    """Run a coroutine on one event loop shared with the open, migrated pool"""
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(POOL.open())
+    loop.run_until_complete(init_db())
+    yield loop.run_until_complete
+    loop.run_until_complete(POOL.close())
+    loop.close()
+
+def _load(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(BACKEND, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture(scope="session")
+def backend():
+    """Loader for backend/ modules by (name, path under backend/)
+
+    backend/ imports its own `db.db`, which the root db module shadows here,
+    so that is registered first; its other packages resolve from backend/.
+    """
+    saved = sys.modules.get("db.db")
+    sys.modules["db.db"] = _load("backend_db", "db/db.py")
+    sys.path.append(BACKEND)
+    yield _load
+    sys.path.remove(BACKEND)
+    if saved is None:
+        sys.modules.pop("db.db", None)
+    else:
+        sys.modules["db.db"] = saved
+
+def backend_schema(db_path):
+    """Create backend/db/schema.sql in a scratch database and point backend's get_db at it"""
+    with sqlite3.connect(db_path) as conn, open(os.path.join(BACKEND, "db", "schema.sql")) as f:
+        conn.executescript(f.read())
+    sys.modules["db.db"].DB_PATH = db_path
+
+async def add_user(email: str) -> int:
+    async with POOL.writer() as db:
+        async with db.execute("INSERT INTO users (email, password_hash) VALUES (?, 'x') RETURNING id", (email,)) as cur:
+            return (await cur.fetchone())[0]
+
+async def add_lead(user_id: int, phone: str, status: str = "queued") -> int:
+    async with POOL.writer() as db:
+        async with db.execute("""
+            INSERT INTO leads (user_id, phone, normalized_phone, company, contact, status)
+            VALUES (?, ?, normalize_phone(?), 'Acme', 'Pat', ?) RETURNING id
+        """, (user_id, phone, phone, status)) as cur:
+            return (await cur.fetchone())[0]
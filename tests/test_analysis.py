@@ -0,0 +1,87 @@
+import json
+import time
+import asyncio
+import httpx
+import pytest
+from db import POOL
+from http_clients import CLIENTS
+from analysis import AnalysisService
+from transcripts import compress
+from conftest import add_user
+
+ANSWER = {"sentiment": "positive", "objection": "none", "interest_level": "warm", "summary": "Asked for a demo"}
+LATENCY = 0.02
+
+class MockOpenAI:
+    """Chat completions answered after LATENCY seconds, or 429 while `throttled`"""
+
+    def __init__(self):
+        self.throttled = False
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(LATENCY)
+        if self.throttled:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(ANSWER)}}]})
+
+@pytest.fixture
+def openai():
+    mock = MockOpenAI()
+    CLIENTS._clients["openai"] = httpx.AsyncClient(base_url="https://api.openai.com", transport=httpx.MockTransport(mock))
+    yield mock
+    CLIENTS._clients.pop("openai")
+
+async def add_calls(label: str, count: int) -> list:
+    user_id = await add_user(f"{label}@example.com")
+    ids = []
+    async with POOL.writer() as db:
+        for i in range(count):
+            async with db.execute("""
+                INSERT INTO calls (user_id, call_id, status, has_transcript, duration) VALUES (?, ?, 'completed', 1, 60)
+                RETURNING id
+            """, (user_id, f"{label}-{i}")) as cur:
+                (call_id,) = await cur.fetchone()
+            await db.execute("INSERT INTO call_transcripts (call_id, body) VALUES (?, ?)",
+                             (call_id, compress(f"user: {label} call {i}, tell me more about pricing")))
+            ids.append(call_id)
+    return ids
+
+async def sentiments(ids: list) -> list:
+    async with POOL.reader() as db:
+        async with db.execute(f"SELECT sentiment FROM calls WHERE id IN ({','.join('?' * len(ids))})", ids) as cur:
+            return [row[0] for row in await cur.fetchall()]
+
+def test_analysis_keeps_requests_in_flight(run, openai):
+    count = 200
+    service = AnalysisService(concurrency=8, rpm=60000, tpm=100000000)
+
+    async def scenario():
+        ids = await add_calls("throughput", count)
+        started = time.monotonic()
+        await service.run_pass()
+        return time.monotonic() - started, await sentiments(ids)
+
+    elapsed, analyzed = run(scenario())
+    assert analyzed == ["positive"] * count
+    # One request at a time would take count * LATENCY = 4s
+    assert elapsed < count * LATENCY / 2
+    print(f"{count / elapsed * 60:.0f} transcripts/min against a {LATENCY * 1000:.0f} ms mock")
+
+def test_calls_still_throttled_stay_pending(run, openai):
+    service = AnalysisService(concurrency=4, rpm=60000, tpm=100000000)
+
+    async def scenario():
+        ids = await add_calls("throttled", 3)
+        openai.throttled = True
+        await service.run_pass()
+        throttled = await sentiments(ids)
+        openai.throttled = False
+        await service.run_pass()
+        return throttled, await sentiments(ids)
+
+    throttled, retried = run(scenario())
+    assert throttled == [None] * 3
+    assert service.stats["deferred"] == 3 and service.stats["fallbacks"] == 0
+    assert retried == ["positive"] * 3
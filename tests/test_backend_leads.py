@@ -0,0 +1,38 @@
+import sqlite3
+import pytest
+from conftest import BACKEND, backend_schema
+
+@pytest.fixture(scope="module")
+def backend_main(backend):
+    # backend/main.py mounts ../static relative to backend/, where it is run from
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(BACKEND)
+        return backend("backend_main", "main.py")
+
+@pytest.fixture
+def leads_db(tmp_path, backend_main):
+    def add_leads(count: int):
+        db_path = tmp_path / f"leads-{count}.db"
+        backend_schema(db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.executemany("INSERT INTO leads (phone, contact, last_contacted_at) VALUES (?, ?, ?)",
+                             [(f"555555{i:04d}", f"Lead {i}", f"2026-01-{1 + i:02d} 09:00:00") for i in range(count)])
+    return add_leads
+
+def read_all(run, get_leads, limit: int) -> list:
+    """Contacts on each page, following next_cursor until it is null"""
+    pages, cursor = [], None
+    while True:
+        page = run(get_leads(cursor=cursor, limit=limit))
+        pages.append([lead["contact"] for lead in page["leads"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+def test_cursor_walks_every_lead_once_newest_first(run, backend_main, leads_db):
+    leads_db(5)
+    assert read_all(run, backend_main.get_leads, 2) == [["Lead 4", "Lead 3"], ["Lead 2", "Lead 1"], ["Lead 0"]]
+
+def test_exactly_full_last_page_has_no_cursor(run, backend_main, leads_db):
+    leads_db(4)
+    assert read_all(run, backend_main.get_leads, 2) == [["Lead 3", "Lead 2"], ["Lead 1", "Lead 0"]]
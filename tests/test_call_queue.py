@@ -0,0 +1,59 @@
+import os
+import asyncio
+from db import POOL
+from call_queue import CallQueue
+from dialer import DialerScheduler
+from conftest import add_user, add_lead
+
+async def queue_lead(email: str, phone: str) -> int:
+    user_id = await add_user(email)
+    lead_id = await add_lead(user_id, phone, status="pending")
+    await CallQueue().enqueue_pending(user_id)
+    return lead_id
+
+async def job_for(lead_id: int) -> tuple:
+    async with POOL.reader() as db:
+        async with db.execute("SELECT status, leased_by FROM call_jobs WHERE lead_id = ?", (lead_id,)) as cur:
+            return await cur.fetchone()
+
+def test_worker_that_lost_its_lease_cannot_finish_the_job(run):
+    async def scenario():
+        lead_id = await queue_lead("queue-lease@example.com", "555-555-0401")
+        first, second = CallQueue(), CallQueue()
+        first.worker_id, second.worker_id = "dialer-a:1", "dialer-b:1"
+        (job_id, _, attempts), = await first.claim(1)
+        async with POOL.writer() as db:
+            await db.execute("UPDATE call_jobs SET lease_expires_at = 0 WHERE id = ?", (job_id,))
+        (reclaimed, _, _), = await second.claim(1)
+
+        await first.complete(job_id)
+        await first.retry(job_id, attempts, error="late")
+        held = await job_for(lead_id)
+        await second.complete(job_id)
+        return reclaimed == job_id, held, await job_for(lead_id)
+
+    assert run(scenario()) == (True, ("leased", "dialer-b:1"), None)
+
+def test_throttled_scheduler_does_not_lease_jobs_it_cannot_dial(run):
+    dialed = []
+
+    async def dial(lead_id):
+        dialed.append(lead_id)
+        return None
+
+    async def scenario():
+        lead_id = await queue_lead("queue-throttled@example.com", "555-555-0402")
+        scheduler = DialerScheduler(CallQueue(), dial)
+        # As after a 429 with Retry-After
+        scheduler.bucket(os.getenv("BLAND_API_KEY", "")).pause(0.3)
+        scheduler.start()
+        try:
+            await asyncio.sleep(0.1)
+            paused = await job_for(lead_id)
+            while lead_id not in dialed:
+                await asyncio.sleep(0.01)
+        finally:
+            await scheduler.stop()
+        return paused, scheduler.in_flight
+
+    assert run(scenario()) == (("queued", None), 0)
@@ -0,0 +1,50 @@
+import httpx
+import pytest
+from fastapi import HTTPException, Response
+from db import POOL
+import main
+from main import get_call_transcript, get_test_calls, list_calls
+from transcripts import compress
+from conftest import add_user
+
+async def add_call(user_id: int, text: str) -> int:
+    async with POOL.writer() as db:
+        async with db.execute("INSERT INTO calls (user_id, phone, has_transcript) VALUES (?, '+15555550123', 1) RETURNING id",
+                              (user_id,)) as cur:
+            (call_id,) = await cur.fetchone()
+        await db.execute("INSERT INTO call_transcripts (call_id, body) VALUES (?, ?)", (call_id, compress(text)))
+    return call_id
+
+def test_calls_and_transcripts_are_scoped_to_their_user(run):
+    async def scenario():
+        owner = {"id": await add_user("calls-owner@example.com")}
+        other = {"id": await add_user("calls-other@example.com")}
+        call_id = await add_call(owner["id"], "user: call me on Tuesday")
+        listed = {
+            "owner": [c["id"] for c in await list_calls(Response(), limit=50, current_user=owner, db=POOL)],
+            "other": [c["id"] for c in await list_calls(Response(), limit=50, current_user=other, db=POOL)],
+        }
+        transcript = await get_call_transcript(call_id, current_user=owner, db=POOL)
+        with pytest.raises(HTTPException) as denied:
+            await get_call_transcript(call_id, current_user=other, db=POOL)
+        return call_id, listed, transcript, denied.value.status_code
+
+    call_id, listed, transcript, denied = run(scenario())
+    assert listed == {"owner": [call_id], "other": []}
+    assert transcript == {"id": call_id, "transcript": "user: call me on Tuesday"}
+    assert denied == 404
+
+def test_placed_test_call_is_listed_on_the_testing_page(run, monkeypatch):
+    monkeypatch.setenv("BLAND_API_KEY", "test-key")
+    bland = httpx.AsyncClient(base_url="https://api.bland.ai",
+                              transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"call_id": "bland-test-1"})))
+
+    async def scenario():
+        async with bland:
+            placed = await main.test_call({"phone": "+15555550177", "contact": "Sam", "company": "Initech"}, db=POOL, client=bland)
+        return placed, await get_test_calls(db=POOL)
+
+    placed, listed = run(scenario())
+    assert placed["success"]
+    call = next(c for c in listed if c["call_id"] == "bland-test-1")
+    assert (call["phone"], call["contact"], call["company"], call["status"]) == ("+15555550177", "Sam", "Initech", "in_progress")
@@ -0,0 +1,42 @@
+import httpx
+from db import POOL
+from dialer import create_call
+from webhooks import WebhookConsumer
+from transcripts import TRANSCRIPT_SQL
+from conftest import add_user, add_lead
+
+def bland(call_id: str) -> httpx.AsyncClient:
+    return httpx.AsyncClient(base_url="https://api.bland.ai",
+                             transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"call_id": call_id})))
+
+def test_campaign_call_is_updated_by_its_webhook(run):
+    async def scenario():
+        user_id = await add_user("campaign@example.com")
+        lead_id = await add_lead(user_id, "(555) 555-0100")
+        async with bland("bland-campaign-1") as client:
+            await create_call(lead_id, client)
+
+        consumer = WebhookConsumer()
+        await consumer.ingest({"call_id": "bland-campaign-1", "outcome": "interested", "call_length": 42,
+                               "transcript": "assistant: Hi Pat\nuser: Sounds good, tell me more"})
+        assert await consumer.process_batch() == 1
+
+        async with POOL.reader() as db:
+            async with db.execute(f"SELECT status, outcome, duration, has_transcript, {TRANSCRIPT_SQL} FROM calls WHERE lead_id = ?",
+                                  (lead_id,)) as cur:
+                call = await cur.fetchone()
+            async with db.execute("SELECT status FROM leads WHERE id = ?", (lead_id,)) as cur:
+                lead = await cur.fetchone()
+            async with db.execute("SELECT outcome, count FROM call_stats WHERE user_id = ? AND count > 0", (user_id,)) as cur:
+                counters = dict(await cur.fetchall())
+            async with db.execute("SELECT SUM(calls), SUM(duration_total) FROM call_rollups WHERE user_id = ? AND dimension = 'all'",
+                                  (user_id,)) as cur:
+                rollup = await cur.fetchone()
+        return call, lead, counters, rollup
+
+    call, lead, counters, rollup = run(scenario())
+    assert call[:4] == ("completed", "interested", 42, 1)
+    assert "tell me more" in call[4]
+    assert lead == ("completed",)
+    assert counters == {"interested": 1}
+    assert rollup == (1, 42)
@@ -0,0 +1,154 @@
+import time
+import asyncio
+import socket
+import sqlite3
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+from conftest import backend_schema
+
+@pytest.fixture(scope="module")
+def email_service(backend):
+    return backend("backend_email_service", "services/email_service.py")
+
+class Mailbox:
+    """aiosmtpd handler: keeps every message and the SMTP session it arrived on"""
+
+    def __init__(self):
+        self.received = []
+        self.sessions = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("busy@"):
+            return "451 Mailbox busy, try later"
+        if address.startswith("bad@"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received.extend(envelope.rcpt_tos)
+        if not any(s is session for s in self.sessions):
+            self.sessions.append(session)
+        return "250 Message accepted"
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def smtp(monkeypatch, tmp_path, email_service):
+    """A local SMTP server, an outbox database and a dispatcher pointed at both"""
+    port = free_port()
+    mailbox = Mailbox()
+    servers = [Controller(mailbox, hostname="127.0.0.1", port=port)]
+    servers[0].start()
+
+    def restart():
+        """Stop the server, dropping open sessions, and start a new one on the same port"""
+        servers[-1].stop()
+        servers.append(Controller(mailbox, hostname="127.0.0.1", port=port))
+        servers[-1].start()
+
+    monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+    monkeypatch.setenv("SMTP_PORT", str(port))
+    monkeypatch.setenv("SMTP_STARTTLS", "0")
+    monkeypatch.setenv("SMTP_AUTH", "0")
+    db_path = tmp_path / "backend.db"
+    backend_schema(db_path)
+    service = email_service.EmailService(str(db_path))
+    dispatcher = email_service.EmailDispatcher(service)
+    yield dispatcher, mailbox, restart, db_path
+    servers[-1].stop()
+
+def queue(db_path, *addresses):
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO email_outbox (to_email, subject, body) VALUES (?, 'Hi', 'Hello')",
+                         [(address,) for address in addresses])
+
+def outbox(db_path) -> list:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT to_email, status, attempts, available_at FROM email_outbox ORDER BY id").fetchall()
+
+def test_batch_is_sent_over_one_session(run, smtp):
+    dispatcher, mailbox, _, db_path = smtp
+    addresses = [f"pat{i}@example{i}.com" for i in range(5)]
+    queue(db_path, *addresses)
+
+    async def scenario():
+        try:
+            return await dispatcher.process_batch()
+        finally:
+            await dispatcher.session.close()
+
+    assert run(scenario()) == 5
+    assert mailbox.received == addresses
+    assert len(mailbox.sessions) == 1
+    assert [status for _, status, _, _ in outbox(db_path)] == ["sent"] * 5
+
+def test_dropped_session_is_reopened(run, smtp):
+    dispatcher, mailbox, restart, db_path = smtp
+
+    async def scenario():
+        try:
+            queue(db_path, "pat@one.com")
+            await dispatcher.process_batch()
+            # The server goes away and comes back, closing the session the dispatcher holds
+            restart()
+            queue(db_path, "sam@two.com")
+            await dispatcher.process_batch()
+        finally:
+            await dispatcher.session.close()
+
+    run(scenario())
+    assert mailbox.received == ["pat@one.com", "sam@two.com"]
+    assert len(mailbox.sessions) == 2
+    assert dispatcher.stats == {"sent": 2, "failed": 0, "deferred": 0}
+    assert [(status, attempts) for _, status, attempts, _ in outbox(db_path)] == [("sent", 1), ("sent", 1)]
+
+def test_domain_rate_limit_defers_without_using_an_attempt(run, smtp, monkeypatch, email_service):
+    dispatcher, mailbox, _, db_path = smtp
+    monkeypatch.setattr(email_service, "EMAIL_DOMAIN_RATE", 600)  # one send per 0.1s per domain
+    queue(db_path, "a@same.com", "b@same.com", "c@other.com")
+
+    async def scenario():
+        try:
+            started = time.time()
+            await dispatcher.process_batch()
+            first = outbox(db_path)
+            while len(mailbox.received) < 3 and time.time() - started < 5:
+                await dispatcher.process_batch()
+                await asyncio.sleep(dispatcher._next_due)
+            return started, first
+        finally:
+            await dispatcher.session.close()
+
+    started, first = run(scenario())
+    assert first[0][1] == first[2][1] == "sent"
+    to_email, status, attempts, available_at = first[1]
+    assert (to_email, status, attempts) == ("b@same.com", "pending", 0)
+    assert started < available_at <= time.time() + 0.1
+    assert mailbox.received == ["a@same.com", "c@other.com", "b@same.com"]
+    assert dispatcher.stats["deferred"] >= 1
+    assert [(status, attempts) for _, status, attempts, _ in outbox(db_path)] == [("sent", 1)] * 3
+
+def test_rejections_are_retried_or_failed_by_reply_code(run, smtp, email_service):
+    dispatcher, mailbox, _, db_path = smtp
+    queue(db_path, "busy@example.com", "bad@example.org")
+
+    async def scenario():
+        try:
+            await dispatcher.process_batch()
+        finally:
+            await dispatcher.session.close()
+
+    run(scenario())
+    (_, busy_status, busy_attempts, retry_at), (_, bad_status, bad_attempts, _) = outbox(db_path)
+    # 4xx: back off and try again later; 5xx: give up straight away
+    assert (busy_status, busy_attempts) == ("pending", 1)
+    assert retry_at >= time.time() + 30
+    assert (bad_status, bad_attempts) == ("failed", 1)
+    assert dispatcher.stats == {"sent": 0, "failed": 1, "deferred": 0}
+    assert mailbox.received == []
@@ -0,0 +1,106 @@
+import os
+import asyncio
+import sqlite3
+import pytest
+import lead_import
+from db import POOL
+from lead_import import create_import_job, load_import_job, rollback_import, run_import
+from conftest import add_user
+
+def spool(tmp_path, rows: int, start: int = 0) -> str:
+    path = tmp_path / f"leads-{start}.csv"
+    path.write_text("phone,company,contact\n" + "".join(f"555555{start + i:04d},Co {i},Pat\n" for i in range(rows)))
+    return str(path)
+
+async def lead_count(job_id: str) -> int:
+    async with POOL.reader() as db:
+        async with db.execute("SELECT COUNT(*) FROM leads WHERE import_job_id = ?", (job_id,)) as cur:
+            return (await cur.fetchone())[0]
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(lead_import, "IMPORT_BATCH_SIZE", 2)
+
+def test_failed_import_keeps_committed_batches_and_resumes(run, tmp_path, monkeypatch, small_batches):
+    write_batch, calls = lead_import._write_batch, []
+
+    async def failing_write_batch(job, batch):
+        calls.append(len(batch))
+        if len(calls) == 2:
+            raise RuntimeError("disk full")
+        await write_batch(job, batch)
+
+    async def scenario():
+        user_id = await add_user("import-resume@example.com")
+        job = create_import_job(user_id, "default", "leads.csv")
+        path = spool(tmp_path, 5)
+        monkeypatch.setattr(lead_import, "_write_batch", failing_write_batch)
+        await run_import(job, path)
+        failed = (job.status, job.rows_processed, job.rows_imported, await lead_count(job.id))
+
+        # A restarted process only has the row in import_jobs
+        lead_import.IMPORT_JOBS.pop(job.id)
+        stored = await load_import_job(job.id)
+        await run_import(stored, stored.path)
+        return failed, stored, await lead_count(job.id), os.path.exists(path)
+
+    failed, job, leads, spooled = run(scenario())
+    assert failed == ("failed", 2, 2, 2)
+    assert (job.status, job.rows_processed, job.rows_imported, leads) == ("completed", 5, 5, 5)
+    assert not spooled
+
+def test_rollback_removes_leads_not_yet_in_a_campaign(run, tmp_path, small_batches):
+    async def scenario():
+        user_id = await add_user("import-rollback@example.com")
+        job = create_import_job(user_id, "default", "leads.csv")
+        await run_import(job, spool(tmp_path, 5, start=100))
+        async with POOL.writer() as db:
+            await db.execute("UPDATE leads SET status = 'queued' WHERE import_job_id = ? AND phone = '5555550100'", (job.id,))
+        removed = await rollback_import(job)
+        return removed, job.status, await lead_count(job.id)
+
+    assert run(scenario()) == (4, "rolled_back", 1)
+
+def test_other_writers_run_between_import_batches(run, tmp_path, small_batches):
+    async def scenario():
+        user_id = await add_user("import-interleave@example.com")
+        job = create_import_job(user_id, "default", "leads.csv")
+        importing = asyncio.create_task(run_import(job, spool(tmp_path, 20, start=200)))
+        await asyncio.sleep(0)
+        async with POOL.writer():
+            seen = job.rows_processed
+        await importing
+        return seen, job.rows_processed
+
+    seen, total = run(scenario())
+    assert seen < total == 20
+
+def test_commit_from_another_process_does_not_fail_a_batch(run, tmp_path, monkeypatch, small_batches):
+    other_writes = []
+
+    class InterleavedModes(dict):
+        """Commits from a second connection after a batch's count, before its insert"""
+        def __getitem__(self, mode):
+            other = sqlite3.connect(POOL.path, timeout=0)
+            try:
+                with other:
+                    other.execute("INSERT INTO users (email, password_hash) VALUES (?, 'x')",
+                                  (f"other-{len(other_writes)}@example.com",))
+                other_writes.append("committed")
+            except sqlite3.OperationalError as e:
+                other_writes.append(str(e))
+            finally:
+                other.close()
+            return super().__getitem__(mode)
+
+    monkeypatch.setattr(lead_import, "IMPORT_MODES", InterleavedModes(lead_import.IMPORT_MODES))
+
+    async def scenario():
+        user_id = await add_user("import-concurrent@example.com")
+        job = create_import_job(user_id, "default", "leads.csv")
+        await run_import(job, spool(tmp_path, 4, start=300))
+        return job.status, job.error, await lead_count(job.id)
+
+    assert run(scenario()) == ("completed", None, 4)
+    # The batch holds the write lock from its first statement, so the other writer waits its turn
+    assert other_writes == ["database is locked"] * 2
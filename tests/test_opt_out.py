@@ -0,0 +1,26 @@
+from db import POOL
+from classifier import detect_opt_out
+from webhooks import WebhookConsumer
+from conftest import add_user, add_lead
+
+def test_only_the_callee_can_opt_out():
+    assert detect_opt_out("assistant: Hi Pat\nuser: Please take me off your list")
+    assert detect_opt_out("Please stop calling me")
+    assert not detect_opt_out("assistant: We never call numbers on the do not call list\nuser: Okay, go on")
+    assert not detect_opt_out("user: Hello?\nassistant: Sorry, I'll make sure we\nnever call at dinner again")
+
+def test_opt_out_puts_the_lead_number_on_the_do_not_call_list(run):
+    async def scenario():
+        user_id = await add_user("opt-out@example.com")
+        lead_id = await add_lead(user_id, "(555) 555-0199", status="calling")
+        async with POOL.writer() as db:
+            await db.execute("UPDATE leads SET bland_call_id = 'bland-opt-out-1' WHERE id = ?", (lead_id,))
+        consumer = WebhookConsumer()
+        await consumer.ingest({"call_id": "bland-opt-out-1", "outcome": "not_interested",
+                               "transcript": "assistant: Hi Pat\nuser: Remove my number, thanks"})
+        await consumer.process_batch()
+        async with POOL.reader() as db:
+            async with db.execute("SELECT source FROM dnc_numbers WHERE phone = '+15555550199'") as cur:
+                return await cur.fetchall()
+
+    assert run(scenario()) == [("opt_out",)]
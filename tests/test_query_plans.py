@@ -0,0 +1,5 @@
+from query_plans import plans
+
+def test_hot_queries_use_indexes(run):
+    results = run(plans())
+    assert {name: scans for name, (_, scans) in results.items() if scans} == {}
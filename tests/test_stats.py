@@ -0,0 +1,32 @@
+import stats
+from db import POOL
+from stats import reconcile, read_counters
+from conftest import add_user, add_lead
+
+def test_reconcile_repairs_drift_without_losing_concurrent_writes(run, monkeypatch):
+    async def scenario():
+        await reconcile()
+        user_id = await add_user("stats@example.com")
+        for i in range(3):
+            await add_lead(user_id, f"555-555-02{i:02d}", status="pending")
+        async with POOL.writer() as db:
+            await db.execute("UPDATE lead_stats SET count = count + 5 WHERE user_id = ? AND status = 'pending'", (user_id,))
+            await db.execute("INSERT INTO leads (user_id, phone, status) VALUES (?, '5555550299', 'queued')", (user_id,))
+            await db.execute("DELETE FROM lead_stats WHERE user_id = ? AND status = 'queued'", (user_id,))
+
+        # A lead added after the recount but before the corrections are applied
+        measure = stats._drift
+        async def drift_then_write(db, table):
+            changes = await measure(db, table)
+            if table == "lead_stats":
+                await add_lead(user_id, "555-555-0298", status="pending")
+            return changes
+        monkeypatch.setattr(stats, "_drift", drift_then_write)
+        drifted = await reconcile()
+        monkeypatch.setattr(stats, "_drift", measure)
+        return user_id, drifted, await reconcile()
+
+    user_id, drifted, again = run(scenario())
+    assert (drifted, again) == (2, 0)
+    leads, _ = run(read_counters(user_id))
+    assert leads == {"pending": 4, "queued": 1}
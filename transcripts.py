@@ -0,0 +1,32 @@
+import os
+import zlib
+
+# Transcripts live zlib-compressed in call_transcripts, keyed by calls.id, so
+# calls rows stay narrow for the stats, list and analytics scans.
+# calls.has_transcript marks the calls that have one.
+TRANSCRIPT_COMPRESSION_LEVEL = int(os.getenv("TRANSCRIPT_COMPRESSION_LEVEL", 6))
+
+# Transcript of the current calls row; decompress() is registered on every pool connection
+TRANSCRIPT_SQL = "(SELECT decompress(body) FROM call_transcripts WHERE call_transcripts.call_id = calls.id)"
+
+# By Bland call_id; the caller keeps calls.has_transcript in step
+SAVE_SQL = """
+    INSERT INTO call_transcripts (call_id, body) SELECT id, ? FROM calls WHERE call_id = ?
+    ON CONFLICT (call_id) DO UPDATE SET body = excluded.body
+"""
+CLEAR_SQL = "DELETE FROM call_transcripts WHERE call_id IN (SELECT id FROM calls WHERE call_id = ?)"
+
+def compress(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), TRANSCRIPT_COMPRESSION_LEVEL)
+
+def decompress(body: bytes) -> str:
+    return zlib.decompress(body).decode("utf-8") if body is not None else None
+
+async def save_transcripts(db, transcripts: list):
+    """Store (bland_call_id, transcript) pairs on the writer; empty transcripts clear any stored one"""
+    stored = [(compress(text), call_id) for call_id, text in transcripts if text]
+    cleared = [(call_id,) for call_id, text in transcripts if not text]
+    if stored:
+        await db.executemany(SAVE_SQL, stored)
+    if cleared:
+        await db.executemany(CLEAR_SQL, cleared)
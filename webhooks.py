@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import asyncio
+from db import POOL
+from events import BUS
+from classifier import detect_booking, detect_opt_out
+from dnc import DNC
+from transcripts import save_transcripts
+
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 200))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", 1.0))
+WEBHOOK_RETENTION_DAYS = float(os.getenv("WEBHOOK_RETENTION_DAYS", 7))
+
+# An identical redelivery matches no row, so it writes nothing
+INGEST_SQL = """
+    INSERT INTO webhook_events (call_id, payload, received_at) VALUES (?, ?, ?)
+    ON CONFLICT (call_id) DO UPDATE
+    SET payload = excluded.payload, received_at = excluded.received_at, processed_at = NULL, error = NULL
+    WHERE payload != excluded.payload
+"""
+
+COMPLETE_LEAD_SQL = "UPDATE leads SET status='completed' WHERE bland_call_id=?"
+UPDATE_CALL_SQL = """
+    UPDATE calls
+    SET status=?, outcome=?, has_transcript=?, duration=?, meeting_time=?, email=?, conversion_flag=?
+    WHERE call_id=?
+"""
+# The users whose calls a batch touched, for the live update events
+OWNERS_SQL = "SELECT bland_call_id, user_id FROM leads WHERE bland_call_id IN (SELECT value FROM json_each(?))"
+# The dialed number of a campaign lead, or of a test call (which has no lead)
+OPT_OUT_SQL = """
+    INSERT INTO dnc_numbers (phone, source)
+    SELECT phone, 'opt_out' FROM (
+        SELECT COALESCE(normalized_phone, normalize_phone(phone)) AS phone FROM leads WHERE bland_call_id = ?1
+        UNION
+        SELECT normalize_phone(phone) FROM calls WHERE call_id = ?1 AND lead_id IS NULL
+    ) WHERE phone IS NOT NULL
+    ON CONFLICT (phone) DO NOTHING
+"""
+
+def parse_webhook(payload: dict) -> dict:
+    """Call update for one Bland.ai end-of-call payload, including booking detection"""
+    outcome = payload.get("outcome", "unknown")
+    transcript = payload.get("transcript", "") or ""
+    update = {
+        "call_id": payload.get("call_id"),
+        "status": "completed" if outcome else "failed",
+        "outcome": outcome,
+        "transcript": transcript,
+        "duration": payload.get("call_length", 0),
+    }
+
+    update.update(detect_booking(transcript))
+    update["opt_out"] = detect_opt_out(transcript)
+    return update
+
+class WebhookConsumer:
+    """Applies ingested webhooks to leads and calls in batched transactions
+
+    The webhook endpoint only appends to webhook_events; this consumer claims
+    unprocessed rows, parses them and applies a whole batch in one transaction.
+    `on_booking(call_id, email, meeting_time, transcript)` runs after commit.
+    """
+
+    def __init__(self, on_booking=None):
+        self.on_booking = on_booking
+        self.stats = {"ingested": 0, "duplicates": 0, "applied": 0, "errors": 0}
+        self._wakeup = asyncio.Event()
+        self._runner = None
+        self._pending = []
+        self._flusher = None
+        self._last_purge = 0.0
+
+    async def ingest(self, payload: dict) -> bool:
+        """Durably store a webhook; returns False for a redelivery that changes nothing"""
+        call_id = payload.get("call_id")
+        if not call_id:
+            return False
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(((call_id, json.dumps(payload, sort_keys=True), time.time()), future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        stored = await future
+        self.stats["ingested" if stored else "duplicates"] += 1
+        return stored
+
+    async def _flush(self):
+        """Group-commit every webhook that arrived while the writer was busy"""
+        while self._pending:
+            batch = []
+            try:
+                async with POOL.writer() as db:
+                    batch, self._pending = self._pending, []
+                    results = []
+                    for params, _ in batch:
+                        async with db.execute(INGEST_SQL, params) as cur:
+                            results.append(cur.rowcount > 0)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), stored in zip(batch, results):
+                if not future.done():
+                    future.set_result(stored)
+            self._wakeup.set()
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+    async def _run(self):
+        while True:
+            try:
+                applied = await self.process_batch()
+                if time.time() - self._last_purge > 3600:
+                    await self.purge()
+            except Exception as e:
+                print(f"[WEBHOOK] Error processing webhook batch: {e}")
+                applied = 0
+            if applied < WEBHOOK_BATCH_SIZE:
+                try:
+                    async with asyncio.timeout(WEBHOOK_POLL_INTERVAL):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def process_batch(self, limit: int = WEBHOOK_BATCH_SIZE) -> int:
+        """Claim, parse and apply up to `limit` webhooks in a single transaction"""
+        bookings = []
+        async with POOL.writer() as db:
+            async with db.execute("""
+                UPDATE webhook_events SET processed_at = ?
+                WHERE id IN (SELECT id FROM webhook_events WHERE processed_at IS NULL ORDER BY id LIMIT ?)
+                RETURNING id, payload
+            """, (time.time(), limit)) as cur:
+                rows = await cur.fetchall()
+            if not rows:
+                return 0
+
+            updates, failed = [], []
+            for event_id, payload in rows:
+                try:
+                    updates.append(parse_webhook(json.loads(payload)))
+                except Exception as e:
+                    failed.append((str(e), event_id))
+
+            await db.executemany(COMPLETE_LEAD_SQL, [(u["call_id"],) for u in updates])
+            await db.executemany(UPDATE_CALL_SQL, [(u["status"], u["outcome"], int(bool(u["transcript"])), u["duration"], u["meeting_time"],
+                   u["email"], u["conversion_flag"], u["call_id"]) for u in updates])
+            await save_transcripts(db, [(u["call_id"], u["transcript"]) for u in updates])
+            # Whoever asked not to be called again goes on the do-not-call list
+            opt_outs = [(u["call_id"],) for u in updates if u["opt_out"]]
+            opted_out = 0
+            if opt_outs:
+                cur = await db.executemany(OPT_OUT_SQL, opt_outs)
+                opted_out = cur.rowcount
+            if failed:
+                await db.executemany("UPDATE webhook_events SET error = ? WHERE id = ?", failed)
+            async with db.execute(OWNERS_SQL, (json.dumps([u["call_id"] for u in updates]),)) as cur:
+                owners = dict(await cur.fetchall())
+            bookings = [u for u in updates if u["conversion_flag"]]
+
+        self.stats["applied"] += len(updates)
+        self.stats["errors"] += len(failed)
+        print(f"[WEBHOOK] Applied {len(updates)} webhooks ({len(failed)} unparseable)")
+        # Each user only hears about their own calls; test calls have no owner
+        by_user = {}
+        for u in updates:
+            by_user.setdefault(owners.get(u["call_id"]), []).append(u["call_id"])
+        for user_id, call_ids in by_user.items():
+            BUS.publish("webhook", {"applied": len(call_ids), "call_ids": call_ids[:50]} if user_id else {"test": True}, user_id)
+        if opt_outs:
+            print(f"[WEBHOOK] {len(opt_outs)} opt-outs, {opted_out} new numbers on the do-not-call list")
+            await DNC.refresh()
+
+        if self.on_booking:
+            for u in bookings:
+                try:
+                    await self.on_booking(u["call_id"], u["email"], u["meeting_time"], u["transcript"])
+                except Exception as e:
+                    print(f"[WEBHOOK] Booking handler failed for call {u['call_id']}: {e}")
+        return len(rows)
+
+    async def purge(self, retention_days: float = WEBHOOK_RETENTION_DAYS) -> int:
+        """Drop processed webhooks older than the retention window"""
+        self._last_purge = time.time()
+        async with POOL.writer() as db:
+            async with db.execute("DELETE FROM webhook_events WHERE processed_at < ?",
+                                  (time.time() - retention_days * 86400,)) as cur:
+                return cur.rowcount
+
+    async def backlog(self) -> int:
+        async with POOL.reader() as db:
+            async with db.execute("SELECT COUNT(*) FROM webhook_events WHERE processed_at IS NULL") as cur:
+                return (await cur.fetchone())[0]